@@ -0,0 +1,142 @@
+import asyncio
+import socket
+import threading
+import time
+
+from boat_controller import BoatController
+
+
+class _CommandProtocol(asyncio.DatagramProtocol):
+    """
+    Протокол сокета отправки команд. Входящие датаграммы не ожидаются.
+    """
+
+    def error_received(self, exc):
+        print("Ошибка сокета отправки команд:", exc)
+
+
+class _TelemetryProtocol(asyncio.DatagramProtocol):
+    """
+    Протокол приема телеметрии: каждая датаграмма передается контроллеру прямо в цикле событий.
+    """
+
+    def __init__(self, controller):
+        self.controller = controller
+
+    def datagram_received(self, data, addr):
+        try:
+            self.controller._handle_telemetry_datagram(data)
+        except Exception as e:
+            print("Ошибка при получении телеметрии:", e)
+
+    def error_received(self, exc):
+        print("Ошибка сокета телеметрии:", exc)
+
+
+class AsyncBoatController(BoatController):
+    """
+    Контроллер лодки на asyncio.DatagramProtocol, работающий в цикле событий FastAPI.
+
+    Публичный API (send_movement_command, send_pid_command, get_telemetry, ...) совпадает с BoatController
+    и может вызываться как из цикла событий, так и из других потоков (например, из потока миссии).
+    Методы start(), stop() и close() являются корутинами и вызываются из lifespan приложения.
+    """
+
+    def __init__(self, esp32_ip, **kwargs):
+        """
+        :param esp32_ip: IP-адрес ESP32 (лодки)
+        :param kwargs: Параметры BoatController (esp32_port, local_port, heartbeat_interval, ...)
+        """
+        self.loop = None
+        self.loop_thread_id = None
+        self.command_transport = None
+        self.telemetry_transport = None
+        self.command_event = None
+        self.command_task = None
+        super().__init__(esp32_ip, **kwargs)
+
+    def _create_sockets(self):
+        # Сокеты создаются в start() через транспорт цикла событий
+        pass
+
+    async def start(self):
+        """
+        Открыть UDP транспорты и запустить задачу отправки команд в текущем цикле событий.
+        """
+        self.loop = asyncio.get_running_loop()
+        self.loop_thread_id = threading.get_ident()
+        self.command_event = asyncio.Event()
+
+        self.command_transport, _ = await self.loop.create_datagram_endpoint(
+            _CommandProtocol, remote_addr=(self.esp32_ip, self.esp32_port))
+        self.telemetry_transport, _ = await self.loop.create_datagram_endpoint(
+            lambda: _TelemetryProtocol(self), local_addr=('0.0.0.0', self.local_port))
+        if self.receive_buffer:
+            self.telemetry_transport.get_extra_info('socket').setsockopt(
+                socket.SOL_SOCKET, socket.SO_RCVBUF, self.receive_buffer)
+
+        self.telemetry_running = True
+        self.command_running = True
+        self.command_task = self.loop.create_task(self._send_commands_task())
+
+        # Отправляем начальный пакет, чтобы лодка знала адрес и порт для телеметрии
+        self._send_initial_packet()
+
+    async def stop(self):
+        """
+        Остановить задачу отправки команд. Прием телеметрии прекращается при закрытии транспорта.
+        """
+        self.telemetry_running = False
+        with self.command_condition:
+            self.command_running = False
+            self._wake_sender()
+
+        if self.command_task is not None:
+            await self.command_task
+            self.command_task = None
+
+    async def close(self):
+        """
+        Закрыть транспорты и остановить все фоновые задачи.
+        """
+        await self.stop()
+        if self.command_transport is not None:
+            self.command_transport.close()
+            self.command_transport = None
+        if self.telemetry_transport is not None:
+            self.telemetry_transport.close()
+            self.telemetry_transport = None
+
+    def _send_packet(self, packet):
+        self.command_transport.sendto(packet)
+
+    def _wake_sender(self):
+        if self.command_event is None:
+            return
+        if threading.get_ident() == self.loop_thread_id:
+            self.command_event.set()
+        else:
+            self.loop.call_soon_threadsafe(self.command_event.set)
+
+    async def _send_commands_task(self):
+        """
+        Задача отправки команд лодке: аналог _send_commands_thread без отдельного потока.
+        """
+        while self.command_running:
+            try:
+                timeout = self._next_deadline() - time.monotonic()
+                if timeout > 0:
+                    try:
+                        await asyncio.wait_for(self.command_event.wait(), timeout)
+                    except asyncio.TimeoutError:
+                        pass
+                self.command_event.clear()
+                if not self.command_running:
+                    break
+
+                with self.command_condition:
+                    commands, move_since = self._take_commands()
+                self._send_pending(commands, move_since)
+            except Exception as e:
+                print("Ошибка в задаче отправки команд:", e)
+                await asyncio.sleep(self.heartbeat_interval)
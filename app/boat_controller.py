@@ -1,8 +1,13 @@
 import socket
 import struct
 import threading
-import queue
 import time
+from collections import deque
+
+from protocol import (
+    CMD_ACK, FRAME_V2, PROTOCOL_V1, PROTOCOL_V2, TELEMETRY_ECHO_STRUCT, V2_HEADER, CommandLink, unpack_frame,
+)
+from telemetry_history import TelemetryHistory
 
 # Заголовки команд
 CMD_MOVE = 0x01       # Команда для установки скоростей движения
@@ -23,6 +28,7 @@ PID_CMD_STRUCT = 'Bfff'
 # Данные телеметрии: заголовок (1 байт) + roll (float) + pitch (float) + yaw (float) + adc_value (float)
 # + pwm двигателей (float * 4)
 TELEMETRY_STRUCT = 'Bfffffffffff'  # B: unsigned char, f: float
+TELEMETRY_PACKET = struct.Struct(TELEMETRY_STRUCT)
 
 # Команда LED: заголовок (1 байт) + режим (1 байт) + R (1 байт) + G (1 байт) + B (1 байт)
 LED_CMD_STRUCT = 'BBBBB'  # B: unsigned char
@@ -36,41 +42,169 @@ MODE_CMD_STRUCT = 'BB'    # B: unsigned char
 # Команда управления пробоотборником: заголовок (1 байт) + действие (1 байт) + таймаут (2 байта, unsigned short)
 PROBE_CONTROL_STRUCT = 'BBH'  # B: unsigned char, H: unsigned short (для таймаута в секундах)
 
+# Протокол v2: если лодка в течение этого времени после первой команды v2 присылает только кадры v1,
+# контроллер переходит на протокол v1 (прежняя прошивка игнорирует кадры v2), секунды
+PROTOCOL_FALLBACK_TIMEOUT = 1.0
+
+# Имена команд для статистики отправки
+COMMAND_NAMES = {
+    CMD_MOVE: 'move',
+    CMD_PID: 'pid',
+    CMD_LED: 'led',
+    CMD_GPIO: 'gpio',
+    CMD_MODE: 'mode',
+    CMD_PROBE_CONTROL: 'probe',
+}
+
+
+class Telemetry:
+    """
+    Неизменяемый снимок телеметрии.
+
+    Хранит кортеж значений пакета TELEMETRY_STRUCT без преобразования, поля вычисляются при обращении.
+    Снимок можно передавать между потоками без копирования. Для совместимости поддерживается доступ
+    как к словарю: telemetry['yaw'], telemetry['motor_pwms'], telemetry['pid']['p'].
+    """
+    __slots__ = ('values',)
+
+    FIELDS = ('roll', 'pitch', 'yaw', 'adc_value', 'motor_pwms', 'pid')
+
+    def __init__(self, values):
+        """
+        :param values: Кортеж значений в порядке TELEMETRY_STRUCT (включая заголовок)
+        """
+        object.__setattr__(self, 'values', values)
+
+    @classmethod
+    def from_packet(cls, packet):
+        """
+        Разобрать пакет телеметрии предварительно скомпилированной структурой TELEMETRY_PACKET.
+        """
+        return cls(TELEMETRY_PACKET.unpack_from(packet))
+
+    def __setattr__(self, name, value):
+        raise AttributeError('Снимок телеметрии нельзя изменить')
+
+    @property
+    def roll(self):
+        return self.values[1]
+
+    @property
+    def pitch(self):
+        return self.values[2]
+
+    @property
+    def yaw(self):
+        return self.values[3]
+
+    @property
+    def adc_value(self):
+        return self.values[4]
+
+    @property
+    def motor_pwms(self):
+        return self.values[5:9]
+
+    @property
+    def pid(self):
+        values = self.values
+        return {'p': values[9], 'i': values[10], 'd': values[11]}
+
+    def __getitem__(self, key):
+        if key not in self.FIELDS:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def as_dict(self):
+        """
+        Представить телеметрию словарем прежнего формата (для JSON).
+        """
+        values = self.values
+        return {
+            'roll': values[1],
+            'pitch': values[2],
+            'yaw': values[3],
+            'adc_value': values[4],
+            'motor_pwms': list(values[5:9]),
+            'pid': {'p': values[9], 'i': values[10], 'd': values[11]}
+        }
+
+    def __repr__(self):
+        return f'Telemetry({self.as_dict()})'
+
+
+# Пустой снимок телеметрии до получения первого пакета
+EMPTY_TELEMETRY = Telemetry((CMD_TELEMETRY,) + (0.0,) * 11)
+
+
+class CommandLatencyStats:
+    """
+    Счетчики задержки отправки для одного типа команд.
+
+    Задержка - время от постановки команды (или изменения уставки движения) до выхода пакета из сокета.
+    """
+    __slots__ = ('count', 'total', 'max', 'last')
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.last = 0.0
+
+    def add(self, latency):
+        self.count += 1
+        self.total += latency
+        self.last = latency
+        if latency > self.max:
+            self.max = latency
+
+    def as_dict(self):
+        return {
+            'count': self.count,
+            'avg_ms': (self.total / self.count) * 1000.0 if self.count else 0.0,
+            'max_ms': self.max * 1000.0,
+            'last_ms': self.last * 1000.0,
+        }
+
 
 class BoatController:
-    def __init__(self, esp32_ip, esp32_port=5005, local_port=5006):
+    def __init__(self, esp32_ip, esp32_port=5005, local_port=5006, heartbeat_interval=0.1, history_capacity=6000,
+                 receive_timeout=1.0, receive_buffer=None, protocol_version=PROTOCOL_V1):
         """
         Класс для взаимодействия с лодкой по UDP.
 
         :param esp32_ip: IP-адрес ESP32 (лодки)
         :param esp32_port: Порт ESP32 для приема команд (по умолчанию 5005)
         :param local_port: Локальный порт для приема телеметрии (по умолчанию 5006)
+        :param heartbeat_interval: Период повторной отправки команды движения в секундах (по умолчанию 0.1)
+        :param history_capacity: Емкость истории телеметрии в кадрах (по умолчанию 6000)
+        :param receive_timeout: Таймаут приема телеметрии в секундах (по умолчанию 1.0)
+        :param receive_buffer: Размер приемного буфера сокета телеметрии SO_RCVBUF в байтах (None - системный)
+        :param protocol_version: Версия протокола команд: 1 (по умолчанию) или 2 - номера кадров, подтверждение
+                                 и повтор разовых команд, статистика потерь и RTT (см. protocol.CommandLink).
+                                 Телеметрия принимается в обеих версиях.
         """
         self.esp32_ip = esp32_ip
         self.esp32_port = esp32_port
         self.local_port = local_port
+        self.heartbeat_interval = heartbeat_interval
+        self.receive_timeout = receive_timeout
+        self.receive_buffer = receive_buffer
+        self.protocol_version = protocol_version
+        # Нумерация кадров, повтор разовых команд и статистика канала протокола v2
+        self.link = CommandLink()
 
-        # Создаем UDP сокет для отправки команд
-        self.command_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-
-        # Создаем UDP сокет для приема телеметрии
-        self.telemetry_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-        self.telemetry_socket.bind(('', self.local_port))
-        self.telemetry_socket.settimeout(1.0)
+        self._create_sockets()
 
         self.telemetry_thread = None
         self.telemetry_running = False
         self.target_heading = 0
 
-        # Хранение состояния телеметрии
-        self.telemetry_data = {
-            'roll': 0.0,
-            'pitch': 0.0,
-            'yaw': 0.0,
-            'adc_value': 0.0,
-            'motor_pwms': [0.0, 0.0, 0.0, 0.0],
-            'pid': {'p': 0, 'i': 0, 'd': 0}
-        }
+        # Хранение состояния телеметрии (неизменяемый снимок Telemetry)
+        self.telemetry_data = EMPTY_TELEMETRY
+        # Условие для ожидания новых кадров телеметрии (wait_for) и число ожидающих потоков
+        self.telemetry_condition = threading.Condition()
+        self.telemetry_waiters = 0
 
         # Хранение текущих скоростей движения
         self.current_forward_speed = 0.0
@@ -80,13 +214,47 @@ class BoatController:
         self.lock = threading.Lock()
         self.mode = 0
 
-        # Очередь команд
-        self.command_queue = queue.Queue()
+        # Результаты компьютерного зрения для миссий (VisionStage), назначаются приложением
+        self.vision = None
+
+        # История телеметрии, заполняемая в потоке приема
+        self.telemetry_history = TelemetryHistory(history_capacity)
+
+        # Подписчики на новые кадры телеметрии: callback(telemetry, packet, received_at)
+        self.telemetry_listeners = [self.telemetry_history.append]
+        # Подписчики на исходящие пакеты команд: callback(packet, sent_at)
+        self.command_listeners = []
+
+        # Очередь команд: элементы (время постановки, пакет)
+        self.command_queue = deque()
+        # Условие для пробуждения потока отправки при новой команде или новой уставке движения
+        self.command_condition = threading.Condition()
+        # Время изменения уставки движения, которая еще не отправлена (None - отправлять нечего)
+        self.move_pending_since = None
+        self.next_heartbeat = 0.0
+
+        # Статистика задержки отправки по типам команд
+        self.send_stats = {name: CommandLatencyStats() for name in COMMAND_NAMES.values()}
+        self.heartbeat_count = 0
 
         # Поток для отправки команд
         self.command_thread = None
         self.command_running = False
 
+    def _create_sockets(self):
+        """
+        Создать UDP сокеты для отправки команд и приема телеметрии.
+        """
+        # Создаем UDP сокет для отправки команд
+        self.command_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+
+        # Создаем UDP сокет для приема телеметрии
+        self.telemetry_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        if self.receive_buffer:
+            self.telemetry_socket.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, self.receive_buffer)
+        self.telemetry_socket.bind(('', self.local_port))
+        self.telemetry_socket.settimeout(self.receive_timeout)
+
     def start(self):
         """
         Запустить фоновые потоки для отправки команд и получения телеметрии.
@@ -112,7 +280,9 @@ class BoatController:
         Остановить фоновые потоки.
         """
         self.telemetry_running = False
-        self.command_running = False
+        with self.command_condition:
+            self.command_running = False
+            self.command_condition.notify()
 
         if self.telemetry_thread is not None:
             self.telemetry_thread.join()
@@ -127,31 +297,161 @@ class BoatController:
         Отправить начальный пакет для уведомления лодки об адресе и порте для телеметрии.
         """
         # Отправляем команду движения с текущими скоростями
-        packet = struct.pack(MOVE_CMD_STRUCT, CMD_MOVE, self.current_forward_speed, self.current_lateral_speed, self.current_yaw_speed)
+        self._transmit(self._pack_move_command())
+
+    def _send_packet(self, packet):
+        """
+        Отправить пакет лодке.
+        """
         self.command_socket.sendto(packet, (self.esp32_ip, self.esp32_port))
 
+    def _transmit(self, packet):
+        """
+        Отправить пакет и уведомить подписчиков на исходящие команды.
+
+        Подписчики получают кадр v1 и в протоколе v2.
+
+        :return: Время отправки по time.monotonic()
+        """
+        if self.protocol_version == PROTOCOL_V2:
+            # Разовые команды подтверждаются лодкой, команда движения повторяется heartbeat
+            self._send_packet(self.link.frame(packet, packet[0] != CMD_MOVE, time.monotonic()))
+        else:
+            self._send_packet(packet)
+        sent_at = time.monotonic()
+        for listener in self.command_listeners:
+            try:
+                listener(packet, sent_at)
+            except Exception as e:
+                print("Ошибка в обработчике команд:", e)
+        return sent_at
+
+    def _pack_move_command(self):
+        """
+        Упаковать команду движения с текущими скоростями.
+        """
+        with self.lock:
+            return struct.pack(MOVE_CMD_STRUCT, CMD_MOVE, self.current_forward_speed, self.current_lateral_speed, self.current_yaw_speed)
+
+    def _wake_sender(self):
+        """
+        Разбудить отправителя команд. Вызывается под command_condition.
+        """
+        self.command_condition.notify()
+
+    def _enqueue_command(self, packet):
+        """
+        Поставить разовую команду в очередь и разбудить поток отправки.
+        """
+        with self.command_condition:
+            self.command_queue.append((time.monotonic(), packet))
+            self._wake_sender()
+
+    def _record_send(self, packet, queued_at, sent_at):
+        """
+        Учесть задержку отправки пакета в статистике.
+        """
+        name = COMMAND_NAMES.get(packet[0])
+        if name is not None:
+            self.send_stats[name].add(sent_at - queued_at)
+
+    def _next_commands(self):
+        """
+        Дождаться команд для отправки.
+
+        Возвращает список разовых команд из очереди и время изменения уставки движения
+        (или время наступления heartbeat, если пора повторить команду движения).
+        """
+        with self.command_condition:
+            while self.command_running:
+                now = time.monotonic()
+                deadline = self._next_deadline()
+                if self.command_queue or self.move_pending_since is not None or now >= deadline:
+                    break
+                self.command_condition.wait(deadline - now)
+            return self._take_commands()
+
+    def _next_deadline(self):
+        """
+        Ближайший срок отправки без новых команд: повтор команды движения или неподтвержденной разовой команды.
+        """
+        if self.protocol_version == PROTOCOL_V2:
+            return min(self.next_heartbeat, self.link.next_deadline())
+        return self.next_heartbeat
+
+    def _take_commands(self):
+        """
+        Забрать накопленные команды. Вызывается под command_condition.
+        """
+        commands = list(self.command_queue)
+        self.command_queue.clear()
+        move_since = self.move_pending_since
+        self.move_pending_since = None
+        return commands, move_since
+
+    def _send_pending(self, commands, move_since):
+        """
+        Отправить разовые команды и, если нужно, команду движения (по изменению уставки или по heartbeat).
+        """
+        for queued_at, packet in commands:
+            self._record_send(packet, queued_at, self._transmit(packet))
+
+        if move_since is not None or time.monotonic() >= self.next_heartbeat:
+            packet = self._pack_move_command()
+            sent_at = self._transmit(packet)
+            if move_since is not None:
+                self._record_send(packet, move_since, sent_at)
+            else:
+                self.heartbeat_count += 1
+            self.next_heartbeat = sent_at + self.heartbeat_interval
+
+        if self.protocol_version == PROTOCOL_V2 and self.link.pending:
+            self._retransmit()
+
+    def _retransmit(self):
+        """
+        Повторить неподтвержденные разовые команды, срок повтора которых наступил (протокол v2).
+        """
+        frames, failed = self.link.due(time.monotonic())
+        for frame in frames:
+            self._send_packet(frame)
+        for packet in failed:
+            print("Команда не подтверждена лодкой:", COMMAND_NAMES.get(packet[0], packet[0]))
+
     def _send_commands_thread(self):
         """
         Фоновый поток для отправки команд лодке.
+
+        Разовые команды отправляются сразу после постановки в очередь, команда движения - сразу после
+        изменения уставки, а при отсутствии изменений повторяется с периодом heartbeat_interval.
         """
         while self.command_running:
             try:
-                # Проверяем, есть ли команды в очереди
-                try:
-                    # Ожидаем команду из очереди в течение определенного времени
-                    command_packet = self.command_queue.get(timeout=0.1)
-                    # Отправляем команду
-                    self.command_socket.sendto(command_packet, (self.esp32_ip, self.esp32_port))
-                except queue.Empty:
-                    # Если очередь пуста, отправляем текущую команду движения
-                    with self.lock:
-                        packet = struct.pack(MOVE_CMD_STRUCT, CMD_MOVE, self.current_forward_speed, self.current_lateral_speed, self.current_yaw_speed)
-                    self.command_socket.sendto(packet, (self.esp32_ip, self.esp32_port))
-                # Задержка перед следующей отправкой
-                time.sleep(0.1)  # Отправляем команды каждые 100 мс
+                commands, move_since = self._next_commands()
+                if not self.command_running:
+                    break
+                self._send_pending(commands, move_since)
             except Exception as e:
                 print("Ошибка в потоке отправки команд:", e)
-                time.sleep(0.1)
+                time.sleep(self.heartbeat_interval)
+
+    def get_send_stats(self):
+        """
+        Получить статистику задержки отправки по типам команд.
+
+        :return: Словарь {тип команды: {'count', 'avg_ms', 'max_ms', 'last_ms'}} и число heartbeat-пакетов
+        """
+        stats = {name: counter.as_dict() for name, counter in self.send_stats.items()}
+        stats['heartbeat_count'] = self.heartbeat_count
+        return stats
+
+    def get_link_stats(self):
+        """
+        Получить статистику канала протокола v2: потери и перестановки телеметрии, RTT, повторы разовых команд.
+        """
+        stats = self.link.stats()
+        stats['protocol_version'] = self.protocol_version
+        return stats
 
     def _receive_telemetry_thread(self):
         """
@@ -160,32 +460,117 @@ class BoatController:
         while self.telemetry_running:
             try:
                 data, addr = self.telemetry_socket.recvfrom(1024)
-                if data[0] == CMD_TELEMETRY:
-                    telemetry = self._parse_telemetry_packet(data)
-                    if telemetry:
-                        with self.lock:
-                            self.telemetry_data = telemetry
+                self._handle_telemetry_datagram(data)
             except socket.timeout:
                 pass  # Таймаут приема данных
             except Exception as e:
                 print("Ошибка при получении телеметрии:", e)
 
+    def _handle_telemetry_datagram(self, data):
+        """
+        Обработать принятую датаграмму телеметрии.
+
+        Кадры v2 (телеметрия и подтверждения) принимаются независимо от protocol_version; подписчикам
+        передается кадр телеметрии v1.
+        """
+        if not data:
+            return
+        if data[0] == FRAME_V2:
+            data = self._handle_v2_frame(data)
+            if data is None:
+                return
+        elif self.protocol_version == PROTOCOL_V2 and data[0] == CMD_TELEMETRY:
+            self._check_protocol_fallback()
+        if data[0] == CMD_TELEMETRY:
+            received_at = time.monotonic()
+            telemetry = self._parse_telemetry_packet(data)
+            if telemetry:
+                # Снимок неизменяем: замена ссылки атомарна и не требует блокировки
+                self.telemetry_data = telemetry
+                if self.telemetry_waiters:
+                    with self.telemetry_condition:
+                        self.telemetry_condition.notify_all()
+                for listener in self.telemetry_listeners:
+                    try:
+                        listener(telemetry, data, received_at)
+                    except Exception as e:
+                        print("Ошибка в обработчике телеметрии:", e)
+
+    def _handle_v2_frame(self, data):
+        """
+        Обработать кадр v2: учесть подтверждение или номер кадра телеметрии.
+
+        :return: Кадр телеметрии v1 или None (подтверждение, устаревший или поврежденный кадр)
+        """
+        if len(data) <= V2_HEADER.size:
+            return None
+        received_at = time.monotonic()
+        session, seq, _, payload = unpack_frame(data)
+        if payload[0] == CMD_ACK:
+            self.link.on_ack(payload, received_at)
+            return None
+        if payload[0] == CMD_TELEMETRY and len(payload) >= TELEMETRY_PACKET.size + TELEMETRY_ECHO_STRUCT.size:
+            # Опоздавший кадр не должен заменять более новую телеметрию
+            if self.link.on_telemetry(session, seq, payload[TELEMETRY_PACKET.size:], received_at):
+                return payload[:TELEMETRY_PACKET.size]
+        return None
+
+    def _check_protocol_fallback(self):
+        """
+        Перейти на протокол v1, если лодка не отвечает кадрами v2 (прежняя прошивка).
+        """
+        first_sent_at = self.link.first_sent_at
+        if self.link.frames_received or first_sent_at is None:
+            return
+        if time.monotonic() - first_sent_at > PROTOCOL_FALLBACK_TIMEOUT:
+            self.protocol_version = PROTOCOL_V1
+            print("Лодка не поддерживает протокол v2, используется протокол v1")
+            # Разовые команды, отправленные кадрами v2, прежняя прошивка не применила
+            for packet in self.link.reset():
+                self._enqueue_command(packet)
+
+    def add_telemetry_listener(self, listener):
+        """
+        Подписаться на новые кадры телеметрии.
+
+        Обработчик вызывается в потоке приема телеметрии для каждого разобранного пакета и не должен блокироваться.
+
+        :param listener: Функция listener(telemetry, packet, received_at), где packet - исходные байты пакета,
+                         received_at - время приема по time.monotonic()
+        """
+        # Список заменяется целиком, чтобы поток приема мог обходить его без блокировки
+        self.telemetry_listeners = self.telemetry_listeners + [listener]
+
+    def remove_telemetry_listener(self, listener):
+        """
+        Отписаться от кадров телеметрии.
+        """
+        self.telemetry_listeners = [l for l in self.telemetry_listeners if l != listener]
+
+    def add_command_listener(self, listener):
+        """
+        Подписаться на исходящие пакеты команд (включая повторы команды движения).
+
+        Обработчик вызывается в потоке (задаче) отправки сразу после отправки пакета и не должен блокироваться.
+
+        :param listener: Функция listener(packet, sent_at), где sent_at - время отправки по time.monotonic()
+        """
+        self.command_listeners = self.command_listeners + [listener]
+
+    def remove_command_listener(self, listener):
+        """
+        Отписаться от исходящих пакетов команд.
+        """
+        self.command_listeners = [l for l in self.command_listeners if l != listener]
+
     def _parse_telemetry_packet(self, packet):
         """
         Разбор пакета телеметрии.
+
+        :return: Снимок Telemetry или None, если пакет поврежден
         """
         try:
-            unpacked = struct.unpack(TELEMETRY_STRUCT, packet)
-            _, roll, pitch, yaw, adc_value, motor1_pwm, motor2_pwm, motor3_pwm, motor4_pwm, kp, ki, kd = unpacked
-            telemetry = {
-                'roll': roll,
-                'pitch': pitch,
-                'yaw': yaw,
-                'adc_value': adc_value,
-                'motor_pwms': [motor1_pwm, motor2_pwm, motor3_pwm, motor4_pwm],
-                'pid': {'p': kp, 'i': ki, 'd': kd}
-            }
-            return telemetry
+            return Telemetry.from_packet(packet)
         except Exception as e:
             print("Ошибка при разборе пакета телеметрии:", e)
             return None
@@ -194,13 +579,53 @@ class BoatController:
         """
         Получить последнюю полученную телеметрию.
 
-        :return: Словарь с телеметрией
+        Снимок неизменяем, поэтому возвращается без копирования.
+
+        :return: Снимок Telemetry (поддерживает доступ как к словарю, as_dict() - обычный словарь)
         """
-        with self.lock:
-            return self.telemetry_data.copy()
+        return self.telemetry_data
+
+    def wait_for(self, predicate, timeout=None, cancel_token=None):
+        """
+        Дождаться кадра телеметрии, удовлетворяющего условию.
+
+        Условие проверяется сразу и затем при приходе каждого нового кадра, поэтому задержка реакции
+        ограничена частотой телеметрии, а не периодом опроса.
+
+        :param predicate: Функция predicate(telemetry) -> bool, должна выполняться быстро
+        :param timeout: Максимальное время ожидания в секундах (None - без ограничения)
+        :param cancel_token: Признак отмены с методом is_set(); ожидание прерывается вызовом interrupt_waiters()
+        :return: Кадр Telemetry, удовлетворивший условию, или None по истечении timeout или при отмене
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self.telemetry_condition:
+            self.telemetry_waiters += 1
+            try:
+                while True:
+                    telemetry = self.telemetry_data
+                    if predicate(telemetry):
+                        return telemetry
+                    if cancel_token is not None and cancel_token.is_set():
+                        return None
+                    if deadline is None:
+                        self.telemetry_condition.wait()
+                    else:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            return None
+                        self.telemetry_condition.wait(remaining)
+            finally:
+                self.telemetry_waiters -= 1
+
+    def interrupt_waiters(self):
+        """
+        Разбудить все потоки в wait_for, чтобы они проверили признак отмены.
+        """
+        with self.telemetry_condition:
+            self.telemetry_condition.notify_all()
 
     def get_current_yaw(self):
-        return self.telemetry_data['yaw']
+        return self.telemetry_data.yaw
 
     def set_target_heading(self, heading):
         with self.lock:
@@ -220,6 +645,11 @@ class BoatController:
             self.current_forward_speed = forward_speed
             self.current_lateral_speed = lateral_speed
             self.current_yaw_speed = yaw_speed
+        # Будим поток отправки, чтобы новая уставка ушла без ожидания heartbeat
+        with self.command_condition:
+            if self.move_pending_since is None:
+                self.move_pending_since = time.monotonic()
+            self._wake_sender()
 
     def send_pid_command(self, p_gain, i_gain, d_gain):
         """
@@ -230,7 +660,7 @@ class BoatController:
         :param d_gain: Дифференциальный коэффициент (float)
         """
         packet = struct.pack(PID_CMD_STRUCT, CMD_PID, p_gain, i_gain, d_gain)
-        self.command_queue.put(packet)
+        self._enqueue_command(packet)
 
     def send_probe_command(self, direction, timeout=0):
         """
@@ -240,7 +670,7 @@ class BoatController:
         :param timeout: Время в секундах до остановки(int)
         """
         packet = struct.pack(PROBE_CONTROL_STRUCT, CMD_PROBE_CONTROL, direction, timeout)
-        self.command_queue.put(packet)
+        self._enqueue_command(packet)
 
     def send_led_command(self, mode, r, g, b):
         """
@@ -252,7 +682,7 @@ class BoatController:
         :param b: Синий компонент (0-255)
         """
         packet = struct.pack(LED_CMD_STRUCT, CMD_LED, mode, r, g, b)
-        self.command_queue.put(packet)
+        self._enqueue_command(packet)
 
     def send_gpio_command(self, state):
         """
@@ -261,7 +691,7 @@ class BoatController:
         :param state: Состояние GPIO (0: низкий уровень, 1: высокий уровень)
         """
         packet = struct.pack(GPIO_CMD_STRUCT, CMD_GPIO, state)
-        self.command_queue.put(packet)
+        self._enqueue_command(packet)
 
     def send_mode_command(self, mode):
         """
@@ -271,7 +701,7 @@ class BoatController:
         """
         packet = struct.pack(MODE_CMD_STRUCT, CMD_MODE, mode)
         self.mode = mode
-        self.command_queue.put(packet)
+        self._enqueue_command(packet)
 
     def close(self):
         """
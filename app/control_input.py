@@ -0,0 +1,223 @@
+import asyncio
+import itertools
+import json
+import math
+import time
+
+# Уставка по умолчанию для отсутствующих полей: forward, lateral, yaw, speedMultiplier
+DEFAULT_SETPOINT = (0.0, 0.0, 0.0, 100.0)
+SETPOINT_FIELDS = ('forward', 'lateral', 'yaw', 'speedMultiplier')
+
+# Текстовые команды аренды управления
+LEASE_ACQUIRE = 'lease'
+LEASE_RELEASE = 'release'
+
+
+def parse_control_message(message):
+    """
+    Разобрать сообщение управления.
+
+    Быстрый путь - компактный формат "forward,lateral,yaw,speedMultiplier" (split и float без разбора JSON).
+    Сообщения JSON {"forward": ..., "lateral": ..., "yaw": ..., "speedMultiplier": ...} поддерживаются
+    для совместимости; отсутствующие поля и null заменяются значениями DEFAULT_SETPOINT.
+
+    :return: Кортеж (forward, lateral, yaw, speed_multiplier)
+    :raises ValueError: Сообщение пустое, не удалось разобрать или содержит nan и inf
+    """
+    if not message:
+        raise ValueError('Пустое сообщение')
+    if message[0] != '{':
+        values = message.split(',')
+        if len(values) != 4:
+            raise ValueError(f'Ожидалось 4 значения, получено {len(values)}')
+        setpoint = (float(values[0]), float(values[1]), float(values[2] or 0.0), float(values[3]))
+    else:
+        data = json.loads(message)
+        values = []
+        for name, default in zip(SETPOINT_FIELDS, DEFAULT_SETPOINT):
+            value = data.get(name)
+            values.append(default if value is None else float(value))
+        setpoint = tuple(values)
+    if not all(math.isfinite(value) for value in setpoint):
+        raise ValueError('Уставка содержит nan или inf')
+    return setpoint
+
+
+class ControlClient:
+    """
+    Подключенный пульт оператора и его статистика.
+    """
+    __slots__ = ('id', 'address', 'messages', 'applied', 'merged', 'rejected', 'errors',
+                 'last_input_at', 'window_start', 'window_count', 'rate', 'denied_notified')
+
+    def __init__(self, client_id, address):
+        self.id = client_id
+        self.address = address
+        self.messages = 0   # Все принятые сообщения
+        self.applied = 0    # Уставки, переданные контроллеру
+        self.merged = 0     # Сообщения, замененные более новыми до такта управления
+        self.rejected = 0   # Сообщения без аренды управления
+        self.errors = 0     # Сообщения, которые не удалось разобрать
+        self.last_input_at = 0.0
+        self.window_start = time.monotonic()
+        self.window_count = 0
+        self.rate = 0.0     # Частота сообщений за последнее окно (Гц)
+        self.denied_notified = False
+
+    def count_input(self, now):
+        self.messages += 1
+        self.window_count += 1
+        elapsed = now - self.window_start
+        if elapsed >= 1.0:
+            self.rate = self.window_count / elapsed
+            self.window_start = now
+            self.window_count = 0
+
+    def input_rate(self, now):
+        """
+        Частота сообщений (Гц): по последнему полному окну или по текущему, если полного еще нет.
+        """
+        if self.rate or not self.window_count:
+            return self.rate
+        elapsed = now - self.window_start
+        return self.window_count / elapsed if elapsed > 0 else 0.0
+
+    def as_dict(self, holder):
+        return {
+            'id': self.id,
+            'address': self.address,
+            'holder': holder,
+            'messages': self.messages,
+            'applied': self.applied,
+            'merged': self.merged,
+            'rejected': self.rejected,
+            'errors': self.errors,
+            'rate_hz': self.input_rate(time.monotonic()),
+        }
+
+
+class ControlInput:
+    """
+    Прием управления от пультов: аренда управления и объединение частых сообщений.
+
+    Управляет один оператор - держатель аренды. Аренду получает первый пульт, отправивший уставку (или
+    команду "lease"), когда аренда свободна; она освобождается командой "release", отключением пульта или
+    после lease_timeout секунд без сообщений. Сообщения остальных пультов отклоняются до разбора.
+
+    Уставки держателя передаются контроллеру не чаще rate раз в секунду: первое сообщение после паузы
+    применяется сразу, а сообщения, пришедшие в пределах такта, заменяют друг друга, и в конце такта
+    разбирается и применяется только последнее.
+    """
+
+    def __init__(self, apply, rate=50.0, lease_timeout=2.0):
+        """
+        :param apply: Функция apply(setpoint, received_at), setpoint - результат parse_control_message
+        :param rate: Максимальная частота передачи уставок контроллеру (Гц)
+        :param lease_timeout: Время без сообщений, после которого аренда освобождается (с)
+        """
+        self.apply = apply
+        self.period = 1.0 / rate
+        self.lease_timeout = lease_timeout
+        self.clients = {}
+        self.client_ids = itertools.count(1)
+        self.holder = None
+        self.pending = None       # (сообщение, время приема) последней неприменённой уставки
+        self.next_apply_at = 0.0  # Время, раньше которого следующая уставка откладывается
+        self.flush_handle = None
+
+    def connect(self, address=None):
+        client = ControlClient(next(self.client_ids), str(address) if address else None)
+        self.clients[client.id] = client
+        return client
+
+    def disconnect(self, client):
+        self.clients.pop(client.id, None)
+        if self.holder is client:
+            self._flush()
+            self.holder = None
+
+    def lease_holder(self, now):
+        """
+        Текущий держатель аренды (с учетом истечения срока).
+        """
+        holder = self.holder
+        if holder is not None and now - holder.last_input_at > self.lease_timeout:
+            self._flush()
+            self.holder = holder = None
+        return holder
+
+    def handle(self, client, message, received_at):
+        """
+        Обработать сообщение пульта. Вызывается в цикле событий.
+
+        :return: Текст ответа пульту или None
+        """
+        if not message:
+            return None
+        client.count_input(received_at)
+        holder = self.lease_holder(received_at)
+        if holder is not client:
+            if holder is not None:
+                # Отказ без разбора сообщения; пульт уведомляется один раз до смены держателя
+                client.rejected += 1
+                if client.denied_notified:
+                    return None
+                client.denied_notified = True
+                return json.dumps({'lease': 'denied', 'holder': holder.id})
+            if message == LEASE_RELEASE:
+                return json.dumps({'lease': 'released'})
+            self.holder = holder = client
+            self._reset_denied()
+
+        client.last_input_at = received_at
+        if message == LEASE_ACQUIRE:
+            return json.dumps({'lease': 'granted', 'client': client.id})
+        if message == LEASE_RELEASE:
+            self._flush()
+            self.holder = None
+            self._reset_denied()
+            return json.dumps({'lease': 'released'})
+
+        if self.pending is not None:
+            client.merged += 1
+        self.pending = (message, received_at)
+        if received_at >= self.next_apply_at:
+            self._flush()
+        elif self.flush_handle is None:
+            loop = asyncio.get_running_loop()
+            self.flush_handle = loop.call_later(self.next_apply_at - received_at, self._flush)
+        return None
+
+    def _flush(self):
+        """
+        Применить последнюю отложенную уставку.
+        """
+        if self.flush_handle is not None:
+            self.flush_handle.cancel()
+            self.flush_handle = None
+        if self.pending is None:
+            return
+        message, received_at = self.pending
+        self.pending = None
+        holder = self.holder
+        try:
+            setpoint = parse_control_message(message)
+        except (ValueError, TypeError, AttributeError):
+            if holder is not None:
+                holder.errors += 1
+            return
+        self.next_apply_at = time.monotonic() + self.period
+        if holder is not None:
+            holder.applied += 1
+        self.apply(setpoint, received_at)
+
+    def _reset_denied(self):
+        for client in self.clients.values():
+            client.denied_notified = False
+
+    def stats(self):
+        holder = self.holder
+        return {
+            'holder': holder.id if holder is not None else None,
+            'clients': [client.as_dict(client is holder) for client in self.clients.values()],
+        }
@@ -0,0 +1,424 @@
+import asyncio
+import socket
+import struct
+import threading
+import time
+
+import numpy as np
+
+from boat_controller import (
+    CMD_GPIO, CMD_LED, CMD_MODE, CMD_MOVE, CMD_PID, CMD_PROBE_CONTROL, CMD_TELEMETRY, GPIO_CMD_STRUCT,
+    LED_CMD_STRUCT, MODE_CMD_STRUCT, MOVE_CMD_STRUCT, PID_CMD_STRUCT, PROBE_CONTROL_STRUCT, TELEMETRY_PACKET,
+    Telemetry,
+)
+
+MOVE_PACKET = struct.Struct(MOVE_CMD_STRUCT)
+PACKET_SIZE = TELEMETRY_PACKET.size
+
+# Столбцы таблицы значений телеметрии FleetManager.values (порядок TELEMETRY_STRUCT без заголовка)
+VALUE_ROLL, VALUE_PITCH, VALUE_YAW, VALUE_ADC = range(4)
+
+# Лодка считается на связи, если телеметрия приходила не раньше этого времени назад (с)
+ONLINE_TIMEOUT = 1.0
+
+
+class _FleetProtocol(asyncio.DatagramProtocol):
+    """
+    Протокол общего сокета флота: датаграммы передаются менеджеру прямо в цикле событий.
+    """
+
+    def __init__(self, fleet):
+        self.fleet = fleet
+
+    def datagram_received(self, data, addr):
+        try:
+            self.fleet._handle_datagram(data, addr)
+        except Exception as e:
+            print("Ошибка при получении телеметрии флота:", e)
+
+    def error_received(self, exc):
+        print("Ошибка сокета флота:", exc)
+
+
+class FleetBoat:
+    """
+    Лодка флота с API BoatController: send_*, get_telemetry, get_current_yaw, wait_for, подписка на телеметрию.
+
+    Объект хранит только индекс лодки, состояние находится в массивах FleetManager. Методы можно
+    вызывать из любого потока (например, из потока миссии): пакеты отправляются в цикле событий флота.
+    """
+
+    def __init__(self, fleet, index, boat_id, address):
+        self.fleet = fleet
+        self.index = index
+        self.id = boat_id
+        self.esp32_ip, self.esp32_port = address
+        # Результаты компьютерного зрения для миссий, назначаются приложением
+        self.vision = None
+
+    @property
+    def mode(self):
+        return int(self.fleet.modes[self.index])
+
+    @property
+    def target_heading(self):
+        return float(self.fleet.target_headings[self.index])
+
+    def get_telemetry(self):
+        return self.fleet.get_telemetry(self.index)
+
+    def get_current_yaw(self):
+        return float(self.fleet.values[self.index, VALUE_YAW])
+
+    def wait_for(self, predicate, timeout=None, cancel_token=None):
+        return self.fleet.wait_for(self.index, predicate, timeout, cancel_token)
+
+    def interrupt_waiters(self):
+        self.fleet.interrupt_waiters()
+
+    def add_telemetry_listener(self, listener):
+        """
+        Подписаться на кадры телеметрии этой лодки: listener(telemetry, packet, received_at), вызывается в цикле событий.
+        """
+        self.fleet.listeners[self.index] = self.fleet.listeners[self.index] + [listener]
+
+    def remove_telemetry_listener(self, listener):
+        self.fleet.listeners[self.index] = [l for l in self.fleet.listeners[self.index] if l != listener]
+
+    def set_target_heading(self, heading):
+        self.fleet.target_headings[self.index] = heading
+
+    def send_movement_command(self, forward_speed, lateral_speed, yaw_speed):
+        self.fleet.set_movement(self.index, forward_speed, lateral_speed, yaw_speed)
+
+    def send_pid_command(self, p_gain, i_gain, d_gain):
+        self.fleet.send(self.index, struct.pack(PID_CMD_STRUCT, CMD_PID, p_gain, i_gain, d_gain))
+
+    def send_probe_command(self, direction, timeout=0):
+        self.fleet.send(self.index, struct.pack(PROBE_CONTROL_STRUCT, CMD_PROBE_CONTROL, direction, timeout))
+
+    def send_led_command(self, mode, r, g, b):
+        self.fleet.send(self.index, struct.pack(LED_CMD_STRUCT, CMD_LED, mode, r, g, b))
+
+    def send_gpio_command(self, state):
+        self.fleet.send(self.index, struct.pack(GPIO_CMD_STRUCT, CMD_GPIO, state))
+
+    def send_mode_command(self, mode):
+        self.fleet.modes[self.index] = mode
+        self.fleet.send(self.index, struct.pack(MODE_CMD_STRUCT, CMD_MODE, mode))
+
+    def stats(self):
+        return self.fleet.boat_stats(self.index)
+
+
+class FleetManager:
+    """
+    Пул лодок на одном UDP сокете в цикле событий asyncio.
+
+    Команды всем лодкам отправляются с одного сокета, привязанного к local_port, поэтому каждая лодка
+    отправляет телеметрию на этот же порт. Входящие датаграммы распределяются по адресу источника:
+    сначала по точному (ip, порт), затем по одному ip, если на этом адресе зарегистрирована одна лодка.
+
+    Состояние лодок хранится в массивах по индексу лодки: последние пакеты телеметрии лежат подряд
+    в одном буфере (values - представление значений float32 без копирования), уставки, режимы, время
+    приема и счетчики - в массивах NumPy. Прием пакета - копирование 48 байт в буфер; снимок Telemetry
+    создается только для подписчиков и по запросу. Повтор команды движения выполняет одна задача
+    для всех лодок: за такт отправляются все уставки, срок повтора которых наступает в пределах
+    четверти heartbeat_interval.
+    """
+
+    def __init__(self, local_port=5007, heartbeat_interval=0.1, receive_buffer=None, capacity=16):
+        """
+        :param local_port: Локальный порт общего сокета (команды и телеметрия)
+        :param heartbeat_interval: Период повтора команды движения в секундах
+        :param receive_buffer: Размер приемного буфера сокета SO_RCVBUF в байтах (None - системный)
+        :param capacity: Начальная емкость массивов (растет вдвое при добавлении лодок)
+        """
+        self.local_port = local_port
+        self.heartbeat_interval = heartbeat_interval
+        self.receive_buffer = receive_buffer
+
+        self.boats = {}
+        self.ids = []
+        self.addresses = []
+        self.listeners = []
+        self.routes = {}     # (ip, порт) -> индекс лодки
+        self.ip_routes = {}  # ip -> индекс лодки (None, если лодок на этом ip несколько)
+        self.count = 0
+        self._allocate(capacity)
+
+        # Ожидание телеметрии в wait_for: общее условие и число ожидающих потоков по лодкам
+        self.condition = threading.Condition()
+
+        self.loop = None
+        self.loop_thread_id = None
+        self.transport = None
+        self.heartbeat_task = None
+        self.wake = None
+        self.running = False
+
+        # Статистика
+        self.unrouted = 0
+        self.invalid = 0
+        self.heartbeat_ticks = 0
+
+    def _allocate(self, capacity):
+        """
+        Выделить массивы состояния емкостью capacity лодок с сохранением данных уже добавленных лодок.
+        """
+        count = self.count
+        buffer = bytearray(capacity * PACKET_SIZE)
+        packets = np.frombuffer(buffer, dtype=np.uint8).reshape(capacity, PACKET_SIZE)
+        packets[:, 0] = CMD_TELEMETRY
+        if count:
+            packets[:count] = self.packets[:count]
+        self.capacity = capacity
+        self.buffer = buffer
+        self.buffer_view = memoryview(buffer)
+        self.packets = packets
+        # Значения пакета после заголовка и выравнивания (формат без префикса: float с 4-го байта)
+        self.values = packets.view(np.float32)[:, 1:]
+
+        def grow(array, fill=0):
+            grown = np.full((capacity,) + array.shape[1:], fill, dtype=array.dtype)
+            grown[:count] = array[:count]
+            return grown
+
+        if count:
+            self.setpoints = grow(self.setpoints)
+            self.target_headings = grow(self.target_headings)
+            self.modes = grow(self.modes)
+            self.received_at = grow(self.received_at)
+            self.telemetry_counts = grow(self.telemetry_counts)
+            self.commands_sent = grow(self.commands_sent)
+            self.next_heartbeat = grow(self.next_heartbeat, np.inf)
+            self.waiters = grow(self.waiters)
+        else:
+            self.setpoints = np.zeros((capacity, 3), dtype=np.float32)
+            self.target_headings = np.zeros(capacity, dtype=np.float32)
+            self.modes = np.zeros(capacity, dtype=np.uint8)
+            self.received_at = np.zeros(capacity)
+            self.telemetry_counts = np.zeros(capacity, dtype=np.int64)
+            self.commands_sent = np.zeros(capacity, dtype=np.int64)
+            self.next_heartbeat = np.full(capacity, np.inf)
+            self.waiters = np.zeros(capacity, dtype=np.int32)
+
+    def add_boat(self, boat_id, ip, port=5005):
+        """
+        Зарегистрировать лодку. Вызывается из цикла событий или до start().
+
+        :param boat_id: Идентификатор лодки (строка, используется в URL)
+        :param ip: IP-адрес ESP32 лодки
+        :param port: Порт приема команд лодки
+        :return: FleetBoat
+        """
+        if boat_id in self.boats:
+            raise ValueError(f'Лодка {boat_id} уже зарегистрирована')
+        if self.count == self.capacity:
+            self._allocate(self.capacity * 2)
+        index = self.count
+        address = (socket.gethostbyname(ip), port)
+        self.count += 1
+        self.ids.append(boat_id)
+        self.addresses.append(address)
+        self.listeners.append([])
+        self.routes[address] = index
+        self.ip_routes[address[0]] = None if address[0] in self.ip_routes else index
+
+        boat = FleetBoat(self, index, boat_id, address)
+        self.boats[boat_id] = boat
+        if self.running:
+            self._call(self._send_move, index)
+        return boat
+
+    def get(self, boat_id):
+        return self.boats.get(boat_id)
+
+    async def start(self):
+        """
+        Открыть общий сокет и запустить задачу повтора команд движения в текущем цикле событий.
+        """
+        self.loop = asyncio.get_running_loop()
+        self.loop_thread_id = threading.get_ident()
+        self.wake = asyncio.Event()
+        self.transport, _ = await self.loop.create_datagram_endpoint(
+            lambda: _FleetProtocol(self), local_addr=('0.0.0.0', self.local_port))
+        if self.receive_buffer:
+            self.transport.get_extra_info('socket').setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, self.receive_buffer)
+        self.running = True
+        # Начальные пакеты: лодки узнают адрес и порт для телеметрии
+        for index in range(self.count):
+            self._send_move(index)
+        self.heartbeat_task = self.loop.create_task(self._heartbeat_task())
+
+    async def close(self):
+        """
+        Остановить задачу повтора и закрыть сокет.
+        """
+        self.running = False
+        if self.heartbeat_task is not None:
+            self.wake.set()
+            await self.heartbeat_task
+            self.heartbeat_task = None
+        if self.transport is not None:
+            self.transport.close()
+            self.transport = None
+        self.interrupt_waiters()
+
+    def _call(self, callback, *args):
+        """
+        Выполнить callback в цикле событий флота: сразу, если вызвано из него, иначе через call_soon_threadsafe.
+        """
+        if threading.get_ident() == self.loop_thread_id:
+            callback(*args)
+        else:
+            self.loop.call_soon_threadsafe(callback, *args)
+
+    def _handle_datagram(self, data, addr):
+        index = self.routes.get(addr)
+        if index is None:
+            index = self.ip_routes.get(addr[0])
+            if index is None:
+                self.unrouted += 1
+                return
+        if len(data) < PACKET_SIZE or data[0] != CMD_TELEMETRY:
+            self.invalid += 1
+            return
+        received_at = time.monotonic()
+        offset = index * PACKET_SIZE
+        self.buffer_view[offset:offset + PACKET_SIZE] = data[:PACKET_SIZE]
+        self.received_at[index] = received_at
+        self.telemetry_counts[index] += 1
+        if self.waiters[index]:
+            with self.condition:
+                self.condition.notify_all()
+        listeners = self.listeners[index]
+        if listeners:
+            telemetry = Telemetry(TELEMETRY_PACKET.unpack_from(data))
+            for listener in listeners:
+                try:
+                    listener(telemetry, data, received_at)
+                except Exception as e:
+                    print("Ошибка в обработчике телеметрии:", e)
+
+    def get_telemetry(self, index):
+        """
+        Снимок Telemetry последнего пакета лодки (пустой снимок до получения первого пакета).
+        """
+        return Telemetry(TELEMETRY_PACKET.unpack_from(self.buffer, index * PACKET_SIZE))
+
+    def wait_for(self, index, predicate, timeout=None, cancel_token=None):
+        """
+        Дождаться кадра телеметрии лодки index, удовлетворяющего условию (см. BoatController.wait_for).
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self.condition:
+            self.waiters[index] += 1
+            try:
+                while True:
+                    telemetry = self.get_telemetry(index)
+                    if predicate(telemetry):
+                        return telemetry
+                    if cancel_token is not None and cancel_token.is_set():
+                        return None
+                    if deadline is None:
+                        self.condition.wait()
+                    else:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            return None
+                        self.condition.wait(remaining)
+            finally:
+                self.waiters[index] -= 1
+
+    def interrupt_waiters(self):
+        with self.condition:
+            self.condition.notify_all()
+
+    def set_movement(self, index, forward_speed, lateral_speed, yaw_speed):
+        """
+        Установить уставку движения лодки и отправить ее без ожидания повтора.
+        """
+        if self.modes[index]:
+            yaw_speed = self.target_headings[index]
+        self.setpoints[index] = (forward_speed, lateral_speed, yaw_speed)
+        if self.running:
+            self._call(self._send_move, index)
+
+    def send(self, index, packet):
+        """
+        Отправить пакет команды лодке index.
+        """
+        if self.running:
+            self._call(self._transmit, index, packet)
+
+    def _transmit(self, index, packet):
+        if self.transport is None:
+            return
+        self.transport.sendto(packet, self.addresses[index])
+        self.commands_sent[index] += 1
+
+    def _send_move(self, index):
+        forward, lateral, yaw = self.setpoints[index].tolist()
+        self._transmit(index, MOVE_PACKET.pack(CMD_MOVE, forward, lateral, yaw))
+        next_heartbeat = self.next_heartbeat[index]
+        self.next_heartbeat[index] = time.monotonic() + self.heartbeat_interval
+        if next_heartbeat == np.inf:
+            self.wake.set()
+
+    async def _heartbeat_task(self):
+        """
+        Повтор команды движения для всех лодок одной задачей.
+        """
+        slack = self.heartbeat_interval * 0.25
+        while self.running:
+            try:
+                count = self.count
+                now = time.monotonic()
+                timeout = float(self.next_heartbeat[:count].min()) - now if count else np.inf
+                if timeout > 0:
+                    self.wake.clear()
+                    try:
+                        await asyncio.wait_for(self.wake.wait(), None if timeout == np.inf else timeout)
+                    except asyncio.TimeoutError:
+                        pass
+                    continue
+                self.heartbeat_ticks += 1
+                for index in np.flatnonzero(self.next_heartbeat[:count] <= now + slack).tolist():
+                    self._send_move(index)
+            except Exception as e:
+                print("Ошибка в задаче повтора команд флота:", e)
+                await asyncio.sleep(self.heartbeat_interval)
+
+    def boat_stats(self, index):
+        now = time.monotonic()
+        received_at = self.received_at[index]
+        return {
+            'id': self.ids[index],
+            'address': f'{self.addresses[index][0]}:{self.addresses[index][1]}',
+            'online': bool(received_at and now - received_at < ONLINE_TIMEOUT),
+            'telemetry_age_ms': (now - received_at) * 1000.0 if received_at else None,
+            'telemetry_count': int(self.telemetry_counts[index]),
+            'commands_sent': int(self.commands_sent[index]),
+            'mode': int(self.modes[index]),
+            'yaw': float(self.values[index, VALUE_YAW]),
+        }
+
+    def stats(self):
+        """
+        Сводка флота: число лодок на связи и счетчики общего сокета, плюс строки по лодкам.
+        """
+        count = self.count
+        now = time.monotonic()
+        received_at = self.received_at[:count]
+        online = (received_at > 0) & (now - received_at < ONLINE_TIMEOUT)
+        return {
+            'boats': count,
+            'online': int(online.sum()),
+            'telemetry_count': int(self.telemetry_counts[:count].sum()),
+            'commands_sent': int(self.commands_sent[:count].sum()),
+            'heartbeat_ticks': self.heartbeat_ticks,
+            'unrouted': self.unrouted,
+            'invalid': self.invalid,
+            'fleet': [self.boat_stats(index) for index in range(count)],
+        }
@@ -0,0 +1,218 @@
+import glob
+import mmap
+import os
+import struct
+import threading
+import time
+
+import numpy as np
+
+from boat_controller import TELEMETRY_PACKET
+
+# Формат файла записи:
+# заголовок (64 байта): сигнатура (8 байт) + версия (uint32) + размер записи (uint32)
+# + время создания (double, секунды Unix) + число записей (uint64), далее записи фиксированного размера.
+# Запись (64 байта): время (double, time.monotonic()) + тип (uint8) + длина данных (uint8) + 6 байт выравнивания
+# + исходные байты пакета (до 48 байт).
+RECORDER_MAGIC = b'RBREC\x00\x00\x01'
+RECORDER_VERSION = 1
+HEADER_STRUCT = struct.Struct('<8sIIdQ')
+HEADER_SIZE = 64
+COUNT_OFFSET = 24
+RECORD_STRUCT = struct.Struct('<dBB6x48s')
+RECORD_SIZE = RECORD_STRUCT.size
+PAYLOAD_OFFSET = 16
+PAYLOAD_SIZE = 48
+
+# Типы записей
+RECORD_TELEMETRY = 0
+RECORD_COMMAND = 1
+
+# Запись целиком для чтения через NumPy
+RECORD_DTYPE = np.dtype({
+    'names': ['t', 'kind', 'length', 'payload'],
+    'formats': ['<f8', 'u1', 'u1', ('u1', PAYLOAD_SIZE)],
+    'offsets': [0, 8, 9, PAYLOAD_OFFSET],
+    'itemsize': RECORD_SIZE,
+})
+
+# Та же запись, где данные пакета телеметрии видны как 11 значений float (без заголовка пакета)
+TELEMETRY_VALUES_OFFSET = TELEMETRY_PACKET.size - 11 * 4
+TELEMETRY_RECORD_DTYPE = np.dtype({
+    'names': ['t', 'kind', 'length', 'values'],
+    'formats': ['<f8', 'u1', 'u1', ('=f4', 11)],
+    'offsets': [0, 8, 9, PAYLOAD_OFFSET + TELEMETRY_VALUES_OFFSET],
+    'itemsize': RECORD_SIZE,
+})
+
+
+class FlightRecorder:
+    """
+    Бортовой самописец: дописывает в файл, отображенный в память, все пакеты телеметрии и исходящие команды.
+
+    Запись выполняется прямо в потоках приема и отправки: пакет копируется в mmap без сериализации.
+    При заполнении файла (max_file_size) запись продолжается в следующий файл той же сессии.
+    """
+
+    def __init__(self, directory, max_file_size=64 * 1024 * 1024, prefix='session'):
+        """
+        :param directory: Каталог для файлов записи
+        :param max_file_size: Максимальный размер одного файла в байтах
+        :param prefix: Префикс имени файлов сессии
+        """
+        self.directory = directory
+        self.capacity = max(1, (max_file_size - HEADER_SIZE) // RECORD_SIZE)
+        self.prefix = prefix
+        self.session = None
+        self.file_index = 0
+        self.file = None
+        self.mm = None
+        self.path = None
+        self.count = 0
+        self.total = 0
+        self.lock = threading.Lock()
+
+    @property
+    def recording(self):
+        return self.mm is not None
+
+    def start(self):
+        """
+        Начать новую сессию записи.
+
+        :return: Имя сессии
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        with self.lock:
+            self._close_file()
+            self.session = f"{self.prefix}-{time.strftime('%Y%m%d-%H%M%S')}"
+            self.file_index = 0
+            self.total = 0
+            self._open_file()
+        return self.session
+
+    def close(self):
+        """
+        Завершить сессию записи.
+        """
+        with self.lock:
+            self._close_file()
+
+    def attach(self, controller):
+        """
+        Подписаться на телеметрию и команды контроллера лодки.
+        """
+        controller.add_telemetry_listener(self.record_telemetry)
+        controller.add_command_listener(self.record_command)
+
+    def detach(self, controller):
+        controller.remove_telemetry_listener(self.record_telemetry)
+        controller.remove_command_listener(self.record_command)
+
+    def record_telemetry(self, telemetry, packet, received_at):
+        """
+        Записать пакет телеметрии. Сигнатура совпадает с обработчиком BoatController.add_telemetry_listener.
+        """
+        self._append(RECORD_TELEMETRY, packet, received_at)
+
+    def record_command(self, packet, sent_at):
+        """
+        Записать исходящую команду. Сигнатура совпадает с обработчиком BoatController.add_command_listener.
+        """
+        self._append(RECORD_COMMAND, packet, sent_at)
+
+    def _append(self, kind, packet, timestamp):
+        if self.mm is None:
+            return
+        length = len(packet)
+        if length > PAYLOAD_SIZE:
+            print("Пакет слишком длинный для записи:", length)
+            return
+        with self.lock:
+            if self.mm is None:
+                return
+            if self.count >= self.capacity:
+                self._close_file()
+                self.file_index += 1
+                self._open_file()
+            RECORD_STRUCT.pack_into(self.mm, HEADER_SIZE + self.count * RECORD_SIZE, timestamp, kind, length, packet)
+            self.count += 1
+            self.total += 1
+            struct.pack_into('<Q', self.mm, COUNT_OFFSET, self.count)
+
+    def _open_file(self):
+        self.path = os.path.join(self.directory, f'{self.session}-{self.file_index:04d}.rbrec')
+        size = HEADER_SIZE + self.capacity * RECORD_SIZE
+        self.file = open(self.path, 'w+b')
+        self.file.truncate(size)
+        self.mm = mmap.mmap(self.file.fileno(), size)
+        HEADER_STRUCT.pack_into(self.mm, 0, RECORDER_MAGIC, RECORDER_VERSION, RECORD_SIZE, time.time(), 0)
+        self.count = 0
+
+    def _close_file(self):
+        if self.mm is None:
+            return
+        self.mm.flush()
+        self.mm.close()
+        self.mm = None
+        # Обрезаем неиспользованный хвост файла
+        self.file.truncate(HEADER_SIZE + self.count * RECORD_SIZE)
+        self.file.close()
+        self.file = None
+
+
+def read_header(path):
+    """
+    Прочитать заголовок файла записи.
+
+    :return: Словарь {'version', 'record_size', 'created', 'count'}
+    """
+    with open(path, 'rb') as f:
+        magic, version, record_size, created, count = HEADER_STRUCT.unpack(f.read(HEADER_STRUCT.size))
+    if magic != RECORDER_MAGIC:
+        raise ValueError(f'Файл {path} не является записью самописца')
+    return {'version': version, 'record_size': record_size, 'created': created, 'count': count}
+
+
+def load_records(path, dtype=RECORD_DTYPE):
+    """
+    Отобразить файл записи в массив NumPy без копирования.
+
+    :param path: Путь к файлу .rbrec
+    :param dtype: RECORD_DTYPE или TELEMETRY_RECORD_DTYPE
+    :return: Структурированный массив записей (np.memmap, только чтение)
+    """
+    header = read_header(path)
+    if header['count'] == 0:
+        return np.zeros(0, dtype=dtype)
+    return np.memmap(path, dtype=dtype, mode='r', offset=HEADER_SIZE, shape=(header['count'],))
+
+
+def session_files(directory, session):
+    """
+    Файлы сессии по порядку.
+    """
+    return sorted(glob.glob(os.path.join(directory, f'{glob.escape(session)}-*.rbrec')))
+
+
+def load_telemetry(path):
+    """
+    Загрузить телеметрию из файла записи.
+
+    :return: (times, values) - время приема (N,) и значения полей (N, 11) в порядке TELEMETRY_STRUCT без заголовка
+    """
+    records = load_records(path, TELEMETRY_RECORD_DTYPE)
+    telemetry = records[records['kind'] == RECORD_TELEMETRY]
+    return telemetry['t'], telemetry['values']
+
+
+def load_commands(path):
+    """
+    Загрузить исходящие команды из файла записи.
+
+    :return: (times, packets) - время отправки и список байтов пакетов
+    """
+    records = load_records(path)
+    commands = records[records['kind'] == RECORD_COMMAND]
+    packets = [row['payload'][:row['length']].tobytes() for row in commands]
+    return commands['t'], packets
@@ -0,0 +1,232 @@
+import threading
+import time
+
+from boat_controller import CMD_MOVE
+
+# Границы корзин (секунды) при выгрузке гистограмм в формате Prometheus
+EXPORT_BOUNDS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+# Этапы пути команды от джойстика до отклика в телеметрии
+STAGE_WS_TO_COMMAND = 'ws_to_command'          # прием сообщения /control -> send_movement_command
+STAGE_COMMAND_TO_WIRE = 'command_to_wire'      # send_movement_command -> отправка пакета MOVE в сокет
+STAGE_WIRE_TO_TELEMETRY = 'wire_to_telemetry'  # отправка MOVE -> первый кадр телеметрии с измененными ШИМ
+STAGE_END_TO_END = 'end_to_end'                # прием сообщения /control -> кадр телеметрии с измененными ШИМ
+STAGES = (STAGE_WS_TO_COMMAND, STAGE_COMMAND_TO_WIRE, STAGE_WIRE_TO_TELEMETRY, STAGE_END_TO_END)
+
+
+class LatencyHistogram:
+    """
+    Гистограмма задержек в стиле HDR: логарифмические диапазоны с линейными подкорзинами.
+
+    Значения хранятся в целых микросекундах с относительной погрешностью не более 2^-(sub_bucket_bits-1).
+    """
+
+    def __init__(self, max_seconds=60.0, sub_bucket_bits=5):
+        """
+        :param max_seconds: Максимальное хранимое значение (большие значения попадают в последнюю корзину)
+        :param sub_bucket_bits: Число значащих бит значения (точность)
+        """
+        self.sub_bucket_bits = sub_bucket_bits
+        self.sub_bucket_count = 1 << sub_bucket_bits
+        self.sub_bucket_half = self.sub_bucket_count >> 1
+        self.max_value = int(max_seconds * 1e6)
+        self.counts = [0] * (self._index(self.max_value) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def _index(self, value):
+        if value < self.sub_bucket_count:
+            return value
+        shift = value.bit_length() - self.sub_bucket_bits
+        return self.sub_bucket_count + (shift - 1) * self.sub_bucket_half + (value >> shift) - self.sub_bucket_half
+
+    def _upper(self, index):
+        """
+        Верхняя граница корзины в микросекундах (не включительно).
+        """
+        if index < self.sub_bucket_count:
+            return index + 1
+        shift, offset = divmod(index - self.sub_bucket_count, self.sub_bucket_half)
+        shift += 1
+        return (self.sub_bucket_half + offset + 1) << shift
+
+    def record(self, seconds):
+        value = min(max(int(seconds * 1e6), 0), self.max_value)
+        self.counts[self._index(value)] += 1
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def percentile(self, q):
+        """
+        Значение q-го процентиля (0-100) в секундах.
+        """
+        if not self.count:
+            return 0.0
+        threshold = self.count * q / 100.0
+        cumulative = 0
+        for index, count in enumerate(self.counts):
+            cumulative += count
+            if count and cumulative >= threshold:
+                return self._upper(index) / 1e6
+        return self.max
+
+    def cumulative(self, bounds=EXPORT_BOUNDS):
+        """
+        Накопленные количества для границ bounds (секунды), как в корзинах histogram Prometheus.
+        """
+        result = []
+        position = 0
+        cumulative = 0
+        for bound in bounds:
+            limit = bound * 1e6
+            while position < len(self.counts) and self._upper(position) <= limit:
+                cumulative += self.counts[position]
+                position += 1
+            result.append(cumulative)
+        return result
+
+    def summary(self):
+        return {
+            'count': self.count,
+            'avg_ms': self.total / self.count * 1000.0 if self.count else 0.0,
+            'p50_ms': self.percentile(50) * 1000.0,
+            'p99_ms': self.percentile(99) * 1000.0,
+            'max_ms': self.max * 1000.0,
+        }
+
+
+class LatencyTracer:
+    """
+    Измерение задержки по этапам: прием сообщения /control -> send_movement_command -> отправка MOVE в сокет
+    -> первый кадр телеметрии, в котором изменились ШИМ двигателей.
+
+    Пока трассировка выключена, обработчики не подключены к контроллеру, а на пути команды остается только
+    проверка флага enabled.
+    """
+
+    def __init__(self, echo_timeout=1.0):
+        """
+        :param echo_timeout: Максимальное время ожидания отклика в телеметрии (с)
+        """
+        self.echo_timeout = echo_timeout
+        self.enabled = False
+        self.controller = None
+        self.histograms = {stage: LatencyHistogram() for stage in STAGES}
+        self.lock = threading.Lock()
+        self.pending_input = None  # (время приема сообщения, время вызова send_movement_command)
+        self.awaiting_echo = None  # (время приема сообщения, время отправки MOVE, ШИМ на момент отправки)
+        self.echo_timeouts = 0
+
+    def enable(self, controller):
+        """
+        Включить трассировку и подключиться к контроллеру лодки.
+        """
+        if self.enabled:
+            return
+        self.controller = controller
+        controller.add_command_listener(self.on_command)
+        controller.add_telemetry_listener(self.on_telemetry)
+        self.enabled = True
+
+    def disable(self):
+        """
+        Выключить трассировку и отключиться от контроллера.
+        """
+        if not self.enabled:
+            return
+        self.enabled = False
+        self.controller.remove_command_listener(self.on_command)
+        self.controller.remove_telemetry_listener(self.on_telemetry)
+        with self.lock:
+            self.pending_input = None
+            self.awaiting_echo = None
+
+    def mark_input(self, received_at):
+        """
+        Отметить сообщение управления непосредственно перед вызовом send_movement_command.
+
+        :param received_at: Время приема сообщения WebSocket по time.monotonic()
+        """
+        with self.lock:
+            self.pending_input = (received_at, time.monotonic())
+
+    def on_command(self, packet, sent_at):
+        """
+        Обработчик исходящих команд (BoatController.add_command_listener).
+        """
+        if packet[0] != CMD_MOVE or self.pending_input is None:
+            return
+        with self.lock:
+            if self.pending_input is None:
+                return
+            received_at, command_at = self.pending_input
+            self.pending_input = None
+            self.histograms[STAGE_WS_TO_COMMAND].record(command_at - received_at)
+            self.histograms[STAGE_COMMAND_TO_WIRE].record(sent_at - command_at)
+            self.awaiting_echo = (received_at, sent_at, self.controller.get_telemetry().motor_pwms)
+
+    def on_telemetry(self, telemetry, packet, received_at):
+        """
+        Обработчик кадров телеметрии (BoatController.add_telemetry_listener).
+        """
+        if self.awaiting_echo is None:
+            return
+        with self.lock:
+            if self.awaiting_echo is None:
+                return
+            input_at, sent_at, pwms = self.awaiting_echo
+            if received_at - sent_at > self.echo_timeout:
+                self.awaiting_echo = None
+                self.echo_timeouts += 1
+                return
+            if telemetry.motor_pwms == pwms:
+                return
+            self.awaiting_echo = None
+            self.histograms[STAGE_WIRE_TO_TELEMETRY].record(received_at - sent_at)
+            self.histograms[STAGE_END_TO_END].record(received_at - input_at)
+
+    def summary(self):
+        result = {stage: histogram.summary() for stage, histogram in self.histograms.items()}
+        result['enabled'] = self.enabled
+        result['echo_timeouts'] = self.echo_timeouts
+        return result
+
+    def prometheus(self, prefix='roboboat'):
+        """
+        Гистограммы этапов в текстовом формате Prometheus.
+        """
+        name = f'{prefix}_control_latency_seconds'
+        lines = [
+            f'# HELP {name} Задержка этапов пути команды управления',
+            f'# TYPE {name} histogram',
+        ]
+        for stage, histogram in self.histograms.items():
+            for bound, count in zip(EXPORT_BOUNDS, histogram.cumulative()):
+                lines.append(f'{name}_bucket{{stage="{stage}",le="{bound:g}"}} {count}')
+            lines.append(f'{name}_bucket{{stage="{stage}",le="+Inf"}} {histogram.count}')
+            lines.append(f'{name}_sum{{stage="{stage}"}} {histogram.total:.9f}')
+            lines.append(f'{name}_count{{stage="{stage}"}} {histogram.count}')
+        lines.append(f'# HELP {prefix}_latency_echo_timeouts_total Команды без отклика в телеметрии')
+        lines.append(f'# TYPE {prefix}_latency_echo_timeouts_total counter')
+        lines.append(f'{prefix}_latency_echo_timeouts_total {self.echo_timeouts}')
+        return '\n'.join(lines) + '\n'
+
+
+def send_stats_prometheus(send_stats, prefix='roboboat'):
+    """
+    Статистика отправки BoatController.get_send_stats() в текстовом формате Prometheus.
+    """
+    lines = [
+        f'# HELP {prefix}_commands_sent_total Отправленные команды по типам',
+        f'# TYPE {prefix}_commands_sent_total counter',
+    ]
+    for name, stats in send_stats.items():
+        if isinstance(stats, dict):
+            lines.append(f'{prefix}_commands_sent_total{{command="{name}"}} {stats["count"]}')
+    lines.append(f'# HELP {prefix}_move_heartbeats_total Повторы команды движения без изменения уставки')
+    lines.append(f'# TYPE {prefix}_move_heartbeats_total counter')
+    lines.append(f'{prefix}_move_heartbeats_total {send_stats.get("heartbeat_count", 0)}')
+    return '\n'.join(lines) + '\n'
@@ -1,81 +1,254 @@
 import asyncio
+import functools
+import inspect
 import json
-import time
 import threading
 import os
+import time
 import uvicorn
-from websockets.asyncio.async_timeout import timeout
-
-from boat_controller import BoatController
-from fastapi import FastAPI, Request, WebSocket, WebSocketDisconnect, UploadFile, File, Form
+from contextlib import asynccontextmanager
+
+from async_boat_controller import AsyncBoatController
+from control_input import ControlInput
+from fleet import FleetManager
+from flight_recorder import FlightRecorder
+from latency import LatencyTracer, send_stats_prometheus
+from mission_log import MissionLog
+from mission_loader import MissionLibrary, MissionLoadError
+from mission_process import ProcessMissionRunner
+from mission_runtime import CancelToken
+from rate_sweep import run_rate_sweep
+from settings import Settings
+from telemetry_history import HISTORY_FIELDS
+from vision import VisionStage, detect_buoy
+from webrtc_video import VideoService
+from telemetry_hub import TelemetryHub, ENCODING_BINARY, ENCODINGS, encode_telemetry
+from fastapi import APIRouter, FastAPI, Request, WebSocket, WebSocketDisconnect, UploadFile, File, Form
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse, JSONResponse
+from fastapi.responses import FileResponse, JSONResponse, PlainTextResponse
 from pydantic import BaseModel
-from queue import Queue
 from enum import Enum
 
 
-app = FastAPI()
-
-# Создаем экземпляр BoatController
-ESP32_IP = '192.168.43.10'
-boat_controller = BoatController(esp32_ip=ESP32_IP)
-boat_controller.start()
+# Настройки приложения (переменные окружения ROBOBOAT_* или файл .env)
+settings = Settings()
+ESP32_IP = settings.esp32_ip
+BOAT_ID = settings.boat_id
+RECORDINGS_FOLDER = settings.recordings_folder
+# Видео с камеры по WebRTC: номер камеры, путь к видеофайлу или 'synthetic'
+VIDEO_SOURCE = settings.video_source
+VISION_WORKERS = settings.vision_workers
 
 # Путь для сохранения файлов миссий
-MISSION_FOLDER = 'missions'
-os.makedirs(MISSION_FOLDER, exist_ok=True)
+MISSION_FOLDER = settings.mission_folder
+DEFAULT_MISSION = 'mission'
 
 # Глобальные переменные для управления миссией
 mission_thread = None
+mission_task = None
+mission_process = None
 mission_running = False
-mission_output = []
-mission_queue = Queue()
+mission_stop = CancelToken()
+mission_name = None
+mission_load_time = 0.0
+mission_started_at = None
+mission_finished_at = None
+MISSION_STOP_TIMEOUT = settings.mission_stop_timeout  # Максимальное время ожидания остановки потока миссии (секунды)
+
+# Маршруты приложения. Службы и FastAPI создаются в create_app, поэтому импорт модуля не открывает сокеты
+# и не запускает служб (spawn выполняет главный модуль заново в процессах миссий и обработки кадров)
+router = APIRouter()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Запуск контроллера лодки при старте приложения и его остановка при завершении.
+    """
+    for hub in telemetry_hubs.values():
+        hub.bind_loop(asyncio.get_running_loop())
+    mission_log.bind_loop(asyncio.get_running_loop())
+    video_service.bind_loop(asyncio.get_running_loop())
+    for name, error in mission_library.preload().items():
+        print(f"Миссия {name} не загружена: {error}")
+    await boat_controller.start()
+    if fleet_manager.count:
+        await fleet_manager.start()
+    try:
+        yield
+    finally:
+        if mission_process is not None and mission_process.is_alive():
+            mission_stop.cancel()
+            mission_process.stop(MISSION_STOP_TIMEOUT)
+        if vision_stage.running:
+            vision_stage.stop()
+        await video_service.close()
+        await boat_controller.close()
+        await fleet_manager.close()
+        flight_recorder.close()
+        print("Программа завершена")
+
+
+def create_app():
+    """
+    Создать службы приложения (контроллер лодки, флот, самописец, видео, зрение, миссии) и приложение FastAPI.
+
+    Службы сохраняются в глобальных переменных модуля, которыми пользуются обработчики маршрутов.
+    Uvicorn вызывает функцию как фабрику: uvicorn --factory app.main:create_app
+    """
+    global boat_controller, telemetry_hub, fleet_manager, boats, telemetry_hubs, flight_recorder
+    global latency_tracer, video_service, vision_stage, mission_library, mission_log, control_inputs, control_input
+
+    # Создаем экземпляр контроллера лодки, работающего в цикле событий приложения
+    boat_controller = AsyncBoatController(
+        esp32_ip=ESP32_IP, esp32_port=settings.esp32_port, local_port=settings.local_port,
+        heartbeat_interval=settings.heartbeat_interval, history_capacity=settings.history_capacity,
+        receive_buffer=settings.receive_buffer, protocol_version=settings.protocol_version)
+
+    # Рассылка телеметрии подписчикам WebSocket
+    telemetry_hub = TelemetryHub(max_queue=settings.telemetry_queue)
+    boat_controller.add_telemetry_listener(telemetry_hub.publish)
+
+    # Дополнительные лодки флота на общем сокете; WebSocket выбирают лодку параметром boat
+    fleet_manager = FleetManager(local_port=settings.fleet_port, heartbeat_interval=settings.heartbeat_interval,
+                                 receive_buffer=settings.receive_buffer)
+    boats = {BOAT_ID: boat_controller}
+    telemetry_hubs = {BOAT_ID: telemetry_hub}
+    for fleet_boat_id, fleet_address in settings.fleet.items():
+        fleet_ip, _, fleet_port = fleet_address.partition(':')
+        boats[fleet_boat_id] = fleet_manager.add_boat(fleet_boat_id, fleet_ip, int(fleet_port or settings.esp32_port))
+        telemetry_hubs[fleet_boat_id] = TelemetryHub(max_queue=settings.telemetry_queue)
+        boats[fleet_boat_id].add_telemetry_listener(telemetry_hubs[fleet_boat_id].publish)
+
+    # Бортовой самописец телеметрии и команд
+    flight_recorder = FlightRecorder(RECORDINGS_FOLDER)
+    flight_recorder.attach(boat_controller)
+
+    # Трассировка задержки джойстик -> UDP -> телеметрия (по умолчанию выключена)
+    latency_tracer = LatencyTracer()
+
+    video_service = VideoService(VIDEO_SOURCE)
+
+    # Компьютерное зрение для миссий: детекторы в пуле процессов, результаты - boat_controller.vision
+    vision_stage = VisionStage(workers=VISION_WORKERS)
+    vision_stage.add_detector('buoy', detect_buoy)
+    boat_controller.vision = vision_stage
+
+    # Библиотека миссий: модули компилируются и проверяются при загрузке файла
+    os.makedirs(MISSION_FOLDER, exist_ok=True)
+    mission_library = MissionLibrary(MISSION_FOLDER)
+    mission_log = MissionLog(capacity=settings.mission_log_capacity)
+
+    # Прием управления с пультов для каждой лодки: аренда управления и объединение сообщений в пределах такта
+    control_inputs = {
+        boat_id: ControlInput(functools.partial(apply_control, controller), rate=settings.control_rate,
+                              lease_timeout=settings.control_lease_timeout)
+        for boat_id, controller in boats.items()
+    }
+    control_input = control_inputs[BOAT_ID]
+
+    app = FastAPI(lifespan=lifespan)
+    app.include_router(router)
+    app.mount("/static", StaticFiles(directory="app/static"), name="static")
+    return app
+
+def apply_control(controller, setpoint, received_at):
+    """
+    Передать уставку пульта контроллеру лодки (основной лодке - пока не выполняется миссия).
+    """
+    forward, lateral, yaw, speed_multiplier = setpoint
+    if controller is boat_controller:
+        if mission_running:
+            return
+        if latency_tracer.enabled:
+            latency_tracer.mark_input(received_at)
+    forward *= speed_multiplier
+    lateral *= speed_multiplier
+    if not controller.mode:
+        yaw *= speed_multiplier
+    controller.send_movement_command(forward, lateral, yaw)
+
 
 
 # Маршрут для получения телеметрии
-@app.websocket("/telemetry")
-async def telemetry_websocket(websocket: WebSocket):
+@router.websocket("/telemetry")
+async def telemetry_websocket(websocket: WebSocket, rate: float = 0, encoding: str = 'json', boat: str = BOAT_ID):
     """
     Веб-сокет для передачи телеметрии в реальном времени.
+
+    Кадры отправляются по мере прихода от лодки. Параметр rate ограничивает частоту кадров для клиента (Гц,
+    0 - settings.telemetry_rate),
+    параметр encoding выбирает кодировку: json (по умолчанию) или binary (кадр telemetry_hub.BINARY_TELEMETRY_STRUCT),
+    параметр boat - лодку флота (по умолчанию основная лодка settings.boat_id).
     """
+    if encoding not in ENCODINGS:
+        await websocket.close(code=1003)
+        return
+    if boat not in boats:
+        await websocket.close(code=1008)
+        return
+    hub = telemetry_hubs[boat]
     await websocket.accept()
+    subscription = hub.subscribe(max_rate=rate or settings.telemetry_rate or None, encoding=encoding)
+    send = websocket.send_bytes if encoding == ENCODING_BINARY else websocket.send_text
     try:
+        await send(encode_telemetry(boats[boat].get_telemetry(), encoding))
         while True:
-            telemetry = boat_controller.get_telemetry()
-            await websocket.send_json(telemetry)
-            await asyncio.sleep(0.1)  # Задержка между сообщениями
+            frame = await subscription.get()
+            await send(frame)
     except Exception as e:
         print("Connection closed")
     finally:
+        hub.unsubscribe(subscription)
         await websocket.close()
 
 
 # Маршрут для управления уппаратом
-@app.websocket("/control")
-async def telemetry_websocket(websocket: WebSocket):
+@router.websocket("/control")
+async def telemetry_websocket(websocket: WebSocket, boat: str = BOAT_ID):
     """
     Веб-сокет для управления аппаратом в реальном времени.
+
+    Управляет один пульт - держатель аренды (см. control_input.ControlInput); частые сообщения
+    объединяются, и контроллеру передается последняя уставка такта. Параметр boat выбирает лодку флота.
     """
-    global mission_running
+    if boat not in boats:
+        await websocket.close(code=1008)
+        return
+    control_input = control_inputs[boat]
     await websocket.accept()
+    client = control_input.connect(websocket.client)
     try:
         while True:
             message = await websocket.receive_text()
-            if message:
-                data = json.loads(message)
-                speed_multiplier = int(data.get("speedMultiplier", 100))
-                forward = float(data.get("forward", 0)) * speed_multiplier
-                lateral = float(data.get("lateral", 0)) * speed_multiplier
-                yaw = float(data.get("yaw", 0)) * speed_multiplier if not boat_controller.mode else float(data.get("yaw", 0))
-                if not mission_running:
-                    boat_controller.send_movement_command(forward, lateral, yaw)
+            reply = control_input.handle(client, message, time.monotonic())
+            if reply is not None:
+                await websocket.send_text(reply)
     except Exception as e:
         print("Connection closed")
     finally:
+        control_input.disconnect(client)
         await websocket.close()
 
 
+@router.get("/control/stats")
+async def get_control_stats(boat: str = BOAT_ID):
+    """
+    Конечная точка статистики пультов: держатель аренды, частота сообщений, объединенные и отклоненные сообщения
+    """
+    if boat not in control_inputs:
+        return JSONResponse(content={"status": "error", "message": f"Unknown boat {boat}"}, status_code=404)
+    return control_inputs[boat].stats()
+
+
+@router.get("/fleet")
+async def get_fleet():
+    """
+    Конечная точка состояния флота: лодки, связь, счетчики общего сокета
+    """
+    return {'boats': list(boats), 'default': BOAT_ID, 'stats': fleet_manager.stats()}
+
+
 class ModeRequest(BaseModel):
     mode: str
 
@@ -85,7 +258,7 @@ class ProbeAction(BaseModel):
     timeout: int = 0
 
 
-@app.post('/probe_control')
+@router.post('/probe_control')
 def probe_control(action_data: ProbeAction):
     action = action_data.action
     timeout = action_data.timeout  # Значение по умолчанию 10 секунд
@@ -102,7 +275,7 @@ def probe_control(action_data: ProbeAction):
 
     return JSONResponse({'status': 'success'}), 200
 
-@app.post('/mode')
+@router.post('/mode')
 async def telemetry_websocket(mode_request: ModeRequest):
     """
     Конечная точка для переключения режима работы лодки
@@ -113,13 +286,18 @@ async def telemetry_websocket(mode_request: ModeRequest):
         boat_controller.send_mode_command(1)
 
 
+class VideoOffer(BaseModel):
+    sdp: str
+    type: str
+
+
 class PidSettings(BaseModel):
     p: float
     i: float
     d: float
 
 
-@app.post('/pid_settings')
+@router.post('/pid_settings')
 async def telemetry_websocket(pid_settings: PidSettings):
     """
     Конечная точка установки значений пид регулятора
@@ -127,115 +305,368 @@ async def telemetry_websocket(pid_settings: PidSettings):
     boat_controller.send_pid_command(pid_settings.p, pid_settings.i, pid_settings.d)
 
 
-@app.get('/pid_settings', response_model=PidSettings)
+@router.get('/pid_settings', response_model=PidSettings)
 async def get_pid_settings(request: Request):
     """
     Конечная точка для получения значений пид регулятора
     """
+    pid = boat_controller.get_telemetry().pid
     return PidSettings(
-        p = boat_controller.telemetry_data['pid']['p'],
-        i = boat_controller.telemetry_data['pid']['i'],
-        d = boat_controller.telemetry_data['pid']['d']
+        p = pid['p'],
+        i = pid['i'],
+        d = pid['d']
     )
 
+
+@router.get('/telemetry/history')
+async def get_telemetry_history(seconds: float = 10.0, step: float = 0.1):
+    """
+    Конечная точка для получения истории телеметрии за последние seconds секунд на сетке с шагом step.
+
+    Время возвращается в секундах относительно текущего момента (отрицательные значения).
+    """
+    if seconds <= 0 or step <= 0 or seconds / step > 10000:
+        return JSONResponse(content={"status": "error", "message": "Invalid window"}, status_code=400)
+    now = time.monotonic()
+    times, values = boat_controller.telemetry_history.resample(seconds, step, now)
+    result = {'t': (times - now).round(3).tolist()}
+    for index, name in enumerate(HISTORY_FIELDS):
+        column = values[:, index]
+        result[name] = [None if value != value else round(float(value), 3) for value in column]
+    return result
+
+
+@router.get('/telemetry/stats')
+async def get_telemetry_stats(seconds: float = 10.0):
+    """
+    Конечная точка для получения статистики телеметрии (среднее, минимум, максимум) и скорости изменения курса.
+    """
+    history = boat_controller.telemetry_history
+    _, yaw_rate = history.yaw_rate(seconds)
+    return {
+        'fields': history.stats(seconds),
+        'yaw_rate': float(yaw_rate[-1]) if len(yaw_rate) else 0.0,
+    }
+
+
+@router.post('/recorder/start')
+async def start_recorder():
+    """
+    Конечная точка для начала записи сессии самописцем
+    """
+    session = flight_recorder.start()
+    return JSONResponse(content={"status": "success", "session": session}, status_code=200)
+
+
+@router.post('/recorder/stop')
+async def stop_recorder():
+    """
+    Конечная точка для завершения записи сессии
+    """
+    flight_recorder.close()
+    return JSONResponse(content={"status": "success", "session": flight_recorder.session, "records": flight_recorder.total}, status_code=200)
+
+
+@router.get('/metrics', response_class=PlainTextResponse)
+async def get_metrics():
+    """
+    Конечная точка метрик в текстовом формате Prometheus
+    """
+    text = latency_tracer.prometheus() + send_stats_prometheus(boat_controller.get_send_stats())
+    text += boat_controller.link.prometheus()
+    text += vision_stage.prometheus()
+    return PlainTextResponse(text, media_type='text/plain; version=0.0.4')
+
+
+@router.post('/metrics/latency')
+async def set_latency_tracing(enabled: bool):
+    """
+    Конечная точка для включения и выключения трассировки задержки
+    """
+    if enabled:
+        latency_tracer.enable(boat_controller)
+    else:
+        latency_tracer.disable()
+    return latency_tracer.summary()
+
+
+@router.get('/send_stats')
+async def get_send_stats():
+    """
+    Конечная точка для получения статистики задержки отправки команд
+    """
+    return boat_controller.get_send_stats()
+
+
+@router.get('/link_stats')
+async def get_link_stats():
+    """
+    Конечная точка статистики канала: потери и перестановки телеметрии, RTT и повторы команд (протокол v2)
+    """
+    return boat_controller.get_link_stats()
+
 # Функция для логирования вывода миссии
 def log_mission_output(message):
-    global mission_output
-    mission_output.append(message)
-    # Ограничиваем размер лога, чтобы не переполнить память
-    if len(mission_output) > 1000:
-        mission_output = mission_output[-1000:]
+    # Буфер ограничен по размеру; старые строки вытесняются без копирования
+    mission_log.append(message)
+
+@router.post("/video/offer")
+async def video_offer(offer: VideoOffer):
+    """
+    Конечная точка согласования WebRTC: принимает предложение SDP оператора и возвращает ответ
+    """
+    try:
+        answer = await video_service.offer(offer.sdp, offer.type)
+    except Exception as e:
+        return JSONResponse(content={"status": "error", "message": str(e)}, status_code=500)
+    return {"sdp": answer.sdp, "type": answer.type}
+
+
+@router.get("/video/stats")
+async def video_stats():
+    """
+    Конечная точка статистики видео: захват, отброшенные кадры, качество и потери по каждому оператору
+    """
+    return video_service.stats()
+
+
+@router.post("/video/latency")
+async def video_latency(duration: float = 5.0):
+    """
+    Конечная точка измерения задержки видео от захвата до декодирования через локальное соединение WebRTC
+    """
+    try:
+        result = await video_service.measure_latency(min(max(duration, 1.0), 30.0))
+    except Exception as e:
+        return JSONResponse(content={"status": "error", "message": str(e)}, status_code=500)
+    return result
+
+
+@router.post("/vision/start")
+async def vision_start():
+    """
+    Конечная точка запуска обработки кадров камеры (камера открывается, если еще не открыта)
+    """
+    def start():
+        subscribed = False
+        try:
+            video_service.camera.subscribe()
+            subscribed = True
+            vision_stage.start(video_service.camera.capture)
+        except Exception:
+            if subscribed:
+                video_service.camera.unsubscribe()
+            raise
+
+    if not vision_stage.running:
+        try:
+            await asyncio.get_running_loop().run_in_executor(None, start)
+        except Exception as e:
+            return JSONResponse(content={"status": "error", "message": str(e)}, status_code=500)
+    return vision_stage.stats()
+
+
+@router.post("/vision/stop")
+async def vision_stop():
+    """
+    Конечная точка остановки обработки кадров камеры
+    """
+    def stop():
+        vision_stage.stop()
+        video_service.camera.unsubscribe()
+
+    if vision_stage.running:
+        await asyncio.get_running_loop().run_in_executor(None, stop)
+    return vision_stage.stats()
+
+
+@router.get("/vision/status")
+async def vision_status():
+    """
+    Конечная точка последнего результата обработки и времени этапов
+    """
+    result = vision_stage.latest()
+    return {'result': result.as_dict() if result is not None else None, 'stats': vision_stage.stats()}
+
 
 # Конечная точка для загрузки файла миссии
-@app.post("/upload_mission")
-async def upload_mission(mission_file: UploadFile = File(...)):
+@router.post("/upload_mission")
+async def upload_mission(mission_file: UploadFile = File(...), name: str = Form(DEFAULT_MISSION)):
     if mission_file.filename.endswith('.py'):
         contents = await mission_file.read()
-        filepath = os.path.join(MISSION_FOLDER, 'mission.py')
-        with open(filepath, 'wb') as f:
-            f.write(contents)
-        return JSONResponse(content={"status": "success"}, status_code=200)
+        try:
+            # Компиляция, выполнение и проверка модуля - при загрузке, а не при запуске миссии
+            loaded = await asyncio.get_running_loop().run_in_executor(None, mission_library.store, name, contents)
+        except MissionLoadError as e:
+            return JSONResponse(content={"status": "error", "message": str(e)}, status_code=400)
+        return JSONResponse(content={"status": "success", "mission": loaded.info()}, status_code=200)
     else:
         return JSONResponse(content={"status": "error", "message": "Invalid file type"}, status_code=400)
 
+
+@router.get("/missions")
+async def list_missions():
+    """
+    Конечная точка для получения списка загруженных миссий
+    """
+    return mission_library.list()
+
+
+def mark_mission_finished(*args):
+    global mission_finished_at
+    mission_finished_at = time.monotonic()
+
+
+def run_mission_thread(mission_instance):
+    try:
+        mission_instance.run()
+    finally:
+        mark_mission_finished()
+
 # Конечная точка для запуска миссии
-@app.post("/start_mission")
-async def start_mission():
-    global mission_thread, mission_running, mission_output
+@router.post("/start_mission")
+async def start_mission(name: str = DEFAULT_MISSION, isolated: bool = False):
+    global mission_thread, mission_task, mission_process, mission_running, mission_stop
+    global mission_name, mission_load_time, mission_started_at, mission_finished_at
     if mission_running:
         return JSONResponse(content={"status": "error", "message": "Mission is already running"}, status_code=400)
-    mission_output = []  # Очищаем предыдущий вывод
+    mission_log.clear()  # Очищаем предыдущий вывод
     try:
+        # Модуль миссии берется из кэша; загрузка заново - только если файл изменился на диске
+        load_start = time.perf_counter()
+        loaded = mission_library.get(name)
+        mission_load_time = time.perf_counter() - load_start
+        if isolated and inspect.iscoroutinefunction(loaded.mission_class.run):
+            # Асинхронной миссии нужен цикл событий и подписка на телеметрию BoatController, которых нет в процессе миссии
+            return JSONResponse(content={"status": "error",
+                                         "message": "Async missions cannot run isolated"}, status_code=400)
+        mission_name = name
+
+        mission_stop = CancelToken()
+        mission_thread = None
+        mission_task = None
+        mission_process = None
         mission_running = True
-        # Динамическая загрузка файла миссии
-        import importlib.util
-        spec = importlib.util.spec_from_file_location("mission_module", os.path.join(MISSION_FOLDER, 'mission.py'))
-        mission_module = importlib.util.module_from_spec(spec)
-        spec.loader.exec_module(mission_module)
-        mission_queue.put(False)
-        mission_instance = mission_module.Mission(boat_controller, mission_queue, log_mission_output)
-        mission_thread = threading.Thread(target=mission_instance.run)
-        mission_thread.start()
-        return JSONResponse(content={"status": "success"}, status_code=200)
+        mission_started_at = time.monotonic()
+        mission_finished_at = None
+        if isolated:
+            # Миссия в отдельном процессе не конкурирует за GIL с приемом телеметрии и отправкой команд
+            mission_process = ProcessMissionRunner(boat_controller, loaded.path, log_mission_output, mission_stop,
+                                                   on_exit=mark_mission_finished)
+            mission_process.start()
+            return JSONResponse(content={"status": "success", "load_ms": mission_load_time * 1000.0,
+                                         "isolated": True}, status_code=200)
+        mission_instance = loaded.mission_class(boat_controller, mission_stop, log_mission_output)
+        if inspect.iscoroutinefunction(mission_instance.run):
+            # Асинхронная миссия (AsyncMission) выполняется задачей в цикле событий приложения
+            mission_task = asyncio.create_task(mission_instance.run())
+            mission_task.add_done_callback(mark_mission_finished)
+        else:
+            mission_thread = threading.Thread(target=run_mission_thread, args=(mission_instance,))
+            mission_thread.start()
+        return JSONResponse(content={"status": "success", "load_ms": mission_load_time * 1000.0}, status_code=200)
+    except MissionLoadError as e:
+        return JSONResponse(content={"status": "error", "message": str(e)}, status_code=400)
     except Exception as e:
+        mission_running = False
         return JSONResponse(content={"status": "error", "message": str(e)}, status_code=500)
 
+
+@router.get("/mission_status")
+async def get_mission_status():
+    """
+    Конечная точка состояния миссии: время загрузки модуля и время выполнения указываются отдельно
+    """
+    run_seconds = None
+    if mission_started_at is not None:
+        run_seconds = (mission_finished_at or time.monotonic()) - mission_started_at
+    return {
+        'name': mission_name,
+        'running': mission_running,
+        'finished': mission_finished_at is not None,
+        'load_ms': mission_load_time * 1000.0,
+        'run_seconds': run_seconds,
+    }
+
 # Конечная точка для остановки миссии
-@app.post("/stop_mission")
+@router.post("/stop_mission")
 async def stop_mission():
     global mission_running
-    mission_queue.put(True)
+    mission_stop.cancel()
+    boat_controller.interrupt_waiters()
     boat_controller.send_mode_command(0)
     boat_controller.send_movement_command(0.0, 0.0, 0.0)
     mission_running = False
-    return JSONResponse(content={"status": "success"}, status_code=200)
+
+    # Ждем остановки миссии, не блокируя цикл событий, и повторно обнуляем двигатели
+    stop_latency = None
+    if mission_task is not None:
+        mission_task.cancel()
+        await asyncio.wait({mission_task}, timeout=MISSION_STOP_TIMEOUT)
+        boat_controller.send_movement_command(0.0, 0.0, 0.0)
+        if not mission_task.done():
+            return JSONResponse(content={"status": "error", "message": "Mission task did not stop in time"}, status_code=500)
+    elif mission_thread is not None:
+        await asyncio.get_running_loop().run_in_executor(None, mission_thread.join, MISSION_STOP_TIMEOUT)
+        boat_controller.send_movement_command(0.0, 0.0, 0.0)
+        if mission_thread.is_alive():
+            return JSONResponse(content={"status": "error", "message": "Mission thread did not stop in time"}, status_code=500)
+    elif mission_process is not None:
+        # Процесс, не остановившийся за MISSION_STOP_TIMEOUT, завершается принудительно
+        stopped = await asyncio.get_running_loop().run_in_executor(None, mission_process.stop, MISSION_STOP_TIMEOUT)
+        boat_controller.send_movement_command(0.0, 0.0, 0.0)
+        if not stopped:
+            return JSONResponse(content={"status": "error", "message": "Mission process was terminated"}, status_code=500)
+    if mission_stop.stop_latency is not None:
+        stop_latency = mission_stop.stop_latency * 1000.0
+    return JSONResponse(content={"status": "success", "stop_latency_ms": stop_latency}, status_code=200)
 
 
 # WebSocket для передачи вывода миссии на клиент
-from fastapi import WebSocket
+@router.websocket("/mission_output")
+async def mission_output_ws(websocket: WebSocket, since: int = 0):
+    """
+    Поток строк вывода миссии в виде {"seq": номер, "message": строка}.
 
-@app.websocket("/mission_output")
-async def mission_output_ws(websocket: WebSocket):
+    Строки отправляются сразу при появлении. После переподключения клиент передает since - номер
+    следующей нужной строки; строки, вытесненные из буфера, отмечаются сообщением {"seq": номер, "missed": количество}.
+    """
     await websocket.accept()
-    last_index = 0
+    receive = asyncio.ensure_future(websocket.receive())
     try:
         while True:
-            if mission_output:
-                new_output = mission_output[last_index:]
-                for line in new_output:
-                    await websocket.send_text(line)
-                last_index = len(mission_output)
-            await asyncio.sleep(0.1)
+            start, lines, missed = mission_log.read(since)
+            if missed:
+                await websocket.send_text(json.dumps({'seq': start - missed, 'missed': missed}))
+            for offset, line in enumerate(lines):
+                await websocket.send_text(json.dumps({'seq': start + offset, 'message': line}, ensure_ascii=False))
+            since = start + len(lines)
+
+            # Ждем новой строки или сообщения от клиента (в том числе закрытия соединения)
+            waiter = asyncio.ensure_future(mission_log.wait(since))
+            await asyncio.wait({receive, waiter}, return_when=asyncio.FIRST_COMPLETED)
+            if receive.done():
+                waiter.cancel()
+                if receive.result()['type'] == 'websocket.disconnect':
+                    raise WebSocketDisconnect()
+                receive = asyncio.ensure_future(websocket.receive())
     except WebSocketDisconnect:
         print("Клиент отключился от mission_output_ws")
     except Exception as e:
         print(e)
+    finally:
+        receive.cancel()
 
 
-app.mount("/static", StaticFiles(directory="app/static"), name="static")
-
 
-@app.get("/")
+@router.get("/")
 async def read_index():
     return FileResponse(os.path.join("app", "static", "index.html"))
 
 
-# Функция для запуска FastAPI приложения в отдельном потоке
-def start_api():
-    uvicorn.run(app, host="0.0.0.0", port=8000)
-
-# Запуск FastAPI приложения в отдельном потоке
-api_thread = threading.Thread(target=start_api)
-api_thread.daemon = True
-api_thread.start()
-
-# Основной цикл программы (если требуется)
-try:
-    while True:
-        time.sleep(1)
-except KeyboardInterrupt:
-    pass
-finally:
-    # Остановка работы
-    boat_controller.close()
-    print("Программа завершена")
\ No newline at end of file
+if __name__ == '__main__':
+    if settings.startup_benchmark:
+        # Перебор частот против имитатора перед запуском приложения (ROBOBOAT_STARTUP_BENCHMARK=1)
+        run_rate_sweep(settings)
+    # Запуск FastAPI приложения в основном потоке, контроллер лодки стартует в lifespan
+    uvicorn.run(create_app(), host=settings.http_host, port=settings.http_port)
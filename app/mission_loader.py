@@ -0,0 +1,149 @@
+import hashlib
+import os
+import re
+import threading
+import time
+import types
+
+# Допустимые имена миссий (имя файла без расширения)
+MISSION_NAME_PATTERN = re.compile(r'^[A-Za-z0-9_\-]{1,64}$')
+
+
+class MissionLoadError(ValueError):
+    """
+    Файл миссии не компилируется, не импортируется или не содержит класс Mission.
+    """
+
+
+class LoadedMission:
+    """
+    Загруженный и проверенный модуль миссии.
+    """
+    __slots__ = ('name', 'digest', 'module', 'path', 'load_time', 'loaded_at')
+
+    def __init__(self, name, digest, module, path, load_time):
+        self.name = name
+        self.digest = digest
+        self.module = module
+        self.path = path
+        self.load_time = load_time  # Время компиляции и выполнения модуля (секунды)
+        self.loaded_at = time.time()
+
+    @property
+    def mission_class(self):
+        return self.module.Mission
+
+    def info(self):
+        return {
+            'name': self.name,
+            'digest': self.digest,
+            'load_ms': self.load_time * 1000.0,
+            'loaded_at': self.loaded_at,
+        }
+
+
+class MissionLibrary:
+    """
+    Библиотека именованных миссий с кэшем загруженных модулей.
+
+    Миссия компилируется, выполняется и проверяется при загрузке файла, поэтому запуск миссии
+    берет готовый модуль из кэша. Кэш модулей индексируется хэшем содержимого: повторная загрузка
+    того же файла не выполняет модуль заново.
+    """
+
+    def __init__(self, folder):
+        """
+        :param folder: Каталог файлов миссий
+        """
+        self.folder = folder
+        self.missions = {}  # имя -> LoadedMission
+        self.modules = {}   # хэш содержимого -> LoadedMission
+        self.lock = threading.Lock()
+
+    def path_for(self, name):
+        if not MISSION_NAME_PATTERN.match(name):
+            raise MissionLoadError(f'Недопустимое имя миссии: {name}')
+        return os.path.join(self.folder, f'{name}.py')
+
+    def store(self, name, source):
+        """
+        Проверить миссию и сохранить ее файл.
+
+        Файл записывается только после успешной загрузки, поэтому ошибочная миссия не заменяет рабочую.
+
+        :param name: Имя миссии
+        :param source: Исходный код (bytes)
+        :return: LoadedMission
+        """
+        path = self.path_for(name)
+        loaded = self._load(name, source, path)
+        with open(path, 'wb') as f:
+            f.write(source)
+        return loaded
+
+    def get(self, name):
+        """
+        Получить загруженную миссию. Если файл изменился на диске, миссия загружается заново.
+        """
+        path = self.path_for(name)
+        try:
+            with open(path, 'rb') as f:
+                source = f.read()
+        except FileNotFoundError:
+            raise MissionLoadError(f'Миссия {name} не найдена')
+        return self._load(name, source, path)
+
+    def preload(self):
+        """
+        Загрузить все миссии из каталога.
+
+        :return: Словарь {имя: текст ошибки} для миссий, которые не удалось загрузить
+        """
+        errors = {}
+        for filename in sorted(os.listdir(self.folder)):
+            name, extension = os.path.splitext(filename)
+            if extension != '.py' or not MISSION_NAME_PATTERN.match(name):
+                continue
+            try:
+                self.get(name)
+            except MissionLoadError as e:
+                errors[name] = str(e)
+        return errors
+
+    def list(self):
+        with self.lock:
+            return [loaded.info() for loaded in self.missions.values()]
+
+    def _load(self, name, source, path):
+        digest = hashlib.sha256(source).hexdigest()
+        with self.lock:
+            loaded = self.modules.get(digest)
+            if loaded is not None and loaded.path == path:
+                self.missions[name] = loaded
+                return loaded
+
+        start = time.perf_counter()
+        try:
+            code = compile(source, path, 'exec')
+        except SyntaxError as e:
+            raise MissionLoadError(f'Синтаксическая ошибка в строке {e.lineno}: {e.msg}')
+        module = types.ModuleType(f'mission_{name}')
+        module.__file__ = path
+        try:
+            exec(code, module.__dict__)
+        except Exception as e:
+            raise MissionLoadError(f'Ошибка при загрузке миссии: {type(e).__name__}: {e}')
+        mission_class = getattr(module, 'Mission', None)
+        if not isinstance(mission_class, type) or not callable(getattr(mission_class, 'run', None)):
+            raise MissionLoadError('Файл миссии должен содержать класс Mission с методом run')
+        loaded = LoadedMission(name, digest, module, path, time.perf_counter() - start)
+
+        with self.lock:
+            self.modules[digest] = loaded
+            previous = self.missions.get(name)
+            self.missions[name] = loaded
+            # Модуль прежней версии больше не нужен, если на него не ссылается другое имя
+            if previous is not None and previous.digest != digest:
+                if all(m.digest != previous.digest for m in self.missions.values()):
+                    self.modules.pop(previous.digest, None)
+        return loaded
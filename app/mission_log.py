@@ -0,0 +1,97 @@
+import asyncio
+import collections
+import itertools
+import threading
+
+
+class MissionLog:
+    """
+    Кольцевой буфер вывода миссии с порядковыми номерами строк.
+
+    Номер строки растет монотонно и не сбрасывается при переполнении или очистке буфера, поэтому клиент
+    может продолжить чтение с номера, на котором остановился. Строки, вытесненные из буфера, учитываются
+    как пропущенные. append() можно вызывать из любого потока; ожидающие в цикле событий подписчики
+    пробуждаются сразу, без опроса по таймеру.
+    """
+
+    def __init__(self, capacity=1000):
+        """
+        :param capacity: Максимальное число хранимых строк
+        """
+        self.capacity = capacity
+        self.lines = collections.deque(maxlen=capacity)
+        self.first_seq = 0  # Номер самой старой строки в буфере
+        self.next_seq = 0   # Номер, который получит следующая строка
+        self.run_seq = 0    # Номер первой строки текущего запуска (после последней очистки)
+        self.lock = threading.Lock()
+        self.loop = None
+        self.loop_thread_id = None
+        self.changed = None  # asyncio.Event текущего поколения; заменяется после каждого уведомления
+
+    def bind_loop(self, loop):
+        """
+        Привязать уведомления к циклу событий приложения.
+        """
+        self.loop = loop
+        self.loop_thread_id = threading.get_ident()
+        self.changed = asyncio.Event()
+
+    def append(self, message):
+        """
+        Добавить строку вывода. Сигнатура совпадает с функцией вывода миссии log_mission_output.
+        """
+        with self.lock:
+            self.lines.append(str(message))
+            self.next_seq += 1
+            self.first_seq = self.next_seq - len(self.lines)
+        self._notify()
+
+    def clear(self):
+        """
+        Очистить буфер перед новым запуском. Нумерация строк продолжается с прежнего значения,
+        строки предыдущих запусков не считаются пропущенными.
+        """
+        with self.lock:
+            self.lines.clear()
+            self.first_seq = self.next_seq
+            self.run_seq = self.next_seq
+
+    def read(self, since=0, limit=None):
+        """
+        Прочитать строки начиная с номера since.
+
+        :param since: Номер первой нужной строки; номера до начала текущего запуска заменяются run_seq
+        :param limit: Максимальное число строк (None - все доступные)
+        :return: (номер первой возвращенной строки, список строк, число пропущенных строк);
+            пропущенные строки предшествуют первой возвращенной
+        """
+        with self.lock:
+            if since > self.next_seq:
+                # Номер из другого запуска сервера: начинаем с начала буфера
+                since = self.first_seq
+            since = max(since, self.run_seq)
+            missed = max(0, self.first_seq - since)
+            start = max(since, self.first_seq)
+            stop = self.next_seq if limit is None else min(self.next_seq, start + limit)
+            offset = start - self.first_seq
+            lines = list(itertools.islice(self.lines, offset, offset + stop - start))
+        return start, lines, missed
+
+    async def wait(self, since):
+        """
+        Дождаться появления строки с номером since.
+        """
+        while self.next_seq <= since:
+            await self.changed.wait()
+
+    def _notify(self):
+        if self.loop is None:
+            return
+        if threading.get_ident() == self.loop_thread_id:
+            self._wake()
+        else:
+            self.loop.call_soon_threadsafe(self._wake)
+
+    def _wake(self):
+        changed, self.changed = self.changed, asyncio.Event()
+        changed.set()
@@ -0,0 +1,477 @@
+import inspect
+import multiprocessing
+import platform
+import queue
+import struct
+import threading
+import time
+import traceback
+import types
+from multiprocessing import shared_memory
+
+from boat_controller import Telemetry
+
+# Блок телеметрии (seqlock): счетчик версии (uint64, нечетный во время записи)
+# + время приема (double, time.monotonic()) + 12 значений пакета TELEMETRY_STRUCT (double, включая заголовок)
+SEQ_STRUCT = struct.Struct('<Q')
+TELEMETRY_BLOCK_STRUCT = struct.Struct('<d12d')
+TELEMETRY_BLOCK_SIZE = SEQ_STRUCT.size + TELEMETRY_BLOCK_STRUCT.size
+
+# Кольцо команд (один писатель - процесс миссии, один читатель - основной процесс):
+# head (uint64) + tail (uint64), далее слоты: код операции (uint8) + 4 аргумента (double)
+RING_HEADER_SIZE = 64
+HEAD_OFFSET = 0
+TAIL_OFFSET = 8
+SLOT_STRUCT = struct.Struct('<B4d')
+SLOT_SIZE = 40
+
+# Коды операций, передаваемых из процесса миссии в BoatController
+OP_MOVE = 1
+OP_TARGET_HEADING = 2
+OP_MODE = 3
+OP_PID = 4
+OP_LED = 5
+OP_GPIO = 6
+OP_PROBE = 7
+
+# Без блокировок разделяемая память корректна только при порядке записей и чтений x86 (TSO);
+# на остальных архитектурах (ARM бортового компьютера) seqlock и кольцо защищаются multiprocessing.Lock
+LOCK_FREE = platform.machine().lower() in ('x86_64', 'amd64', 'i386', 'i686', 'x86')
+
+# Сколько писатель основного процесса ждет блокировку, прежде чем пропустить кадр или опрос кольца.
+# Ограничение нужно, чтобы процесс миссии, завершенный внутри критической секции, не остановил прием телеметрии
+WRITER_LOCK_TIMEOUT = 0.01
+
+
+class TelemetrySeqlock:
+    """
+    Последний кадр телеметрии в разделяемой памяти с защитой seqlock.
+
+    Без блокировки писатель (основной процесс) не блокируется никогда, а читатель повторяет чтение,
+    если во время чтения кадр был перезаписан. Барьеров памяти при этом нет: корректность опирается
+    на порядок x86 (TSO), при котором запись нечетной версии видна раньше данных, а данные - раньше
+    четной версии. На других архитектурах передается lock, и запись и чтение выполняются под ним.
+
+    После каждой записи освобождается семафор updated (если он передан), на котором ждет wait_update.
+    """
+
+    def __init__(self, name=None, lock=None, updated=None):
+        """
+        :param name: Имя существующего блока (None - создать новый)
+        :param lock: multiprocessing.Lock для архитектур без порядка TSO (None - без блокировки)
+        :param updated: multiprocessing.BoundedSemaphore(1) - признак нового кадра (None - без уведомлений)
+        """
+        if name is None:
+            self.shm = shared_memory.SharedMemory(create=True, size=TELEMETRY_BLOCK_SIZE)
+            self.shm.buf[:TELEMETRY_BLOCK_SIZE] = bytes(TELEMETRY_BLOCK_SIZE)
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+        self.buf = self.shm.buf
+        self.seq = 0
+        self.lock = lock
+        self.updated = updated
+        self.skipped = 0  # Кадры, пропущенные из-за занятой блокировки
+
+    @property
+    def name(self):
+        return self.shm.name
+
+    def write(self, telemetry, packet, received_at):
+        """
+        Записать кадр. Сигнатура совпадает с обработчиком BoatController.add_telemetry_listener.
+        """
+        if self.lock is not None and not self.lock.acquire(timeout=WRITER_LOCK_TIMEOUT):
+            self.skipped += 1
+            return
+        try:
+            seq = self.seq + 1
+            SEQ_STRUCT.pack_into(self.buf, 0, seq)
+            TELEMETRY_BLOCK_STRUCT.pack_into(self.buf, SEQ_STRUCT.size, received_at, *telemetry.values)
+            self.seq = seq + 1
+            SEQ_STRUCT.pack_into(self.buf, 0, self.seq)
+        finally:
+            if self.lock is not None:
+                self.lock.release()
+        self.notify()
+
+    def notify(self):
+        """
+        Разбудить ожидающего в wait_update. Семафор ограничен единицей, повторное освобождение игнорируется.
+        """
+        if self.updated is None:
+            return
+        try:
+            self.updated.release()
+        except ValueError:
+            pass
+
+    def wait_update(self, timeout):
+        """
+        Дождаться записи нового кадра (или notify) не дольше timeout секунд.
+
+        :return: True, если уведомление получено
+        """
+        if self.updated is None:
+            time.sleep(timeout)
+            return False
+        return self.updated.acquire(timeout=timeout)
+
+    def read(self):
+        """
+        Прочитать согласованный кадр.
+
+        :return: (версия, время приема, кортеж значений пакета)
+        """
+        if self.lock is not None:
+            with self.lock:
+                seq = SEQ_STRUCT.unpack_from(self.buf, 0)[0]
+                values = TELEMETRY_BLOCK_STRUCT.unpack_from(self.buf, SEQ_STRUCT.size)
+            return seq, values[0], values[1:]
+        delay = 0.0
+        while True:
+            seq = SEQ_STRUCT.unpack_from(self.buf, 0)[0]
+            if not seq & 1:
+                values = TELEMETRY_BLOCK_STRUCT.unpack_from(self.buf, SEQ_STRUCT.size)
+                if SEQ_STRUCT.unpack_from(self.buf, 0)[0] == seq:
+                    return seq, values[0], values[1:]
+            # Писатель занят: уступить процессор с нарастающей паузой вместо холостого цикла
+            time.sleep(delay)
+            delay = min(delay * 2 or 0.00001, 0.001)
+
+    def version(self):
+        return SEQ_STRUCT.unpack_from(self.buf, 0)[0]
+
+    def close(self, unlink=False):
+        self.buf = None
+        self.shm.close()
+        if unlink:
+            self.shm.unlink()
+
+
+class CommandRing:
+    """
+    Кольцевой буфер команд в разделяемой памяти для одного писателя и одного читателя (на x86 без блокировок).
+
+    Писатель заполняет слот и только затем публикует новый head, читатель освобождает слот, публикуя tail.
+
+    Как и TelemetrySeqlock, без блокировки кольцо опирается на порядок x86 (TSO): новый head становится
+    виден только после содержимого слота. На других архитектурах передается lock, под которым
+    выполняются запись слота с публикацией head и чтение слотов с публикацией tail.
+    """
+
+    def __init__(self, capacity=256, name=None, lock=None):
+        """
+        :param capacity: Число слотов
+        :param name: Имя существующего блока (None - создать новый)
+        :param lock: multiprocessing.Lock для архитектур без порядка TSO (None - без блокировки)
+        """
+        self.capacity = capacity
+        size = RING_HEADER_SIZE + capacity * SLOT_SIZE
+        if name is None:
+            self.shm = shared_memory.SharedMemory(create=True, size=size)
+            self.shm.buf[:RING_HEADER_SIZE] = bytes(RING_HEADER_SIZE)
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+        self.buf = self.shm.buf
+        self.lock = lock
+        self.dropped = 0
+
+    @property
+    def name(self):
+        return self.shm.name
+
+    def push(self, op, a=0.0, b=0.0, c=0.0, d=0.0, timeout=0.1):
+        """
+        Записать команду. Если кольцо заполнено дольше timeout секунд, команда отбрасывается.
+
+        :return: True, если команда записана
+        """
+        deadline = None
+        while True:
+            if self.lock is not None:
+                self.lock.acquire()
+            try:
+                head = SEQ_STRUCT.unpack_from(self.buf, HEAD_OFFSET)[0]
+                if head - SEQ_STRUCT.unpack_from(self.buf, TAIL_OFFSET)[0] < self.capacity:
+                    SLOT_STRUCT.pack_into(self.buf, RING_HEADER_SIZE + (head % self.capacity) * SLOT_SIZE,
+                                          op, a, b, c, d)
+                    SEQ_STRUCT.pack_into(self.buf, HEAD_OFFSET, head + 1)
+                    return True
+            finally:
+                if self.lock is not None:
+                    self.lock.release()
+            if deadline is None:
+                deadline = time.monotonic() + timeout
+            elif time.monotonic() > deadline:
+                self.dropped += 1
+                return False
+            time.sleep(0.0005)
+
+    def pop_all(self):
+        """
+        Забрать все записанные команды.
+
+        :return: Список кортежей (op, a, b, c, d); пустой, если блокировка занята дольше WRITER_LOCK_TIMEOUT
+        """
+        if self.lock is not None and not self.lock.acquire(timeout=WRITER_LOCK_TIMEOUT):
+            return []
+        try:
+            tail = SEQ_STRUCT.unpack_from(self.buf, TAIL_OFFSET)[0]
+            head = SEQ_STRUCT.unpack_from(self.buf, HEAD_OFFSET)[0]
+            commands = []
+            while tail < head:
+                commands.append(SLOT_STRUCT.unpack_from(self.buf,
+                                                        RING_HEADER_SIZE + (tail % self.capacity) * SLOT_SIZE))
+                tail += 1
+            if commands:
+                SEQ_STRUCT.pack_into(self.buf, TAIL_OFFSET, tail)
+            return commands
+        finally:
+            if self.lock is not None:
+                self.lock.release()
+
+    def close(self, unlink=False):
+        self.buf = None
+        self.shm.close()
+        if unlink:
+            self.shm.unlink()
+
+
+class SharedVehicle:
+    """
+    Аппарат на стороне процесса миссии: телеметрия читается из seqlock, команды пишутся в кольцо.
+
+    Повторяет методы BoatController, используемые миссиями.
+    """
+
+    def __init__(self, seqlock, ring):
+        self.seqlock = seqlock
+        self.ring = ring
+        self.is_running = False
+        self.mode = 0
+        self.vision = None  # Результаты компьютерного зрения в процесс миссии не передаются
+
+    def get_telemetry(self):
+        return Telemetry(self.seqlock.read()[2])
+
+    def get_current_yaw(self):
+        return self.seqlock.read()[2][3]
+
+    def wait_for(self, predicate, timeout=None, cancel_token=None, max_wait=0.1):
+        """
+        Дождаться кадра телеметрии, удовлетворяющего условию. Условие проверяется при смене версии кадра.
+
+        Между кадрами процесс спит на семафоре seqlock.updated; при остановке ProcessMissionRunner
+        освобождает его, а max_wait ограничивает ожидание, если уведомление потеряно.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        last_seq = -1
+        while True:
+            seq = self.seqlock.version()
+            if seq != last_seq:
+                last_seq, _, values = self.seqlock.read()
+                telemetry = Telemetry(values)
+                if predicate(telemetry):
+                    return telemetry
+            if cancel_token is not None and cancel_token.is_set():
+                return None
+            wait = max_wait
+            if deadline is not None:
+                wait = min(wait, deadline - time.monotonic())
+                if wait <= 0:
+                    return None
+            # Кадр мог прийти после проверки версии: семафор уже освобожден, и ожидание вернется сразу
+            self.seqlock.wait_update(wait)
+
+    def interrupt_waiters(self):
+        pass
+
+    def set_target_heading(self, heading):
+        self.ring.push(OP_TARGET_HEADING, heading)
+
+    def send_movement_command(self, forward_speed, lateral_speed, yaw_speed):
+        self.ring.push(OP_MOVE, forward_speed, lateral_speed, yaw_speed)
+
+    def send_mode_command(self, mode):
+        self.mode = mode
+        self.ring.push(OP_MODE, mode)
+
+    def send_pid_command(self, p_gain, i_gain, d_gain):
+        self.ring.push(OP_PID, p_gain, i_gain, d_gain)
+
+    def send_led_command(self, mode, r, g, b):
+        self.ring.push(OP_LED, mode, r, g, b)
+
+    def send_gpio_command(self, state):
+        self.ring.push(OP_GPIO, state)
+
+    def send_probe_command(self, direction, timeout=0):
+        self.ring.push(OP_PROBE, direction, timeout)
+
+
+def _mission_process_main(path, telemetry_name, ring_name, ring_capacity, stop_event, log_queue,
+                          telemetry_lock, telemetry_updated, ring_lock):
+    """
+    Точка входа процесса миссии. Все ошибки, включая подключение к разделяемой памяти, передаются в журнал миссии.
+    """
+    seqlock = None
+    ring = None
+    try:
+        seqlock = TelemetrySeqlock(telemetry_name, telemetry_lock, telemetry_updated)
+        ring = CommandRing(ring_capacity, ring_name, ring_lock)
+        with open(path, 'rb') as f:
+            code = compile(f.read(), path, 'exec')
+        module = types.ModuleType('mission_process')
+        module.__file__ = path
+        exec(code, module.__dict__)
+        mission = module.Mission(SharedVehicle(seqlock, ring), stop_event, log_queue.put)
+        if inspect.iscoroutinefunction(mission.run):
+            raise TypeError('Асинхронная миссия (AsyncMission) не выполняется в отдельном процессе')
+        mission.run()
+    except Exception:
+        log_queue.put(traceback.format_exc())
+    finally:
+        if seqlock is not None:
+            seqlock.close()
+        if ring is not None:
+            ring.close()
+
+
+class ProcessMissionRunner:
+    """
+    Выполнение миссии в отдельном процессе.
+
+    Миссия не конкурирует за GIL с приемом телеметрии, отправкой команд и WebSocket. Телеметрия передается
+    через TelemetrySeqlock, команды возвращаются через CommandRing и выполняются BoatController в потоке
+    основного процесса. Остановка - multiprocessing.Event, который миссия получает вместо CancelToken.
+
+    Если процесс завершился с ошибкой до запуска миссии (например, при импорте главного модуля),
+    код завершения записывается в журнал миссии; трассировка такой ошибки есть только в stderr приложения.
+    """
+
+    def __init__(self, controller, path, log_mission_output, cancel_token, on_exit=None,
+                 ring_capacity=256, poll_interval=0.001):
+        """
+        :param controller: BoatController основного процесса
+        :param path: Путь к файлу миссии
+        :param log_mission_output: Функция вывода миссии
+        :param cancel_token: CancelToken миссии в основном процессе (для измерения задержки остановки)
+        :param on_exit: Функция без аргументов, вызываемая после завершения процесса миссии
+        :param ring_capacity: Число слотов кольца команд
+        :param poll_interval: Период опроса кольца команд (секунды)
+        """
+        self.controller = controller
+        self.path = path
+        self.log_mission_output = log_mission_output
+        self.cancel_token = cancel_token
+        self.on_exit = on_exit
+        self.poll_interval = poll_interval
+
+        context = multiprocessing.get_context('spawn')
+        self.stop_event = context.Event()
+        self.log_queue = context.Queue()
+        telemetry_lock = None if LOCK_FREE else context.Lock()
+        ring_lock = None if LOCK_FREE else context.Lock()
+        telemetry_updated = context.BoundedSemaphore(1)
+        self.seqlock = TelemetrySeqlock(lock=telemetry_lock, updated=telemetry_updated)
+        self.ring = CommandRing(ring_capacity, lock=ring_lock)
+        self.seqlock.write(controller.get_telemetry(), None, time.monotonic())
+        self.process = context.Process(
+            target=_mission_process_main,
+            args=(path, self.seqlock.name, self.ring.name, ring_capacity, self.stop_event, self.log_queue,
+                  telemetry_lock, telemetry_updated, ring_lock),
+            daemon=True)
+        self.pump_thread = None
+        self.running = False
+        self.released = False
+        self.release_lock = threading.Lock()
+        self.operations = {
+            OP_MOVE: lambda a, b, c, d: controller.send_movement_command(a, b, c),
+            OP_TARGET_HEADING: lambda a, b, c, d: controller.set_target_heading(a),
+            OP_MODE: lambda a, b, c, d: controller.send_mode_command(int(a)),
+            OP_PID: lambda a, b, c, d: controller.send_pid_command(a, b, c),
+            OP_LED: lambda a, b, c, d: controller.send_led_command(int(a), int(b), int(c), int(d)),
+            OP_GPIO: lambda a, b, c, d: controller.send_gpio_command(int(a)),
+            OP_PROBE: lambda a, b, c, d: controller.send_probe_command(int(a), int(b)),
+        }
+
+    def start(self):
+        self.controller.add_telemetry_listener(self.seqlock.write)
+        try:
+            self.process.start()
+        except Exception as e:
+            self._release()
+            raise RuntimeError(f'Не удалось запустить процесс миссии: {e!r}') from e
+        self.running = True
+        self.pump_thread = threading.Thread(target=self._pump_thread)
+        self.pump_thread.daemon = True
+        self.pump_thread.start()
+
+    def is_alive(self):
+        return self.process.is_alive()
+
+    def stop(self, timeout=1.0):
+        """
+        Остановить миссию: установить событие остановки, дождаться процесса и при необходимости завершить его.
+
+        :return: True, если процесс завершился сам до истечения timeout
+        """
+        self.stop_event.set()
+        self.seqlock.notify()  # Разбудить SharedVehicle.wait_for, не дожидаясь следующего кадра
+        self.process.join(timeout)
+        stopped = not self.process.is_alive()
+        if not stopped:
+            self.process.terminate()
+            self.process.join()
+        self.cancel_token.acknowledge()
+        self._shutdown()
+        return stopped
+
+    def _pump_thread(self):
+        """
+        Перенос команд из кольца в BoatController и вывода миссии в журнал.
+        """
+        while self.running:
+            self._drain()
+            if not self.process.is_alive():
+                self._drain()
+                break
+            time.sleep(self.poll_interval)
+        self.process.join()
+        # Ошибки миссии перехватываются в процессе и приходят в журнал; ненулевой код без остановки
+        # означает сбой до запуска миссии или аварийное завершение интерпретатора
+        if self.process.exitcode and not self.stop_event.is_set():
+            self.log_mission_output(f'Процесс миссии завершился с кодом {self.process.exitcode}, '
+                                    f'подробности в stderr приложения')
+        self._release()
+        if self.on_exit is not None:
+            self.on_exit()
+
+    def _drain(self):
+        for op, a, b, c, d in self.ring.pop_all():
+            operation = self.operations.get(op)
+            if operation is not None:
+                operation(a, b, c, d)
+        while True:
+            try:
+                self.log_mission_output(self.log_queue.get_nowait())
+            except queue.Empty:
+                break
+
+    def _shutdown(self):
+        self.running = False
+        if self.pump_thread is not None:
+            self.pump_thread.join()
+        self._release()
+
+    def _release(self):
+        """
+        Отключиться от контроллера и освободить разделяемую память (однократно).
+        """
+        with self.release_lock:
+            if self.released:
+                return
+            self.released = True
+        self.controller.remove_telemetry_listener(self.seqlock.write)
+        self.seqlock.close(unlink=True)
+        self.ring.close(unlink=True)
@@ -0,0 +1,252 @@
+import asyncio
+import threading
+import time
+import traceback
+
+
+class CancelToken:
+    """
+    Признак отмены миссии.
+
+    Проверка отмены (is_set() или атрибут cancelled) - чтение одного поля без блокировок, поэтому ее можно
+    выполнять при каждом обращении к аппарату в цикле управления. wait() позволяет спать с немедленным
+    пробуждением при отмене.
+    """
+    __slots__ = ('cancelled', 'cancelled_at', 'stopped_at', 'event')
+
+    def __init__(self):
+        self.cancelled = False
+        self.cancelled_at = None  # Время отмены по time.monotonic()
+        self.stopped_at = None    # Время, когда миссия подтвердила остановку
+        self.event = threading.Event()
+
+    def cancel(self):
+        """
+        Отменить миссию.
+        """
+        if not self.cancelled:
+            self.cancelled_at = time.monotonic()
+            self.cancelled = True
+            self.event.set()
+
+    def is_set(self):
+        return self.cancelled
+
+    def wait(self, timeout=None):
+        """
+        Ждать отмены не дольше timeout секунд.
+
+        :return: True, если миссия отменена
+        """
+        return self.event.wait(timeout)
+
+    def acknowledge(self):
+        """
+        Отметить, что миссия остановилась после отмены.
+        """
+        if self.cancelled and self.stopped_at is None:
+            self.stopped_at = time.monotonic()
+
+    @property
+    def stop_latency(self):
+        """
+        Время от отмены до подтверждения остановки миссией (секунды) или None.
+        """
+        if self.cancelled_at is None or self.stopped_at is None:
+            return None
+        return self.stopped_at - self.cancelled_at
+
+    def get(self, block=None, timeout=None):
+        """
+        Совместимость с миссиями, ожидающими очередь Queue: возвращает признак отмены без ожидания.
+        """
+        return self.cancelled
+
+
+class MissionCancelled(ValueError):
+    """
+    Миссия остановлена. Наследует ValueError, которым миссии сообщают об остановке.
+    """
+
+
+class PeriodicTimer:
+    """
+    Таймер периодических тактов для миссий в потоке.
+
+    Сроки тактов отсчитываются от абсолютного времени начала, поэтому время выполнения тела цикла
+    не накапливается в периоде. Если такт опоздал больше чем на период, пропущенные такты не догоняются.
+    """
+
+    def __init__(self, period, cancel_token=None):
+        """
+        :param period: Период тактов в секундах
+        :param cancel_token: CancelToken миссии; при отмене wait() сразу выбрасывает MissionCancelled
+        """
+        self.period = period
+        self.cancel_token = cancel_token
+        self.deadline = time.monotonic()
+        self.overruns = 0
+
+    def wait(self):
+        """
+        Дождаться следующего такта.
+        """
+        self.deadline += self.period
+        delay = self.deadline - time.monotonic()
+        if delay <= 0:
+            self.overruns += 1
+            if delay < -self.period:
+                self.deadline = time.monotonic()
+            delay = 0
+        if self.cancel_token is not None:
+            if self.cancel_token.wait(delay) if delay else self.cancel_token.is_set():
+                raise MissionCancelled('Миссия была завершена')
+        elif delay:
+            time.sleep(delay)
+
+
+async def periodic(period, duration=None):
+    """
+    Асинхронный генератор тактов с абсолютными сроками (без накопления дрейфа).
+
+    :param period: Период тактов в секундах
+    :param duration: Общая длительность в секундах (None - без ограничения)
+    :return: Номер такта (0, 1, 2, ...) на каждой итерации
+    """
+    loop = asyncio.get_running_loop()
+    start = loop.time()
+    tick = 0
+    while duration is None or tick * period < duration:
+        yield tick
+        tick += 1
+        deadline = start + tick * period
+        delay = deadline - loop.time()
+        if delay < -period:
+            # Пропускаем такты, которые уже нельзя выполнить вовремя
+            tick = int((loop.time() - start) / period) + 1
+            delay = start + tick * period - loop.time()
+        await asyncio.sleep(max(0.0, delay))
+
+
+async def wait_for_telemetry(controller, predicate, timeout=None):
+    """
+    Дождаться кадра телеметрии, удовлетворяющего условию.
+
+    Условие проверяется по приходу каждого нового кадра (а не по таймеру), поэтому задержка реакции
+    ограничена частотой телеметрии.
+
+    :param controller: BoatController или AsyncBoatController
+    :param predicate: Функция predicate(telemetry) -> bool
+    :param timeout: Максимальное время ожидания в секундах (None - без ограничения)
+    :return: Кадр Telemetry, удовлетворивший условию, или None по истечении timeout
+    """
+    current = controller.get_telemetry()
+    if predicate(current):
+        return current
+
+    loop = asyncio.get_running_loop()
+    loop_thread_id = threading.get_ident()
+    future = loop.create_future()
+
+    def check(telemetry):
+        if future.done():
+            return
+        try:
+            if predicate(telemetry):
+                future.set_result(telemetry)
+        except Exception as e:
+            future.set_exception(e)
+
+    def listener(telemetry, packet, received_at):
+        if threading.get_ident() == loop_thread_id:
+            check(telemetry)
+        else:
+            loop.call_soon_threadsafe(check, telemetry)
+
+    controller.add_telemetry_listener(listener)
+    try:
+        return await asyncio.wait_for(future, timeout)
+    except asyncio.TimeoutError:
+        return None
+    finally:
+        controller.remove_telemetry_listener(listener)
+
+
+def angle_difference(angle1, angle2):
+    """
+    Наименьшая разница между двумя углами в диапазоне от -180 до 180 градусов.
+    """
+    return (angle2 - angle1 + 180.0) % 360.0 - 180.0
+
+
+class AsyncMission:
+    """
+    Базовый класс асинхронной миссии.
+
+    Миссия выполняется задачей в цикле событий приложения и отменяется сразу, в ближайшей точке await.
+    Наследник реализует корутину _run(). Конструктор совпадает с миссиями в потоке:
+    Mission(boat_controller, mission_stop, log_mission_output).
+
+    Пример:
+
+        class Mission(AsyncMission):
+            async def _run(self):
+                self.boat_controller.send_mode_command(1)
+                await self.rotate_to_heading(90.0)
+                async for _ in self.ticks(duration=10.0):
+                    self.boat_controller.send_movement_command(20.0, 0.0, 0.0)
+    """
+    control_rate = 50.0  # Частота цикла управления (Гц)
+
+    def __init__(self, boat_controller, mission_stop, log_mission_output):
+        self.boat_controller = boat_controller
+        self.mission_stop = mission_stop
+        self.log_mission_output = log_mission_output
+
+    async def run(self):
+        try:
+            self.log_mission_output("Запуск миссии")
+            await self._run()
+        except asyncio.CancelledError:
+            self.log_mission_output("Миссия остановлена.")
+        except Exception:
+            self.log_mission_output(str(traceback.format_exc()))
+        finally:
+            self.boat_controller.send_movement_command(0.0, 0.0, 0.0)
+            if self.mission_stop.is_set():
+                self.boat_controller.send_mode_command(0)
+                self.mission_stop.acknowledge()
+
+    async def _run(self):
+        raise NotImplementedError
+
+    async def sleep(self, seconds):
+        await asyncio.sleep(seconds)
+
+    def ticks(self, period=None, duration=None):
+        """
+        Такты цикла управления с абсолютными сроками.
+
+        :param period: Период в секундах (по умолчанию 1 / control_rate)
+        :param duration: Общая длительность в секундах (None - без ограничения)
+        """
+        return periodic(period or 1.0 / self.control_rate, duration)
+
+    async def wait_for_telemetry(self, predicate, timeout=None):
+        return await wait_for_telemetry(self.boat_controller, predicate, timeout)
+
+    async def rotate_to_heading(self, target_heading, tolerance=2.0, timeout=10.0):
+        """
+        Повернуть к целевому курсу в режиме стабилизации и дождаться входа курса в допуск.
+
+        :return: True, если курс достигнут до истечения timeout
+        """
+        self.boat_controller.set_target_heading(target_heading)
+        self.boat_controller.send_movement_command(0.0, 0.0, 0.0)
+        telemetry = await self.wait_for_telemetry(
+            lambda t: abs(angle_difference(t.yaw, target_heading)) <= tolerance, timeout)
+        if telemetry is None:
+            self.log_mission_output("Время поворота истекло.")
+            return False
+        self.log_mission_output(f"Достигнут целевой курс: {telemetry.yaw:.2f} градусов")
+        return True
@@ -0,0 +1,400 @@
+import random
+import struct
+import threading
+import time
+from collections import deque
+
+# Версии протокола команд
+PROTOCOL_V1 = 1  # Кадры без номеров (Bfff, BB, ...)
+PROTOCOL_V2 = 2  # Кадры v1 с заголовком: сессия, номер и метка времени отправителя
+
+# Признак кадра v2 - первый байт, не совпадающий ни с одним заголовком v1: прежняя прошивка его игнорирует
+FRAME_V2 = 0xA5
+# Подтверждение разовой команды (только в кадрах v2)
+CMD_ACK = 0x08
+
+# Заголовок кадра v2: признак (1 байт) + сессия отправителя (uint32) + номер кадра (uint32) + метка времени
+# отправителя (uint32, мкс по монотонным часам отправителя, по модулю 2^32). Little-endian без выравнивания,
+# 13 байт. За заголовком без изменений следует кадр v1.
+# Сессия - случайное ненулевое число, выбираемое отправителем при запуске: после перезапуска лодки или
+# контроллера нумерация начинается с 1, и получатель по смене сессии сбрасывает учет номеров
+V2_HEADER = struct.Struct('<BIII')
+
+# Подтверждение: заголовок CMD_ACK (1 байт) + номер подтверждаемого кадра (uint32) + его метка времени (uint32)
+# + время от приема кадра до отправки подтверждения (uint32, мкс)
+ACK_STRUCT = struct.Struct('<BIII')
+
+# Хвост кадра телеметрии v2 после TELEMETRY_STRUCT: номер и метка времени последней принятой команды
+# + время от ее приема до отправки кадра (uint32, мкс)
+TELEMETRY_ECHO_STRUCT = struct.Struct('<III')
+
+SEQ_MASK = 0xFFFFFFFF
+SEQ_HALF = 0x80000000
+
+# Выборки RTT больше этого значения считаются ошибочными (переполнение меток, перезапуск лодки)
+MAX_RTT = 10.0
+# Число последних выборок RTT для процентилей
+RTT_WINDOW = 256
+# Число последних номеров кадров, по которым опоздавший кадр отличается от повтора
+SEQ_WINDOW = 64
+SEQ_WINDOW_MASK = (1 << SEQ_WINDOW) - 1
+# Число завершенных сессий отправителя, опоздавшие кадры которых отбрасываются
+RETIRED_SESSIONS = 8
+
+
+def new_session():
+    """
+    Случайный ненулевой номер сессии отправителя.
+    """
+    return random.getrandbits(32) or 1
+
+
+def timestamp_us(now=None):
+    """
+    Метка времени кадра: микросекунды монотонных часов по модулю 2^32.
+    """
+    return int((time.monotonic() if now is None else now) * 1e6) & SEQ_MASK
+
+
+def seq_newer(seq, reference):
+    """
+    Номер seq новее reference с учетом переполнения счетчика.
+    """
+    return seq != reference and ((seq - reference) & SEQ_MASK) < SEQ_HALF
+
+
+def pack_frame(session, seq, payload, now=None):
+    """
+    Обернуть кадр v1 payload в кадр v2.
+    """
+    return V2_HEADER.pack(FRAME_V2, session, seq, timestamp_us(now)) + payload
+
+
+def unpack_frame(data):
+    """
+    Разобрать кадр v2.
+
+    :return: (сессия, номер, метка времени, кадр v1)
+    """
+    _, session, seq, timestamp = V2_HEADER.unpack_from(data)
+    return session, seq, timestamp, data[V2_HEADER.size:]
+
+
+def echo_rtt(echo_timestamp, hold_us, now):
+    """
+    Время кругового пути по отраженной метке времени без учета времени удержания на другой стороне (секунды).
+    """
+    return ((timestamp_us(now) - echo_timestamp - hold_us) & SEQ_MASK) / 1e6
+
+
+class SequenceTracker:
+    """
+    Учет потерь, перестановок и повторов входящего потока кадров по номерам.
+
+    Кадр новее последнего принятого принимается; пропуск номеров считается потерей. Кадр старше
+    последнего принятого не применяется. Принятые номера последних SEQ_WINDOW кадров хранятся битовой
+    маской: если опоздавший кадр закрывает учтенный пропуск, он считается переставленным и потеря
+    снимается, если его номер уже был принят - повтором. Кадр старше окна считается переставленным,
+    потеря при этом не снимается.
+
+    Номера сравниваются только внутри сессии отправителя. Кадр новой сессии (отправитель перезапущен)
+    начинает учет номеров заново; счетчики при этом сохраняются. Опоздавшие кадры последних
+    RETIRED_SESSIONS завершенных сессий отбрасываются и считаются устаревшими.
+    """
+    __slots__ = ('session', 'retired', 'first', 'last', 'window', 'received', 'lost', 'reordered', 'duplicates',
+                 'restarts', 'retired_frames')
+
+    def __init__(self):
+        self.session = None
+        self.retired = deque(maxlen=RETIRED_SESSIONS)
+        self.first = None  # Первый принятый номер сессии: более ранние кадры не учитывались как пропуск
+        self.last = None
+        self.window = 0  # Бит k - принят кадр last - k
+        self.received = 0
+        self.lost = 0
+        self.reordered = 0
+        self.duplicates = 0
+        self.restarts = 0        # Смены сессии отправителя
+        self.retired_frames = 0  # Кадры завершенных сессий
+
+    def accept(self, session, seq):
+        """
+        :return: True, если кадр новее всех принятых и должен быть применен
+        """
+        if session != self.session:
+            if session in self.retired:
+                self.retired_frames += 1
+                return False
+            if self.session is not None:
+                self.retired.append(self.session)
+                self.restarts += 1
+            self.session = session
+            self.last = None
+        if self.last is None or seq_newer(seq, self.last):
+            if self.last is None:
+                self.first = seq
+                self.window = 1
+            else:
+                gap = (seq - self.last) & SEQ_MASK
+                self.lost += gap - 1
+                self.window = ((self.window << gap) | 1) & SEQ_WINDOW_MASK if gap < SEQ_WINDOW else 1
+            self.last = seq
+            self.received += 1
+            return True
+        age = (self.last - seq) & SEQ_MASK
+        if age >= SEQ_WINDOW or seq_newer(self.first, seq):
+            self.reordered += 1
+        elif self.window >> age & 1:
+            self.duplicates += 1
+        else:
+            self.window |= 1 << age
+            self.received += 1
+            self.reordered += 1
+            self.lost -= 1
+        return False
+
+    def as_dict(self):
+        total = self.received + self.lost
+        return {
+            'received': self.received,
+            'lost': self.lost,
+            'reordered': self.reordered,
+            'duplicates': self.duplicates,
+            'restarts': self.restarts,
+            'retired_frames': self.retired_frames,
+            'loss_percent': self.lost / total * 100.0 if total else 0.0,
+        }
+
+
+class PendingCommand:
+    """
+    Разовая команда, ожидающая подтверждения.
+    """
+    __slots__ = ('packet', 'first_sent_at', 'deadline', 'attempts')
+
+    def __init__(self, packet, sent_at, deadline):
+        self.packet = packet
+        self.first_sent_at = sent_at
+        self.deadline = deadline
+        self.attempts = 1
+
+
+class CommandLink:
+    """
+    Состояние протокола v2 на стороне контроллера.
+
+    Нумерует исходящие кадры, хранит неподтвержденные разовые команды и повторяет только их: команда
+    движения повторяется heartbeat и не подтверждается. Новая команда того же типа заменяет неподтвержденную
+    (лодка применяет по каждому типу только самый новый номер), поэтому повтор не может вернуть старое значение.
+    Таймаут повтора рассчитывается по сглаженному RTT (RFC 6298) и удваивается с каждой попыткой.
+
+    RTT измеряется по подтверждениям и по отраженной в телеметрии метке последней команды, потери
+    и перестановки - по номерам кадров телеметрии. Методы вызываются из потоков отправки и приема.
+    """
+
+    def __init__(self, initial_rto=0.2, min_rto=0.05, max_rto=1.0, max_attempts=8):
+        """
+        :param initial_rto: Таймаут повтора до первого измерения RTT (с)
+        :param min_rto: Минимальный таймаут повтора (с)
+        :param max_rto: Максимальный таймаут повтора (с)
+        :param max_attempts: Число отправок разовой команды, после которого она считается потерянной
+        """
+        self.min_rto = min_rto
+        self.max_rto = max_rto
+        self.max_attempts = max_attempts
+        self.rto = initial_rto
+        self.srtt = None
+        self.rttvar = 0.0
+        self.lock = threading.Lock()
+        self.session = new_session()
+        self.next_seq = 1
+        self.pending = {}          # номер -> PendingCommand
+        self.pending_by_type = {}  # заголовок команды -> номер неподтвержденной команды
+        self.first_sent_at = None
+        self.frames_received = 0
+        self.last_echo_seq = None
+        self.telemetry = SequenceTracker()
+        self.rtt_samples = deque(maxlen=RTT_WINDOW)
+        self.rtt_count = 0
+        self.acked = 0
+        self.retransmits = 0
+        self.superseded = 0
+        self.failed = 0
+        self.duplicate_acks = 0
+
+    def frame(self, packet, reliable, now):
+        """
+        Обернуть кадр v1 в кадр v2 со следующим номером.
+
+        :param reliable: Разовая команда: хранится до подтверждения и повторяется
+        """
+        with self.lock:
+            seq = self.next_seq
+            self.next_seq = (seq + 1) & SEQ_MASK or 1
+            if self.first_sent_at is None:
+                self.first_sent_at = now
+            if reliable:
+                previous = self.pending_by_type.pop(packet[0], None)
+                if previous is not None and self.pending.pop(previous, None) is not None:
+                    self.superseded += 1
+                self.pending[seq] = PendingCommand(packet, now, now + self.rto)
+                self.pending_by_type[packet[0]] = seq
+        return pack_frame(self.session, seq, packet, now)
+
+    def next_deadline(self):
+        """
+        Ближайший срок повтора неподтвержденной команды (inf, если таких нет).
+        """
+        if not self.pending:
+            return float('inf')
+        with self.lock:
+            return min((pending.deadline for pending in self.pending.values()), default=float('inf'))
+
+    def due(self, now):
+        """
+        Забрать команды, срок повтора которых наступил.
+
+        :return: (кадры для повторной отправки, пакеты v1 команд, исчерпавших попытки)
+        """
+        frames = []
+        failed = []
+        with self.lock:
+            for seq, pending in list(self.pending.items()):
+                if pending.deadline > now:
+                    continue
+                if pending.attempts >= self.max_attempts:
+                    self._forget(seq, pending)
+                    self.failed += 1
+                    failed.append(pending.packet)
+                    continue
+                pending.attempts += 1
+                pending.deadline = now + min(self.rto * (1 << (pending.attempts - 1)), self.max_rto)
+                self.retransmits += 1
+                frames.append(pack_frame(self.session, seq, pending.packet, now))
+        return frames, failed
+
+    def _forget(self, seq, pending):
+        del self.pending[seq]
+        if self.pending_by_type.get(pending.packet[0]) == seq:
+            del self.pending_by_type[pending.packet[0]]
+
+    def on_ack(self, payload, received_at):
+        """
+        Обработать подтверждение (кадр v1 CMD_ACK из кадра v2).
+        """
+        _, seq, echo_timestamp, hold_us = ACK_STRUCT.unpack_from(payload)
+        with self.lock:
+            self.frames_received += 1
+            pending = self.pending.get(seq)
+            if pending is None:
+                self.duplicate_acks += 1
+            else:
+                self._forget(seq, pending)
+                self.acked += 1
+            self._sample_rtt(echo_rtt(echo_timestamp, hold_us, received_at))
+
+    def on_telemetry(self, session, seq, echo, received_at):
+        """
+        Учесть кадр телеметрии v2.
+
+        :param session: Сессия лодки (меняется при перезапуске прошивки)
+        :param echo: Хвост TELEMETRY_ECHO_STRUCT
+        :return: True, если кадр новее всех принятых (устаревший кадр не должен заменять телеметрию)
+        """
+        echo_seq, echo_timestamp, hold_us = TELEMETRY_ECHO_STRUCT.unpack_from(echo)
+        with self.lock:
+            self.frames_received += 1
+            if not self.telemetry.accept(session, seq):
+                return False
+            # Одна выборка на команду: следующие кадры отражают ту же метку с большим временем удержания
+            if echo_seq and echo_seq != self.last_echo_seq:
+                self.last_echo_seq = echo_seq
+                self._sample_rtt(echo_rtt(echo_timestamp, hold_us, received_at))
+        return True
+
+    def _sample_rtt(self, rtt):
+        """
+        Учесть выборку RTT и пересчитать таймаут повтора. Вызывается под lock.
+        """
+        if rtt > MAX_RTT:
+            return
+        self.rtt_samples.append(rtt)
+        self.rtt_count += 1
+        if self.srtt is None:
+            self.srtt = rtt
+            self.rttvar = rtt / 2.0
+        else:
+            self.rttvar = 0.75 * self.rttvar + 0.25 * abs(self.srtt - rtt)
+            self.srtt = 0.875 * self.srtt + 0.125 * rtt
+        self.rto = min(max(self.srtt + 4.0 * self.rttvar, self.min_rto), self.max_rto)
+
+    def reset(self):
+        """
+        Забыть неподтвержденные команды (при переходе на протокол v1).
+
+        :return: Пакеты v1 неподтвержденных команд в порядке отправки
+        """
+        with self.lock:
+            packets = [self.pending[seq].packet for seq in sorted(self.pending)]
+            self.pending.clear()
+            self.pending_by_type.clear()
+        return packets
+
+    def rtt_summary(self):
+        """
+        RTT по последним RTT_WINDOW выборкам (мс).
+        """
+        samples = sorted(self.rtt_samples)
+        if not samples:
+            return {'count': self.rtt_count, 'min_ms': None, 'p50_ms': None, 'p99_ms': None, 'max_ms': None}
+        return {
+            'count': self.rtt_count,
+            'min_ms': samples[0] * 1000.0,
+            'p50_ms': samples[len(samples) // 2] * 1000.0,
+            'p99_ms': samples[min(len(samples) - 1, int(len(samples) * 0.99))] * 1000.0,
+            'max_ms': samples[-1] * 1000.0,
+        }
+
+    def stats(self):
+        with self.lock:
+            return {
+                'telemetry': self.telemetry.as_dict(),
+                'rtt': self.rtt_summary(),
+                'srtt_ms': self.srtt * 1000.0 if self.srtt is not None else None,
+                'rto_ms': self.rto * 1000.0,
+                'pending': len(self.pending),
+                'acked': self.acked,
+                'retransmits': self.retransmits,
+                'superseded': self.superseded,
+                'failed': self.failed,
+                'duplicate_acks': self.duplicate_acks,
+            }
+
+    def prometheus(self, prefix='roboboat'):
+        """
+        Статистика канала в текстовом формате Prometheus.
+        """
+        telemetry = self.telemetry
+        lines = []
+        gauges = (
+            ('link_srtt_seconds', 'Сглаженное время кругового пути команд (протокол v2)', self.srtt or 0.0),
+            ('link_rto_seconds', 'Таймаут повтора разовых команд', self.rto),
+            # Не счетчик: уменьшается, когда опоздавший кадр закрывает пропуск
+            ('link_telemetry_lost', 'Потерянные кадры телеметрии', telemetry.lost),
+        )
+        for metric, description, value in gauges:
+            lines.append(f'# HELP {prefix}_{metric} {description}')
+            lines.append(f'# TYPE {prefix}_{metric} gauge')
+            lines.append(f'{prefix}_{metric} {value:.6f}')
+        counters = (
+            ('link_telemetry_reordered_total', 'Переставленные и устаревшие кадры телеметрии', telemetry.reordered),
+            ('link_telemetry_duplicates_total', 'Повторно принятые кадры телеметрии', telemetry.duplicates),
+            ('link_boat_restarts_total', 'Смены сессии лодки (перезапуски прошивки)', telemetry.restarts),
+            ('link_retransmits_total', 'Повторы разовых команд', self.retransmits),
+            ('link_failed_total', 'Разовые команды без подтверждения после всех попыток', self.failed),
+        )
+        for metric, description, value in counters:
+            lines.append(f'# HELP {prefix}_{metric} {description}')
+            lines.append(f'# TYPE {prefix}_{metric} counter')
+            lines.append(f'{prefix}_{metric} {value}')
+        return '\n'.join(lines) + '\n'
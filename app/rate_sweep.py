@@ -0,0 +1,89 @@
+import os
+import subprocess
+import sys
+import time
+
+from boat_controller import BoatController
+from latency import STAGE_END_TO_END, LatencyTracer
+from settings import Settings
+
+SIMULATOR_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'simulator.py')
+
+# Частота изменения уставки движения при измерении (Гц)
+INPUT_RATE = 10.0
+
+
+def measure(heartbeat_interval, telemetry_rate, settings, simulator_port, duration):
+    """
+    Измерить задержку и загрузку процессора контроллера при заданных частотах.
+
+    Имитатор запускается отдельным процессом, поэтому время процессора относится только к контроллеру.
+    Уставка движения меняется с частотой INPUT_RATE, задержка измеряется LatencyTracer от вызова
+    send_movement_command до кадра телеметрии с измененными ШИМ.
+    """
+    simulator = subprocess.Popen(
+        [sys.executable, SIMULATOR_PATH, '--listen-port', str(simulator_port),
+         '--telemetry-port', str(simulator_port + 1), '--rate', str(telemetry_rate)],
+        stdout=subprocess.DEVNULL)
+    controller = BoatController('127.0.0.1', simulator_port, simulator_port + 1, heartbeat_interval,
+                                receive_timeout=settings.receive_timeout, receive_buffer=settings.receive_buffer)
+    tracer = LatencyTracer()
+    try:
+        controller.start()
+        time.sleep(0.5)  # Запуск имитатора и первые кадры телеметрии
+        tracer.enable(controller)
+        frames = [0]
+        controller.add_telemetry_listener(lambda telemetry, packet, received_at: frames.__setitem__(0, frames[0] + 1))
+
+        start_cpu = time.process_time()
+        start = time.monotonic()
+        heartbeats = controller.heartbeat_count
+        step = 0
+        while time.monotonic() - start < duration:
+            step += 1
+            tracer.mark_input(time.monotonic())
+            controller.send_movement_command(20.0 if step % 2 else -20.0, 0.0, 0.0)
+            time.sleep(1.0 / INPUT_RATE)
+        elapsed = time.monotonic() - start
+        cpu = time.process_time() - start_cpu
+        summary = tracer.summary()[STAGE_END_TO_END]
+        return {
+            'heartbeat_ms': heartbeat_interval * 1000.0,
+            'telemetry_hz': telemetry_rate,
+            'cpu_percent': cpu / elapsed * 100.0,
+            'telemetry_fps': frames[0] / elapsed,
+            'heartbeats_per_s': (controller.heartbeat_count - heartbeats) / elapsed,
+            'p50_ms': summary['p50_ms'],
+            'p99_ms': summary['p99_ms'],
+            'echo_timeouts': tracer.echo_timeouts,
+        }
+    finally:
+        tracer.disable()
+        controller.close()
+        simulator.terminate()
+        simulator.wait()
+
+
+def run_rate_sweep(settings=None):
+    """
+    Перебрать частоты повтора команд и телеметрии из настроек и напечатать таблицу задержки и загрузки.
+
+    :return: Список результатов measure()
+    """
+    settings = settings or Settings()
+    results = []
+    print(f"{'heartbeat, мс':>14} {'телеметрия, Гц':>15} {'CPU, %':>7} {'кадров/с':>9} "
+          f"{'повторов/с':>11} {'p50, мс':>8} {'p99, мс':>8}")
+    for telemetry_rate in settings.benchmark_telemetry_rates:
+        for heartbeat_interval in settings.benchmark_heartbeat_intervals:
+            result = measure(heartbeat_interval, telemetry_rate, settings, settings.benchmark_port,
+                             settings.benchmark_duration)
+            results.append(result)
+            print(f"{result['heartbeat_ms']:>14.0f} {result['telemetry_hz']:>15.0f} {result['cpu_percent']:>7.1f} "
+                  f"{result['telemetry_fps']:>9.1f} {result['heartbeats_per_s']:>11.1f} "
+                  f"{result['p50_ms']:>8.2f} {result['p99_ms']:>8.2f}")
+    return results
+
+
+if __name__ == '__main__':
+    run_rate_sweep()
@@ -0,0 +1,181 @@
+import argparse
+import json
+import socket
+import threading
+import time
+
+from boat_controller import COMMAND_NAMES
+from flight_recorder import RECORD_COMMAND, RECORD_TELEMETRY, load_records
+
+
+def load_session_packets(paths):
+    """
+    Загрузить пакеты из файлов записи сессии.
+
+    :param paths: Список файлов .rbrec по порядку
+    :return: (telemetry, commands) - списки (время, байты пакета)
+    """
+    telemetry = []
+    commands = []
+    for path in paths:
+        records = load_records(path)
+        for row in records:
+            item = (float(row['t']), row['payload'][:row['length']].tobytes())
+            if row['kind'] == RECORD_TELEMETRY:
+                telemetry.append(item)
+            elif row['kind'] == RECORD_COMMAND:
+                commands.append(item)
+    return telemetry, commands
+
+
+class SessionReplay:
+    """
+    Воспроизведение записанной сессии со стороны ESP32.
+
+    Принимает команды на порту ESP32 и отправляет записанные пакеты телеметрии на порт телеметрии
+    контроллера с исходными интервалами, ускоренными в speed раз. Контроллер подключается без изменений:
+    BoatController(esp32_ip='127.0.0.1').
+    """
+
+    def __init__(self, paths, speed=1.0, listen_port=5005, telemetry_address=('127.0.0.1', 5006)):
+        """
+        :param paths: Файлы записи сессии по порядку
+        :param speed: Множитель скорости воспроизведения (0 - максимально быстро)
+        :param listen_port: Порт для приема команд (порт ESP32)
+        :param telemetry_address: Адрес и порт приема телеметрии контроллером
+        """
+        self.telemetry, self.recorded_commands = load_session_packets(paths)
+        self.speed = speed
+        self.listen_port = listen_port
+        self.telemetry_address = telemetry_address
+
+        self.command_socket = None
+        self.telemetry_socket = None
+        self.running = False
+        self.play_thread = None
+        self.command_thread = None
+
+        self.received_commands = []
+        self.sent = 0
+        self.drift_total = 0.0
+        self.drift_max = 0.0
+        self.started_at = 0.0
+        self.finished_at = 0.0
+
+    def start(self):
+        """
+        Открыть сокеты и запустить воспроизведение.
+        """
+        self.command_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.command_socket.bind(('', self.listen_port))
+        self.command_socket.settimeout(0.2)
+        self.telemetry_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.running = True
+
+        self.command_thread = threading.Thread(target=self._receive_commands_thread)
+        self.command_thread.daemon = True
+        self.command_thread.start()
+
+        self.play_thread = threading.Thread(target=self._play_thread)
+        self.play_thread.daemon = True
+        self.play_thread.start()
+
+    def wait(self, timeout=None):
+        """
+        Дождаться окончания воспроизведения.
+        """
+        if self.play_thread is not None:
+            self.play_thread.join(timeout)
+
+    def stop(self):
+        """
+        Остановить воспроизведение и закрыть сокеты.
+        """
+        self.running = False
+        for thread in (self.play_thread, self.command_thread):
+            if thread is not None:
+                thread.join()
+        self.play_thread = None
+        self.command_thread = None
+        for sock in (self.command_socket, self.telemetry_socket):
+            if sock is not None:
+                sock.close()
+
+    def _receive_commands_thread(self):
+        while self.running:
+            try:
+                data, addr = self.command_socket.recvfrom(1024)
+                self.received_commands.append((time.monotonic(), data))
+            except socket.timeout:
+                pass
+            except OSError:
+                break
+
+    def _play_thread(self):
+        if not self.telemetry:
+            return
+        base = self.telemetry[0][0]
+        self.started_at = time.monotonic()
+        for recorded_at, packet in self.telemetry:
+            if not self.running:
+                break
+            if self.speed:
+                target = self.started_at + (recorded_at - base) / self.speed
+                delay = target - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+            else:
+                target = time.monotonic()
+            self.telemetry_socket.sendto(packet, self.telemetry_address)
+            drift = time.monotonic() - target
+            self.sent += 1
+            self.drift_total += drift
+            if drift > self.drift_max:
+                self.drift_max = drift
+        self.finished_at = time.monotonic()
+
+    def report(self):
+        """
+        Отчет о воспроизведении: длительности, расхождение по времени и сравнение команд с записью.
+        """
+        original_duration = self.telemetry[-1][0] - self.telemetry[0][0] if self.telemetry else 0.0
+        replay_duration = self.finished_at - self.started_at if self.finished_at else time.monotonic() - self.started_at
+        expected_duration = original_duration / self.speed if self.speed else 0.0
+
+        commands = {}
+        for source, packets in (('original', self.recorded_commands), ('replayed', self.received_commands)):
+            for _, packet in packets:
+                name = COMMAND_NAMES.get(packet[0], str(packet[0]))
+                commands.setdefault(name, {'original': 0, 'replayed': 0})[source] += 1
+
+        return {
+            'speed': self.speed,
+            'telemetry_packets': len(self.telemetry),
+            'sent': self.sent,
+            'original_duration': original_duration,
+            'expected_duration': expected_duration,
+            'replay_duration': replay_duration,
+            'drift_mean_ms': self.drift_total / self.sent * 1000.0 if self.sent else 0.0,
+            'drift_max_ms': self.drift_max * 1000.0,
+            'commands': commands,
+        }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Воспроизведение записанной сессии вместо ESP32')
+    parser.add_argument('files', nargs='+', help='Файлы записи .rbrec по порядку')
+    parser.add_argument('--speed', type=float, default=1.0, help='Множитель скорости (0 - максимально быстро)')
+    parser.add_argument('--listen-port', type=int, default=5005, help='Порт приема команд')
+    parser.add_argument('--telemetry-host', default='127.0.0.1', help='Адрес приема телеметрии')
+    parser.add_argument('--telemetry-port', type=int, default=5006, help='Порт приема телеметрии')
+    args = parser.parse_args()
+
+    replay = SessionReplay(args.files, args.speed, args.listen_port, (args.telemetry_host, args.telemetry_port))
+    replay.start()
+    try:
+        replay.wait()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        replay.stop()
+        print(json.dumps(replay.report(), indent=2, ensure_ascii=False))
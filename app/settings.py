@@ -0,0 +1,56 @@
+from typing import Dict, List, Optional, Union
+
+from pydantic import Field
+from pydantic_settings import BaseSettings, SettingsConfigDict
+
+
+class Settings(BaseSettings):
+    """
+    Настройки приложения.
+
+    Значения по умолчанию соответствуют прежним константам. Каждое поле можно переопределить переменной
+    окружения с префиксом ROBOBOAT_ (например, ROBOBOAT_ESP32_IP=192.168.4.1) или в файле .env.
+    Списки и словари задаются в формате JSON: ROBOBOAT_BENCHMARK_TELEMETRY_RATES='[50, 200]',
+    ROBOBOAT_FLEET='{"alpha": "192.168.43.11", "beta": "192.168.43.12:5005"}'.
+    """
+    model_config = SettingsConfigDict(env_prefix='ROBOBOAT_', env_file='.env', extra='ignore')
+
+    # Связь с лодкой
+    esp32_ip: str = '192.168.43.10'
+    esp32_port: int = 5005
+    local_port: int = 5006
+    heartbeat_interval: float = Field(0.1, gt=0, description='Период повтора команды движения (с)')
+    receive_timeout: float = Field(1.0, gt=0, description='Таймаут приема телеметрии в потоке приема (с)')
+    receive_buffer: Optional[int] = Field(None, gt=0, description='SO_RCVBUF сокета телеметрии (байт)')
+    history_capacity: int = Field(6000, gt=0, description='Емкость истории телеметрии (кадров)')
+    protocol_version: int = Field(1, ge=1, le=2, description='Версия протокола команд (2 - номера кадров, подтверждения и повторы)')
+
+    # Флот: дополнительные лодки на общем сокете fleet_port, идентификатор -> "ip:порт" (порт по умолчанию esp32_port)
+    boat_id: str = Field('main', description='Идентификатор основной лодки в параметре boat')
+    fleet: Dict[str, str] = {}
+    fleet_port: int = 5007
+
+    # Веб-интерфейс
+    http_host: str = '0.0.0.0'
+    http_port: int = 8000
+    telemetry_rate: float = Field(0.0, ge=0, description='Частота телеметрии WebSocket по умолчанию (Гц, 0 - без ограничения)')
+    telemetry_queue: int = Field(8, gt=0, description='Очередь кадров телеметрии на клиента WebSocket')
+    control_rate: float = Field(50.0, gt=0, description='Максимальная частота уставок с пульта (Гц)')
+    control_lease_timeout: float = Field(2.0, gt=0, description='Освобождение аренды управления без сообщений (с)')
+    mission_log_capacity: int = Field(1000, gt=0, description='Число хранимых строк вывода миссии')
+
+    # Миссии и данные
+    mission_folder: str = 'missions'
+    mission_stop_timeout: float = Field(1.0, gt=0, description='Ожидание остановки миссии (с)')
+    recordings_folder: str = 'recordings'
+
+    # Видео
+    video_source: Union[int, str] = 0
+    vision_workers: int = Field(2, gt=0)
+
+    # Измерение частот при запуске (rate_sweep)
+    startup_benchmark: bool = False
+    benchmark_heartbeat_intervals: List[float] = [0.02, 0.05, 0.1, 0.2]
+    benchmark_telemetry_rates: List[float] = [50.0, 100.0, 200.0]
+    benchmark_duration: float = Field(3.0, gt=0, description='Длительность одного измерения (с)')
+    benchmark_port: int = Field(5905, description='Порт имитатора при измерении (телеметрия - следующий порт)')
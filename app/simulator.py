@@ -0,0 +1,364 @@
+import argparse
+import random
+import socket
+import struct
+import threading
+import time
+
+from boat_controller import (
+    CMD_GPIO, CMD_LED, CMD_MODE, CMD_MOVE, CMD_PID, CMD_PROBE_CONTROL, CMD_TELEMETRY, COMMAND_NAMES,
+    GPIO_CMD_STRUCT, LED_CMD_STRUCT, MODE_CMD_STRUCT, MOVE_CMD_STRUCT, PID_CMD_STRUCT, PROBE_CONTROL_STRUCT,
+    TELEMETRY_PACKET,
+)
+from protocol import (
+    ACK_STRUCT, CMD_ACK, FRAME_V2, PROTOCOL_V1, PROTOCOL_V2, SEQ_MASK, TELEMETRY_ECHO_STRUCT, V2_HEADER,
+    SequenceTracker, new_session, pack_frame, seq_newer, unpack_frame,
+)
+
+# Форматы принимаемых команд
+COMMAND_STRUCTS = {
+    CMD_MOVE: struct.Struct(MOVE_CMD_STRUCT),
+    CMD_PID: struct.Struct(PID_CMD_STRUCT),
+    CMD_LED: struct.Struct(LED_CMD_STRUCT),
+    CMD_GPIO: struct.Struct(GPIO_CMD_STRUCT),
+    CMD_MODE: struct.Struct(MODE_CMD_STRUCT),
+    CMD_PROBE_CONTROL: struct.Struct(PROBE_CONTROL_STRUCT),
+}
+
+
+def angle_difference(angle1, angle2):
+    """
+    Наименьшая разница между углами в диапазоне от -180 до 180 градусов.
+    """
+    return (angle2 - angle1 + 180.0) % 360.0 - 180.0
+
+
+class CommandReceiver:
+    """
+    Прием кадров протокола v2 на стороне лодки (образец для прошивки).
+
+    Команда каждого типа применяется, только если ее номер новее последней примененной команды этого типа:
+    опоздавшая команда движения и повтор уже примененной разовой команды отбрасываются. Разовые команды
+    подтверждаются всегда, в том числе повторы, потому что подтверждение могло потеряться.
+    Кадры телеметрии и подтверждения нумеруются раздельно: потери телеметрии считаются по ее номерам.
+
+    Номера команд сравниваются внутри сессии контроллера: при смене сессии (контроллер перезапущен
+    и нумерует команды с 1) номера примененных команд забываются. Опоздавшие кадры прежних сессий
+    отбрасываются. Собственная сессия выбирается при запуске прошивки.
+    """
+
+    def __init__(self):
+        self.session = new_session()
+        self.telemetry_seq = 1
+        self.ack_seq = 1
+        self.last_applied = {}   # заголовок команды -> номер последней примененной команды
+        self.last_command = None  # (номер, метка времени, время приема) для отражения в телеметрии
+        self.commands = SequenceTracker()
+        self.stale = 0
+
+    def receive(self, data, now):
+        """
+        Разобрать кадр v2 команды.
+
+        :return: (кадр v1 для применения или None, кадр подтверждения или None)
+        """
+        if len(data) <= V2_HEADER.size:
+            return None, None
+        session, seq, timestamp, payload = unpack_frame(data)
+        current_session = self.commands.session
+        self.commands.accept(session, seq)
+        if session != self.commands.session:
+            # Кадр завершенной сессии контроллера
+            self.stale += 1
+            return None, None
+        if session != current_session:
+            self.last_applied.clear()
+        self.last_command = (seq, timestamp, now)
+        command = payload[0]
+        last = self.last_applied.get(command)
+        if last is None or seq_newer(seq, last):
+            self.last_applied[command] = seq
+        else:
+            self.stale += 1
+            payload = None
+        ack = None
+        if command != CMD_MOVE:
+            hold_us = int((time.monotonic() - now) * 1e6)
+            ack = pack_frame(self.session, self.ack_seq, ACK_STRUCT.pack(CMD_ACK, seq, timestamp, hold_us))
+            self.ack_seq = (self.ack_seq + 1) & SEQ_MASK or 1
+        return payload, ack
+
+    def telemetry_frame(self, packet, now):
+        """
+        Обернуть пакет телеметрии в кадр v2 с отраженной меткой последней команды.
+        """
+        echo_seq, echo_timestamp, hold_us = 0, 0, 0
+        if self.last_command is not None:
+            echo_seq, echo_timestamp, received_at = self.last_command
+            hold_us = int((now - received_at) * 1e6) & SEQ_MASK
+        seq = self.telemetry_seq
+        self.telemetry_seq = (seq + 1) & SEQ_MASK or 1
+        return pack_frame(self.session, seq, packet + TELEMETRY_ECHO_STRUCT.pack(echo_seq, echo_timestamp, hold_us), now)
+
+    def stats(self):
+        return {
+            'commands': self.commands.as_dict(),
+            'stale': self.stale,
+        }
+
+
+class BoatSimulator:
+    """
+    Имитатор прошивки ESP32 с моделью динамики лодки по курсу.
+
+    Принимает команды протокола boat_controller на порту ESP32 и отправляет телеметрию TELEMETRY_STRUCT
+    на порт телеметрии адреса, с которого пришла последняя команда. Курс моделируется звеном первого порядка
+    по скорости поворота; в режиме стабилизации (mode=1) поворотом управляет ПИД-регулятор курса,
+    а поле yaw команды движения задает целевой курс.
+
+    Поддерживаются обе версии протокола: телеметрия отправляется в версии последней принятой команды.
+    packet_loss имитирует потери в канале: с этой вероятностью отбрасываются входящие команды и исходящие
+    кадры телеметрии и подтверждения.
+    """
+
+    def __init__(self, listen_port=5005, telemetry_port=5006, telemetry_rate=50.0,
+                 max_yaw_rate=90.0, yaw_time_constant=0.5, yaw_noise=0.0, initial_yaw=0.0, packet_loss=0.0):
+        """
+        :param listen_port: Порт приема команд
+        :param telemetry_port: Порт телеметрии на стороне контроллера
+        :param telemetry_rate: Частота отправки телеметрии в Гц (до нескольких кГц)
+        :param max_yaw_rate: Установившаяся скорость поворота при полном управлении (град/с)
+        :param yaw_time_constant: Постоянная времени разгона поворота (с)
+        :param yaw_noise: СКО шума измерения курса (град)
+        :param initial_yaw: Начальный курс (град)
+        :param packet_loss: Вероятность потери датаграммы в каждом направлении (0..1)
+        """
+        self.listen_port = listen_port
+        self.telemetry_port = telemetry_port
+        self.telemetry_rate = telemetry_rate
+        self.max_yaw_rate = max_yaw_rate
+        self.yaw_time_constant = yaw_time_constant
+        self.yaw_noise = yaw_noise
+        self.packet_loss = packet_loss
+        self.protocol_version = PROTOCOL_V1
+        self.receiver = CommandReceiver()
+
+        # Состояние модели
+        self.yaw = initial_yaw
+        self.yaw_rate = 0.0
+        self.forward = 0.0
+        self.lateral = 0.0
+        self.yaw_command = 0.0
+        self.mode = 0
+        self.pid = [3.0, 0.0, 0.3]
+        self.integral = 0.0
+        self.motor_pwms = [1500.0, 1500.0, 1500.0, 1500.0]
+        self.adc_value = 1714.0  # ~12 В при коэффициенте 0.007 в интерфейсе
+        self.led = (0, 0, 0, 0)
+        self.gpio = 0
+        self.probe = (3, 0)
+
+        self.controller_address = None
+        self.lock = threading.Lock()
+        self.running = False
+        self.socket = None
+        self.receive_thread = None
+        self.telemetry_thread = None
+
+        # Статистика
+        self.commands_received = {name: 0 for name in COMMAND_NAMES.values()}
+        self.telemetry_sent = 0
+        self.late_ticks = 0
+        self.dropped = 0
+
+    def start(self):
+        """
+        Открыть сокет и запустить потоки приема команд и отправки телеметрии.
+        """
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.socket.bind(('', self.listen_port))
+        self.socket.settimeout(0.2)
+        self.running = True
+
+        self.receive_thread = threading.Thread(target=self._receive_commands_thread)
+        self.receive_thread.daemon = True
+        self.receive_thread.start()
+
+        self.telemetry_thread = threading.Thread(target=self._telemetry_thread)
+        self.telemetry_thread.daemon = True
+        self.telemetry_thread.start()
+
+    def stop(self):
+        """
+        Остановить потоки и закрыть сокет.
+        """
+        self.running = False
+        for thread in (self.receive_thread, self.telemetry_thread):
+            if thread is not None:
+                thread.join()
+        self.receive_thread = None
+        self.telemetry_thread = None
+        if self.socket is not None:
+            self.socket.close()
+            self.socket = None
+
+    def _receive_commands_thread(self):
+        while self.running:
+            try:
+                data, addr = self.socket.recvfrom(1024)
+            except socket.timeout:
+                continue
+            except OSError:
+                break
+            if self._lose():
+                continue
+            self.controller_address = (addr[0], self.telemetry_port)
+            if data and data[0] == FRAME_V2:
+                self.protocol_version = PROTOCOL_V2
+                data, ack = self.receiver.receive(data, time.monotonic())
+                if ack is not None:
+                    self._send(ack)
+                if data is None:
+                    continue
+            else:
+                self.protocol_version = PROTOCOL_V1
+            self.handle_command(data)
+
+    def _lose(self):
+        """
+        Имитировать потерю датаграммы.
+        """
+        if self.packet_loss and random.random() < self.packet_loss:
+            self.dropped += 1
+            return True
+        return False
+
+    def _send(self, packet):
+        address = self.controller_address
+        if address is None or self._lose():
+            return False
+        try:
+            self.socket.sendto(packet, address)
+        except OSError:
+            return False
+        return True
+
+    def handle_command(self, data):
+        """
+        Применить пакет команды к состоянию модели.
+        """
+        if not data:
+            return
+        command_struct = COMMAND_STRUCTS.get(data[0])
+        if command_struct is None or len(data) < command_struct.size:
+            return
+        values = command_struct.unpack_from(data)
+        with self.lock:
+            if data[0] == CMD_MOVE:
+                _, self.forward, self.lateral, self.yaw_command = values
+            elif data[0] == CMD_PID:
+                self.pid = list(values[1:])
+                self.integral = 0.0
+            elif data[0] == CMD_MODE:
+                if self.mode != values[1]:
+                    self.integral = 0.0
+                self.mode = values[1]
+            elif data[0] == CMD_LED:
+                self.led = values[1:]
+            elif data[0] == CMD_GPIO:
+                self.gpio = values[1]
+            elif data[0] == CMD_PROBE_CONTROL:
+                self.probe = values[1:]
+        self.commands_received[COMMAND_NAMES[data[0]]] += 1
+
+    def step(self, dt):
+        """
+        Продвинуть модель на dt секунд.
+        """
+        with self.lock:
+            if self.mode:
+                kp, ki, kd = self.pid
+                error = angle_difference(self.yaw, self.yaw_command)
+                self.integral += error * dt
+                turn = kp * error + ki * self.integral - kd * self.yaw_rate
+            else:
+                turn = self.yaw_command
+            turn = max(-100.0, min(100.0, turn))
+
+            target_rate = self.max_yaw_rate * turn / 100.0
+            self.yaw_rate += (target_rate - self.yaw_rate) * min(1.0, dt / self.yaw_time_constant)
+            self.yaw = (self.yaw + self.yaw_rate * dt + 180.0) % 360.0 - 180.0
+
+            # Смешивание для четырех двигателей: левые/правые по ходу и по лагу
+            forward, lateral = self.forward, self.lateral
+            mix = (forward + lateral + turn, forward - lateral - turn, forward - lateral + turn, forward + lateral - turn)
+            self.motor_pwms = [max(1100.0, min(1900.0, 1500.0 + 4.0 * value)) for value in mix]
+
+    def telemetry_packet(self):
+        """
+        Сформировать пакет телеметрии по текущему состоянию модели.
+        """
+        with self.lock:
+            yaw = self.yaw
+            if self.yaw_noise:
+                yaw = (yaw + random.gauss(0.0, self.yaw_noise) + 180.0) % 360.0 - 180.0
+            return TELEMETRY_PACKET.pack(CMD_TELEMETRY, 0.0, 0.0, yaw, self.adc_value, *self.motor_pwms, *self.pid)
+
+    def _telemetry_thread(self):
+        period = 1.0 / self.telemetry_rate
+        last = time.monotonic()
+        deadline = last + period
+        while self.running:
+            delay = deadline - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                self.late_ticks += 1
+            now = time.monotonic()
+            self.step(now - last)
+            last = now
+            packet = self.telemetry_packet()
+            if self.protocol_version == PROTOCOL_V2:
+                packet = self.receiver.telemetry_frame(packet, now)
+            if self._send(packet):
+                self.telemetry_sent += 1
+            deadline += period
+            # После длительной задержки не пытаемся догнать пропущенные такты
+            if now - deadline > period:
+                deadline = now + period
+
+    def stats(self):
+        return {
+            'telemetry_sent': self.telemetry_sent,
+            'late_ticks': self.late_ticks,
+            'commands_received': dict(self.commands_received),
+            'yaw': self.yaw,
+            'yaw_rate': self.yaw_rate,
+            'mode': self.mode,
+            'protocol_version': self.protocol_version,
+            'dropped': self.dropped,
+            'protocol': self.receiver.stats(),
+        }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Имитатор ESP32 лодки')
+    parser.add_argument('--listen-port', type=int, default=5005, help='Порт приема команд')
+    parser.add_argument('--telemetry-port', type=int, default=5006, help='Порт телеметрии контроллера')
+    parser.add_argument('--rate', type=float, default=50.0, help='Частота телеметрии в Гц')
+    parser.add_argument('--yaw-noise', type=float, default=0.0, help='СКО шума курса в градусах')
+    parser.add_argument('--loss', type=float, default=0.0, help='Вероятность потери датаграммы (0..1)')
+    args = parser.parse_args()
+
+    simulator = BoatSimulator(args.listen_port, args.telemetry_port, args.rate, yaw_noise=args.yaw_noise,
+                              packet_loss=args.loss)
+    simulator.start()
+    print(f'Имитатор запущен: команды на порту {args.listen_port}, телеметрия {args.rate:g} Гц')
+    try:
+        while True:
+            time.sleep(5)
+            print(simulator.stats())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        simulator.stop()
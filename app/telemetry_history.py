@@ -0,0 +1,140 @@
+import threading
+import time
+
+import numpy as np
+
+# Поля истории телеметрии в порядке столбцов (совпадает с порядком значений TELEMETRY_STRUCT без заголовка)
+HISTORY_FIELDS = ('roll', 'pitch', 'yaw', 'adc_value', 'pwm1', 'pwm2', 'pwm3', 'pwm4', 'p', 'i', 'd')
+FIELD_INDEX = {name: index for index, name in enumerate(HISTORY_FIELDS)}
+
+
+class TelemetryHistory:
+    """
+    Кольцевой буфер телеметрии фиксированной емкости на массивах NumPy.
+
+    Хранит время приема (time.monotonic()) и значения всех полей каждого кадра. Запись выполняется
+    в потоке приема телеметрии, запросы возвращают копии упорядоченных по времени данных.
+    """
+
+    def __init__(self, capacity=6000):
+        """
+        :param capacity: Максимальное число хранимых кадров (по умолчанию 6000 - одна минута при 100 Гц)
+        """
+        self.capacity = capacity
+        self.times = np.zeros(capacity, dtype=np.float64)
+        self.values = np.zeros((capacity, len(HISTORY_FIELDS)), dtype=np.float32)
+        self.count = 0  # Общее число записанных кадров
+        self.lock = threading.Lock()
+
+    def append(self, telemetry, packet, received_at):
+        """
+        Добавить кадр. Сигнатура совпадает с обработчиком BoatController.add_telemetry_listener.
+        """
+        with self.lock:
+            index = self.count % self.capacity
+            self.times[index] = received_at
+            self.values[index] = telemetry.values[1:]
+            self.count += 1
+
+    def __len__(self):
+        return min(self.count, self.capacity)
+
+    def _ordered(self):
+        """
+        Получить копии массивов в хронологическом порядке. Вызывается под блокировкой.
+        """
+        size = min(self.count, self.capacity)
+        start = self.count % self.capacity if self.count > self.capacity else 0
+        order = (np.arange(size) + start) % self.capacity
+        return self.times[order], self.values[order]
+
+    def last(self, seconds, now=None):
+        """
+        Кадры за последние seconds секунд.
+
+        :param seconds: Длина окна в секундах
+        :param now: Момент конца окна по time.monotonic() (по умолчанию текущее время)
+        :return: (times, values) - массивы времени (N,) и значений (N, len(HISTORY_FIELDS))
+        """
+        now = time.monotonic() if now is None else now
+        with self.lock:
+            times, values = self._ordered()
+        start = np.searchsorted(times, now - seconds, side='left')
+        return times[start:], values[start:]
+
+    def field(self, name, seconds, now=None):
+        """
+        Значения одного поля за последние seconds секунд.
+
+        :return: (times, values) - массивы времени и значений поля
+        """
+        times, values = self.last(seconds, now)
+        return times, values[:, FIELD_INDEX[name]]
+
+    def resample(self, seconds, step, now=None):
+        """
+        Окно за последние seconds секунд, линейно интерполированное на равномерную сетку с шагом step.
+
+        Курс интерполируется с учетом перехода через ±180 градусов.
+
+        :return: (times, values) - равномерная сетка времени и значения на ней
+        """
+        now = time.monotonic() if now is None else now
+        times, values = self.last(seconds, now)
+        grid = np.arange(now - seconds, now + step * 0.5, step)
+        if len(times) == 0:
+            return grid, np.full((len(grid), len(HISTORY_FIELDS)), np.nan, dtype=np.float32)
+        columns = values.astype(np.float64)
+        yaw = FIELD_INDEX['yaw']
+        columns[:, yaw] = np.degrees(np.unwrap(np.radians(columns[:, yaw])))
+        resampled = np.empty((len(grid), len(HISTORY_FIELDS)), dtype=np.float64)
+        for column in range(len(HISTORY_FIELDS)):
+            resampled[:, column] = np.interp(grid, times, columns[:, column], left=np.nan, right=columns[-1, column])
+        resampled[:, yaw] = (resampled[:, yaw] + 180.0) % 360.0 - 180.0
+        return grid, resampled
+
+    def stats(self, seconds, now=None):
+        """
+        Среднее, минимум и максимум каждого поля за последние seconds секунд.
+
+        Для курса среднее круговое (по средним синусу и косинусу), а минимум и максимум отсчитываются
+        от среднего без разрыва на ±180 градусов и поэтому могут выходить за этот диапазон
+        (курс 179/-179 дает среднее 180, минимум 179 и максимум 181).
+
+        :return: Словарь {поле: {'mean', 'min', 'max'}}; пустой, если кадров нет
+        """
+        _, values = self.last(seconds, now)
+        if len(values) == 0:
+            return {}
+        mean = values.mean(axis=0, dtype=np.float64)
+        minimum = values.min(axis=0).astype(np.float64)
+        maximum = values.max(axis=0).astype(np.float64)
+        yaw = FIELD_INDEX['yaw']
+        radians = np.radians(values[:, yaw].astype(np.float64))
+        mean[yaw] = np.degrees(np.arctan2(np.sin(radians).mean(), np.cos(radians).mean()))
+        deviation = (values[:, yaw] - mean[yaw] + 180.0) % 360.0 - 180.0
+        minimum[yaw] = mean[yaw] + deviation.min()
+        maximum[yaw] = mean[yaw] + deviation.max()
+        return {
+            name: {'mean': float(mean[i]), 'min': float(minimum[i]), 'max': float(maximum[i])}
+            for i, name in enumerate(HISTORY_FIELDS)
+        }
+
+    def yaw_rate(self, seconds, now=None):
+        """
+        Скорость изменения курса (град/с) за последние seconds секунд.
+
+        Курс разворачивается через ±180 градусов перед дифференцированием. Из кадров с одинаковым
+        временем приема остается последний, иначе производная делится на ноль.
+
+        :return: (times, rate) - массивы времени и производной курса
+        """
+        times, yaw = self.field('yaw', seconds, now)
+        if len(times) < 2:
+            return times, np.zeros(len(times))
+        unique = np.append(np.diff(times) > 0, True)
+        times, yaw = times[unique], yaw[unique]
+        if len(times) < 2:
+            return times, np.zeros(len(times))
+        unwrapped = np.degrees(np.unwrap(np.radians(yaw.astype(np.float64))))
+        return times, np.gradient(unwrapped, times)
@@ -0,0 +1,162 @@
+import asyncio
+import json
+import struct
+import threading
+import time
+from collections import deque
+
+# Кодировки кадров телеметрии для WebSocket
+ENCODING_JSON = 'json'
+ENCODING_BINARY = 'binary'
+ENCODINGS = (ENCODING_JSON, ENCODING_BINARY)
+
+# Бинарный кадр: время приема (double, секунды Unix) + roll, pitch, yaw, adc_value, pwm двигателей (float * 4),
+# p, i, d (float). Little-endian без выравнивания, 52 байта.
+BINARY_TELEMETRY_STRUCT = struct.Struct('<d11f')
+
+
+def encode_binary_telemetry(telemetry, timestamp):
+    """
+    Упаковать снимок Telemetry в бинарный кадр BINARY_TELEMETRY_STRUCT.
+    """
+    return BINARY_TELEMETRY_STRUCT.pack(timestamp, *telemetry.values[1:])
+
+
+def encode_telemetry(telemetry, encoding, timestamp=None):
+    """
+    Закодировать кадр телеметрии в выбранной кодировке.
+    """
+    if encoding == ENCODING_BINARY:
+        return encode_binary_telemetry(telemetry, time.time() if timestamp is None else timestamp)
+    return json.dumps(telemetry.as_dict())
+
+
+class TelemetrySubscription:
+    """
+    Подписка одного клиента на поток телеметрии.
+
+    Кадры складываются в ограниченную очередь: если клиент не успевает их забирать, самые старые кадры
+    отбрасываются. Ограничение частоты пропускает кадры, пришедшие раньше min_interval после предыдущего.
+    """
+
+    def __init__(self, max_queue=8, max_rate=None, encoding=ENCODING_JSON):
+        """
+        :param max_queue: Максимальное число кадров, ожидающих отправки клиенту
+        :param max_rate: Максимальная частота кадров для клиента в Гц (None - без ограничения)
+        :param encoding: Кодировка кадров (ENCODING_JSON или ENCODING_BINARY)
+        """
+        self.encoding = encoding
+        self.frames = deque(maxlen=max_queue)
+        self.event = asyncio.Event()
+        self.min_interval = 1.0 / max_rate if max_rate else 0.0
+        self.last_delivered = 0.0
+        self.delivered = 0
+        self.dropped = 0
+        self.skipped = 0
+
+    def set_rate(self, max_rate):
+        """
+        Изменить ограничение частоты кадров (None или 0 - без ограничения).
+        """
+        self.min_interval = 1.0 / max_rate if max_rate else 0.0
+
+    def _offer(self, frames, now):
+        """
+        Предложить кадр подписке. Вызывается в цикле событий.
+        """
+        if self.min_interval and now - self.last_delivered < self.min_interval:
+            self.skipped += 1
+            return
+        if len(self.frames) == self.frames.maxlen:
+            self.dropped += 1
+        self.frames.append(frames[self.encoding])
+        self.last_delivered = now
+        self.delivered += 1
+        self.event.set()
+
+    async def get(self):
+        """
+        Дождаться следующего кадра.
+        """
+        while not self.frames:
+            self.event.clear()
+            await self.event.wait()
+        return self.frames.popleft()
+
+    def stats(self):
+        return {
+            'delivered': self.delivered,
+            'dropped': self.dropped,
+            'skipped': self.skipped,
+            'queued': len(self.frames),
+        }
+
+
+class TelemetryHub:
+    """
+    Рассылка телеметрии всем подписчикам WebSocket.
+
+    Каждый новый кадр кодируется один раз для каждой используемой кодировки (JSON и/или бинарной)
+    и передается во все подписки, независимо от числа клиентов.
+    publish() можно вызывать из любого потока: доставка всегда выполняется в цикле событий приложения.
+    """
+
+    def __init__(self, max_queue=8):
+        """
+        :param max_queue: Размер очереди кадров для каждой подписки по умолчанию
+        """
+        self.max_queue = max_queue
+        self.loop = None
+        self.loop_thread_id = None
+        self.subscriptions = []
+        self.encodings = set()
+        self.published = 0
+
+    def bind_loop(self, loop):
+        """
+        Привязать рассылку к циклу событий приложения.
+        """
+        self.loop = loop
+        self.loop_thread_id = threading.get_ident()
+
+    def subscribe(self, max_rate=None, max_queue=None, encoding=ENCODING_JSON):
+        """
+        Создать подписку на телеметрию.
+
+        :param max_rate: Максимальная частота кадров в Гц (None - без ограничения)
+        :param max_queue: Размер очереди кадров (None - значение хаба)
+        :param encoding: Кодировка кадров (ENCODING_JSON или ENCODING_BINARY)
+        """
+        if encoding not in ENCODINGS:
+            raise ValueError(f'Неизвестная кодировка телеметрии: {encoding}')
+        subscription = TelemetrySubscription(max_queue or self.max_queue, max_rate, encoding)
+        self.subscriptions = self.subscriptions + [subscription]
+        self._update_encodings()
+        return subscription
+
+    def unsubscribe(self, subscription):
+        self.subscriptions = [s for s in self.subscriptions if s is not subscription]
+        self._update_encodings()
+
+    def _update_encodings(self):
+        self.encodings = {s.encoding for s in self.subscriptions}
+
+    def publish(self, telemetry, packet, received_at):
+        """
+        Разослать новый кадр телеметрии. Сигнатура совпадает с обработчиком BoatController.add_telemetry_listener.
+        """
+        if self.loop is None or not self.subscriptions:
+            return
+        timestamp = time.time()
+        frames = {encoding: encode_telemetry(telemetry, encoding, timestamp) for encoding in self.encodings}
+        if threading.get_ident() == self.loop_thread_id:
+            self._deliver(frames)
+        else:
+            self.loop.call_soon_threadsafe(self._deliver, frames)
+
+    def _deliver(self, frames):
+        now = time.monotonic()
+        self.published += 1
+        for subscription in self.subscriptions:
+            if subscription.encoding in frames:
+                subscription._offer(frames, now)
@@ -0,0 +1,226 @@
+import numpy as np
+
+from mission_runtime import PeriodicTimer, periodic
+
+# Шаг дискретизации профилей по умолчанию (с)
+DEFAULT_STEP = 0.02
+
+
+def normalize_angle(angles):
+    """
+    Привести углы к диапазону [-180, 180) градусов. Принимает число или массив.
+    """
+    return (np.asarray(angles, dtype=np.float64) + 180.0) % 360.0 - 180.0
+
+
+def angle_difference(angles1, angles2):
+    """
+    Наименьшая разница углов angles2 - angles1 в диапазоне [-180, 180) градусов. Принимает числа или массивы.
+    """
+    return normalize_angle(np.asarray(angles2, dtype=np.float64) - angles1)
+
+
+class Profile:
+    """
+    Профиль движения: моменты времени, целевые курсы и скорости хода вперед.
+
+    Курсы хранятся без разрыва на границе ±180 градусов, поэтому профиль интерполируется линейно,
+    а приводятся к диапазону только при выдаче уставок.
+    """
+    __slots__ = ('times', 'headings', 'speeds')
+
+    def __init__(self, times, headings, speeds):
+        """
+        :param times: Моменты времени от начала профиля (с), по возрастанию
+        :param headings: Непрерывные курсы (град)
+        :param speeds: Скорость хода вперед (%)
+        """
+        self.times = np.asarray(times, dtype=np.float64)
+        self.headings = np.asarray(headings, dtype=np.float64)
+        self.speeds = np.broadcast_to(np.asarray(speeds, dtype=np.float64), self.times.shape).copy()
+
+    @property
+    def duration(self):
+        return float(self.times[-1]) if len(self.times) else 0.0
+
+    @property
+    def final_heading(self):
+        return float(normalize_angle(self.headings[-1]))
+
+    def sample(self, times):
+        """
+        Интерполировать профиль в моменты times.
+
+        :return: (курсы в диапазоне [-180, 180), скорости)
+        """
+        headings = np.interp(times, self.times, self.headings)
+        speeds = np.interp(times, self.times, self.speeds)
+        return normalize_angle(headings), speeds
+
+    def resample(self, step):
+        """
+        Профиль с равномерным шагом step секунд.
+        """
+        times = np.arange(0.0, self.duration + step * 0.5, step)
+        return Profile(times, np.interp(times, self.times, self.headings), np.interp(times, self.times, self.speeds))
+
+    def then(self, other):
+        """
+        Продолжить профиль профилем other (его время и курс отсчитываются от конца этого профиля).
+        """
+        return concatenate(self, other)
+
+
+def concatenate(*profiles):
+    """
+    Склеить профили последовательно во времени с сохранением непрерывности курса.
+    """
+    times = [profiles[0].times]
+    headings = [profiles[0].headings]
+    speeds = [profiles[0].speeds]
+    end_time = profiles[0].duration
+    end_heading = profiles[0].headings[-1]
+    for profile in profiles[1:]:
+        # Сдвиг на целое число оборотов, чтобы курс продолжался без скачка
+        shift = end_heading + angle_difference(end_heading, profile.headings[0]) - profile.headings[0]
+        times.append(profile.times[1:] + end_time)
+        headings.append(profile.headings[1:] + shift)
+        speeds.append(profile.speeds[1:])
+        end_time += profile.duration
+        end_heading = headings[-1][-1] if len(headings[-1]) else end_heading
+    return Profile(np.concatenate(times), np.concatenate(headings), np.concatenate(speeds))
+
+
+def straight(heading, duration, speed, step=DEFAULT_STEP):
+    """
+    Движение постоянным курсом.
+    """
+    times = _times(duration, step)
+    return Profile(times, np.full_like(times, heading), speed)
+
+
+def arc(start_heading, turn_angle, duration, speed, step=DEFAULT_STEP):
+    """
+    Дуга: равномерный поворот на turn_angle градусов (положительный - по часовой стрелке) за duration секунд.
+    """
+    times = _times(duration, step)
+    return Profile(times, start_heading + turn_angle * times / duration, speed)
+
+
+def circle(start_heading, duration, speed, clockwise=True, step=DEFAULT_STEP):
+    """
+    Полный оборот за duration секунд.
+    """
+    return arc(start_heading, 360.0 if clockwise else -360.0, duration, speed, step)
+
+
+def heading_ramp(start_heading, target_heading, max_turn_rate, speed=0.0, step=DEFAULT_STEP):
+    """
+    Поворот кратчайшим путем к целевому курсу с ограничением скорости поворота max_turn_rate (град/с).
+    """
+    turn = float(angle_difference(start_heading, target_heading))
+    duration = abs(turn) / max_turn_rate
+    if duration == 0.0:
+        return Profile([0.0], [start_heading], speed)
+    return arc(start_heading, turn, duration, speed, step)
+
+
+def waypoint_headings(headings, hold_times, max_turn_rate, speed, step=DEFAULT_STEP):
+    """
+    Последовательность курсов: поворот к каждому курсу с ограничением скорости поворота и удержание.
+
+    Длительности поворотов вычисляются сразу для всех курсов.
+
+    :param headings: Курсы (град)
+    :param hold_times: Время удержания каждого курса (с), число или массив
+    """
+    headings = np.asarray(headings, dtype=np.float64)
+    hold_times = np.broadcast_to(np.asarray(hold_times, dtype=np.float64), headings.shape)
+    # Непрерывные курсы вершин и моменты начала и конца каждого удержания
+    turns = angle_difference(headings[:-1], headings[1:])
+    vertices = headings[0] + np.concatenate(([0.0], np.cumsum(turns)))
+    turn_durations = np.concatenate(([0.0], np.abs(turns) / max_turn_rate))
+    hold_start = np.cumsum(turn_durations + np.concatenate(([0.0], hold_times[:-1])))
+    hold_end = hold_start + hold_times
+    knot_times = np.column_stack((hold_start, hold_end)).ravel()
+    knot_headings = np.repeat(vertices, 2)
+    times = _times(knot_times[-1], step)
+    return Profile(times, np.interp(times, knot_times, knot_headings), speed)
+
+
+def lawnmower(start_heading, leg_duration, legs, speed, turn_rate=30.0, turn_speed=None, step=DEFAULT_STEP):
+    """
+    Галсы обследования: прямые участки с разворотами на 180 градусов поочередно вправо и влево.
+
+    :param leg_duration: Длительность прямого участка (с)
+    :param legs: Число прямых участков
+    :param turn_rate: Скорость поворота на развороте (град/с)
+    :param turn_speed: Скорость хода на развороте (по умолчанию speed)
+    """
+    turn_speed = speed if turn_speed is None else turn_speed
+    turn_duration = 180.0 / turn_rate
+    segments = []
+    heading = start_heading
+    for leg in range(legs):
+        segments.append(straight(heading, leg_duration, speed, step))
+        if leg < legs - 1:
+            turn = 180.0 if leg % 2 == 0 else -180.0
+            segments.append(arc(heading, turn, turn_duration, turn_speed, step))
+            heading += turn
+    return concatenate(*segments)
+
+
+def _times(duration, step):
+    count = max(2, int(round(duration / step)) + 1)
+    return np.linspace(0.0, duration, count)
+
+
+class ProfilePlayer:
+    """
+    Воспроизведение профиля: уставки курса и скорости передаются контроллеру с частотой rate.
+
+    Профиль заранее пересчитывается к шагу 1 / rate, поэтому на каждом такте выполняется только выборка
+    по индексу. Номер такта берется по фактическому времени, поэтому при опоздании такта уставка
+    соответствует текущему моменту профиля.
+    """
+
+    def __init__(self, profile, boat_controller, rate=50.0, cancel_token=None):
+        """
+        :param profile: Profile
+        :param boat_controller: BoatController (или обертка миссии)
+        :param rate: Частота уставок (Гц), не зависит от шага профиля
+        :param cancel_token: CancelToken миссии для прерывания воспроизведения
+        """
+        self.period = 1.0 / rate
+        self.boat_controller = boat_controller
+        self.cancel_token = cancel_token
+        resampled = profile.resample(self.period)
+        self.headings = normalize_angle(resampled.headings).tolist()
+        self.speeds = resampled.speeds.tolist()
+        self.ticks = 0
+
+    def _apply(self, index):
+        index = min(index, len(self.headings) - 1)
+        self.boat_controller.set_target_heading(self.headings[index])
+        self.boat_controller.send_movement_command(self.speeds[index], 0.0, 0.0)
+        self.ticks += 1
+        return index
+
+    def run(self):
+        """
+        Воспроизвести профиль в потоке миссии.
+        """
+        timer = PeriodicTimer(self.period, self.cancel_token)
+        start = timer.deadline
+        last = len(self.headings) - 1
+        index = 0
+        while index < last:
+            index = self._apply(int(round((timer.deadline - start) / self.period)))
+            timer.wait()
+
+    async def play(self):
+        """
+        Воспроизвести профиль в асинхронной миссии.
+        """
+        async for tick in periodic(self.period, len(self.headings) * self.period):
+            self._apply(tick)
@@ -1,40 +1,406 @@
-import cv2
+import argparse
+import queue
 import subprocess
+import threading
+import time
+
+import cv2
+import numpy as np
+
+
+class FramePool:
+    """
+    Пул заранее выделенных буферов кадров.
+
+    Буфер в каждый момент принадлежит одной стороне: свободен, захвачен камерой или передан потребителю.
+    Передаются только индексы буферов, сами кадры не копируются.
+    """
+
+    def __init__(self, count, shape, dtype=np.uint8):
+        """
+        :param count: Число буферов
+        :param shape: Форма кадра (высота, ширина, каналы)
+        """
+        self.buffers = [np.empty(shape, dtype) for _ in range(count)]
+        self.sequence = [0] * count       # Номер кадра в буфере
+        self.captured_at = [0.0] * count  # Время захвата кадра по time.monotonic()
+        self.free = queue.Queue()
+        self.ready = queue.Queue()
+        for index in range(count):
+            self.free.put(index)
+
+
+class SyntheticVideoSource:
+    """
+    Синтетический видеоисточник с интерфейсом cv2.VideoCapture (для проверки и измерения задержки без камеры).
+
+    Кадр - горизонтальный градиент с движущейся вертикальной полосой.
+    """
+
+    def __init__(self, width=640, height=480, fps=30.0):
+        self.width = width
+        self.height = height
+        self.fps = fps
+        self.position = 0
+        self.background = None
+
+    def isOpened(self):
+        return True
+
+    def set(self, prop, value):
+        if prop == cv2.CAP_PROP_FRAME_WIDTH:
+            self.width = int(value)
+        elif prop == cv2.CAP_PROP_FRAME_HEIGHT:
+            self.height = int(value)
+        elif prop == cv2.CAP_PROP_FPS:
+            self.fps = float(value)
+        self.background = None
+        return True
+
+    def get(self, prop):
+        if prop == cv2.CAP_PROP_FRAME_WIDTH:
+            return float(self.width)
+        if prop == cv2.CAP_PROP_FRAME_HEIGHT:
+            return float(self.height)
+        if prop == cv2.CAP_PROP_FPS:
+            return float(self.fps)
+        return 0.0
+
+    def read(self, image=None):
+        shape = (self.height, self.width, 3)
+        if self.background is None:
+            gradient = np.linspace(0, 255, self.width, dtype=np.uint8)
+            self.background = np.empty(shape, np.uint8)
+            self.background[...] = gradient[np.newaxis, :, np.newaxis]
+        if image is None or image.shape != shape:
+            image = np.empty(shape, np.uint8)
+        image[...] = self.background
+        stripe = self.position % self.width
+        image[:, stripe:stripe + 16] = (0, 0, 255)
+        self.position += 8
+        return True, image
+
+    def release(self):
+        pass
+
+
+class CameraCapture:
+    """
+    Захват кадров камеры в буферы FramePool без выделения памяти на каждый кадр.
+
+    Поток захвата читает кадр сразу в свободный буфер (cap.read(image=buffer)) и передает его потребителю
+    через очередь готовых кадров. Если свободных буферов нет (потребитель не успевает), самый старый
+    непрочитанный кадр отбрасывается и его буфер используется повторно, поэтому камера не ждет потребителя.
+    """
+
+    def __init__(self, source=0, width=None, height=None, fps=None, pool_size=4, paced=False, loop=False,
+                 queue_frames=True):
+        """
+        :param source: Номер камеры, путь к видеофайлу или 'synthetic' (SyntheticVideoSource)
+        :param width: Ширина кадра (None - по умолчанию камеры)
+        :param height: Высота кадра (None - по умолчанию камеры)
+        :param fps: Частота кадров камеры (None - по умолчанию камеры)
+        :param pool_size: Число буферов кадров
+        :param paced: Выдерживать частоту fps при чтении (для видеофайлов, которые читаются без задержек)
+        :param loop: Повторять видеофайл с начала по окончании
+        :param queue_frames: Передавать кадры в очередь для acquire(); если False, кадры получают
+                             только обработчики add_frame_listener, и буфер сразу возвращается в пул
+        """
+        self.source = source
+        self.width = width
+        self.height = height
+        self.fps = fps
+        self.pool_size = pool_size
+        self.paced = paced
+        self.loop = loop
+        self.queue_frames = queue_frames
+
+        self.cap = None
+        self.pool = None
+        self.shape = None
+        self.running = False
+        self.capture_thread = None
+        self.frame_listeners = []
+
+        # Статистика
+        self.captured = 0
+        self.dropped = 0
+        self.read_time = 0.0
+        self.started_at = None
+
+    def open(self):
+        """
+        Открыть источник и выделить буферы по размеру первого кадра.
+        """
+        if self.source == 'synthetic':
+            self.cap = SyntheticVideoSource()
+        else:
+            self.cap = cv2.VideoCapture(self.source)
+        try:
+            if not self.cap.isOpened():
+                raise RuntimeError(f'Не удалось открыть видеоисточник {self.source}')
+            if self.width:
+                self.cap.set(cv2.CAP_PROP_FRAME_WIDTH, self.width)
+            if self.height:
+                self.cap.set(cv2.CAP_PROP_FRAME_HEIGHT, self.height)
+            if self.fps:
+                self.cap.set(cv2.CAP_PROP_FPS, self.fps)
+            else:
+                self.fps = self.cap.get(cv2.CAP_PROP_FPS) or 30.0
+            ret, frame = self.cap.read()
+            if not ret:
+                raise RuntimeError(f'Видеоисточник {self.source} не возвращает кадры')
+        except Exception:
+            # Следующий start() должен открыть источник заново
+            self.cap.release()
+            self.cap = None
+            raise
+        self.shape = frame.shape
+        self.pool = FramePool(self.pool_size, self.shape, frame.dtype)
+
+    def start(self):
+        if self.cap is None:
+            self.open()
+        self.running = True
+        self.started_at = time.monotonic()
+        self.capture_thread = threading.Thread(target=self._capture_thread)
+        self.capture_thread.daemon = True
+        self.capture_thread.start()
+
+    def stop(self):
+        self.running = False
+        if self.capture_thread is not None:
+            self.capture_thread.join()
+            self.capture_thread = None
+        if self.cap is not None:
+            self.cap.release()
+            self.cap = None
+
+    def add_frame_listener(self, listener):
+        """
+        Подписаться на кадры: listener(frame, sequence, captured_at) вызывается в потоке захвата.
+
+        Буфер frame после возврата из обработчика используется повторно; чтобы сохранить кадр,
+        обработчик должен его скопировать.
+        """
+        self.frame_listeners = self.frame_listeners + [listener]
+
+    def remove_frame_listener(self, listener):
+        self.frame_listeners = [l for l in self.frame_listeners if l != listener]
+
+    def _take_buffer(self):
+        """
+        Получить буфер для следующего кадра, при необходимости отбросив самый старый готовый кадр.
+        """
+        try:
+            return self.pool.free.get_nowait()
+        except queue.Empty:
+            pass
+        try:
+            index = self.pool.ready.get_nowait()
+            self.dropped += 1
+            return index
+        except queue.Empty:
+            pass
+        # Все буферы у потребителя: ждем возврата любого из них
+        while self.running:
+            try:
+                return self.pool.free.get(timeout=0.2)
+            except queue.Empty:
+                pass
+        return None
+
+    def _capture_thread(self):
+        period = 1.0 / self.fps
+        deadline = time.monotonic()
+        sequence = 0
+        while self.running:
+            if self.paced:
+                deadline += period
+                delay = deadline - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+                elif delay < -period:
+                    deadline = time.monotonic()
+
+            index = self._take_buffer()
+            if index is None:
+                break
+            buffer = self.pool.buffers[index]
+            read_start = time.monotonic()
+            ret, frame = self.cap.read(image=buffer)
+            if not ret:
+                self.pool.free.put(index)
+                if self.loop:
+                    self.cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+                    continue
+                break
+            if frame is not buffer:
+                # Драйвер вернул кадр в собственном буфере (например, после смены разрешения)
+                buffer[...] = frame
+            captured_at = time.monotonic()
+            self.read_time += captured_at - read_start
+            sequence += 1
+            self.captured += 1
+            self.pool.sequence[index] = sequence
+            self.pool.captured_at[index] = captured_at
+
+            for listener in self.frame_listeners:
+                try:
+                    listener(buffer, sequence, captured_at)
+                except Exception as e:
+                    print(f"Ошибка в обработчике кадров: {e}")
+            if self.queue_frames:
+                self.pool.ready.put(index)
+            else:
+                self.pool.free.put(index)
+        self.running = False
+
+    def acquire(self, timeout=None):
+        """
+        Получить следующий готовый кадр. Буфер нужно вернуть вызовом release(index).
+
+        :return: (index, frame, sequence, captured_at) или None по истечении timeout
+        """
+        try:
+            index = self.pool.ready.get(timeout=timeout)
+        except queue.Empty:
+            return None
+        return index, self.pool.buffers[index], self.pool.sequence[index], self.pool.captured_at[index]
+
+    def release(self, index):
+        self.pool.free.put(index)
+
+    def stats(self):
+        elapsed = time.monotonic() - self.started_at if self.started_at else 0.0
+        return {
+            'captured': self.captured,
+            'dropped': self.dropped,
+            'drop_rate': self.dropped / self.captured if self.captured else 0.0,
+            'capture_fps': self.captured / elapsed if elapsed else 0.0,
+            'avg_read_ms': self.read_time / self.captured * 1000.0 if self.captured else 0.0,
+        }
+
+
+class FFmpegStreamer:
+    """
+    Передача кадров CameraCapture в ffmpeg в отдельном потоке.
+
+    Кадр записывается в канал ffmpeg напрямую из буфера пула (через memoryview, без tobytes()),
+    после чего буфер возвращается в пул. Если кодирование не успевает за камерой, кадры отбрасываются
+    на стороне захвата.
+    """
+
+    def __init__(self, capture, destination, preset='ultrafast', output_format='mpegts'):
+        """
+        :param capture: Запущенный или открытый CameraCapture
+        :param destination: Адрес или файл вывода ffmpeg (например, udp://192.168.37.10:1234)
+        """
+        self.capture = capture
+        self.destination = destination
+        self.preset = preset
+        self.output_format = output_format
+        self.proc = None
+        self.running = False
+        self.writer_thread = None
+
+        # Статистика
+        self.written = 0
+        self.write_time = 0.0
+        self.frame_age = 0.0  # Суммарное время от захвата до записи кадра
+
+    def ffmpeg_command(self):
+        height, width = self.capture.shape[:2]
+        return [
+            'ffmpeg',
+            '-y',
+            '-f', 'rawvideo',
+            '-vcodec', 'rawvideo',
+            '-pix_fmt', 'bgr24',
+            '-s', f"{width}x{height}",
+            '-r', f"{self.capture.fps:g}",
+            '-i', '-',
+            '-c:v', 'libx264',
+            '-preset', self.preset,
+            '-tune', 'zerolatency',
+            '-f', self.output_format,
+            self.destination,
+        ]
+
+    def start(self):
+        if self.capture.cap is None:
+            self.capture.open()
+        self.proc = subprocess.Popen(self.ffmpeg_command(), stdin=subprocess.PIPE)
+        self.running = True
+        self.writer_thread = threading.Thread(target=self._writer_thread)
+        self.writer_thread.daemon = True
+        self.writer_thread.start()
+        if not self.capture.running:
+            self.capture.start()
+
+    def stop(self):
+        self.running = False
+        if self.writer_thread is not None:
+            self.writer_thread.join()
+            self.writer_thread = None
+        if self.proc is not None:
+            self.proc.stdin.close()
+            self.proc.wait()
+            self.proc = None
+
+    def _writer_thread(self):
+        stdin = self.proc.stdin
+        while self.running:
+            item = self.capture.acquire(timeout=0.2)
+            if item is None:
+                if not self.capture.running:
+                    break
+                continue
+            index, frame, sequence, captured_at = item
+            try:
+                write_start = time.monotonic()
+                stdin.write(memoryview(frame).cast('B'))
+                now = time.monotonic()
+                self.write_time += now - write_start
+                self.frame_age += now - captured_at
+                self.written += 1
+            except (BrokenPipeError, OSError) as e:
+                print(f"Ошибка записи в ffmpeg: {e}")
+                break
+            finally:
+                self.capture.release(index)
+        self.running = False
+
+    def stats(self):
+        result = self.capture.stats()
+        result.update({
+            'written': self.written,
+            'avg_write_ms': self.write_time / self.written * 1000.0 if self.written else 0.0,
+            'avg_frame_age_ms': self.frame_age / self.written * 1000.0 if self.written else 0.0,
+        })
+        return result
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Трансляция видео с камеры через ffmpeg')
+    parser.add_argument('--source', default='0', help='Номер камеры или путь к видеофайлу')
+    parser.add_argument('--destination', default='udp://192.168.37.10:1234', help='Адрес вывода ffmpeg')
+    parser.add_argument('--fps', type=float, default=30.0, help='Частота кадров')
+    parser.add_argument('--pool-size', type=int, default=4, help='Число буферов кадров')
+    args = parser.parse_args()
 
-cap = cv2.VideoCapture(0)
-
-# Настройка команды ffmpeg для отправки потока
-ffmpeg_cmd = [
-    'ffmpeg',
-    '-y',
-    '-f', 'rawvideo',
-    '-vcodec', 'rawvideo',
-    '-pix_fmt', 'bgr24',
-    '-s', f"{int(cap.get(3))}x{int(cap.get(4))}",
-    '-r', '30',
-    '-i', '-',
-    '-c:v', 'libx264',
-    '-preset', 'ultrafast',
-    '-f', 'mpegts',
-    'udp://192.168.37.10:1234'
-]
-
-proc = subprocess.Popen(ffmpeg_cmd, stdin=subprocess.PIPE)
-
-while True:
-    ret, frame = cap.read()
-    if not ret:
-        break
-
-    # Отправка кадра в ffmpeg
-    proc.stdin.write(frame.tobytes())
-
-    # Дополнительная обработка (если требуется)
-    # ...
-
-    if cv2.waitKey(1) & 0xFF == ord('q'):
-        break
-
-cap.release()
-proc.stdin.close()
-proc.wait()
+    source = int(args.source) if args.source.isdigit() else args.source
+    capture = CameraCapture(source, fps=args.fps, pool_size=args.pool_size, paced=not isinstance(source, int))
+    streamer = FFmpegStreamer(capture, args.destination)
+    streamer.start()
+    try:
+        while capture.running:
+            time.sleep(5)
+            stats = streamer.stats()
+            print(f"Кадров: {stats['captured']}, отброшено: {stats['dropped']} ({stats['drop_rate']:.1%}), "
+                  f"запись {stats['avg_write_ms']:.2f} мс")
+    except KeyboardInterrupt:
+        pass
+    finally:
+        capture.stop()
+        streamer.stop()
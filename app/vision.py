@@ -0,0 +1,325 @@
+import concurrent.futures
+import multiprocessing
+import queue
+import threading
+import time
+from multiprocessing import shared_memory
+
+import cv2
+import numpy as np
+
+from latency import EXPORT_BOUNDS, LatencyHistogram
+
+# Этапы обработки кадра
+STAGE_PREPARE = 'prepare'  # уменьшение кадра и запись в разделяемую память (поток захвата)
+STAGE_QUEUE = 'queue'      # ожидание свободного процесса
+STAGE_TOTAL = 'total'      # захват кадра -> результат доступен миссии
+
+# Цвет буя по умолчанию в HSV (оранжевый)
+BUOY_LOWER_HSV = (5, 120, 120)
+BUOY_UPPER_HSV = (20, 255, 255)
+
+# Разделяемая память кадров, открытая в процессе обработки: имя -> SharedMemory
+_worker_frames = {}
+
+
+def detect_buoy(image, lower_hsv=BUOY_LOWER_HSV, upper_hsv=BUOY_UPPER_HSV, min_area=0.0005, fov=60.0):
+    """
+    Найти буй по цвету: пороговая фильтрация в HSV и наибольший связный контур.
+
+    :param image: Кадр BGR
+    :param min_area: Минимальная площадь контура в долях кадра
+    :param fov: Горизонтальный угол обзора камеры (град)
+    :return: Словарь: found, x и y центра (-1..1 от центра кадра), bearing (град, положительный - вправо),
+             area (доля кадра), radius (доля ширины кадра)
+    """
+    height, width = image.shape[:2]
+    hsv = cv2.cvtColor(image, cv2.COLOR_BGR2HSV)
+    mask = cv2.inRange(hsv, np.array(lower_hsv, np.uint8), np.array(upper_hsv, np.uint8))
+    mask = cv2.morphologyEx(mask, cv2.MORPH_OPEN, np.ones((3, 3), np.uint8))
+    contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    if not contours:
+        return {'found': False}
+    contour = max(contours, key=cv2.contourArea)
+    area = cv2.contourArea(contour) / (width * height)
+    if area < min_area:
+        return {'found': False}
+    (cx, cy), radius = cv2.minEnclosingCircle(contour)
+    x = cx / width * 2.0 - 1.0
+    return {
+        'found': True,
+        'x': x,
+        'y': cy / height * 2.0 - 1.0,
+        'bearing': x * fov / 2.0,
+        'area': area,
+        'radius': radius / width,
+    }
+
+
+def _process_frame(shm_name, shape, detectors, submitted_at):
+    """
+    Выполнить детекторы над кадром в разделяемой памяти (в процессе пула).
+
+    :return: (результаты {имя: словарь}, время выполнения детекторов {имя: секунды}, время ожидания в очереди)
+    """
+    started_at = time.monotonic()
+    shm = _worker_frames.get(shm_name)
+    if shm is None:
+        shm = shared_memory.SharedMemory(name=shm_name)
+        _worker_frames[shm_name] = shm
+    image = np.ndarray(shape, np.uint8, buffer=shm.buf)
+    results = {}
+    timings = {}
+    for name, function, params in detectors:
+        start = time.perf_counter()
+        try:
+            results[name] = function(image, **params)
+        except Exception as e:
+            results[name] = {'found': False, 'error': f'{type(e).__name__}: {e}'}
+        timings[name] = time.perf_counter() - start
+    return results, timings, started_at - submitted_at
+
+
+class VisionResult:
+    """
+    Результат обработки одного кадра.
+    """
+    __slots__ = ('sequence', 'captured_at', 'completed_at', 'detections')
+
+    def __init__(self, sequence, captured_at, completed_at, detections):
+        self.sequence = sequence
+        self.captured_at = captured_at    # Время захвата кадра по time.monotonic()
+        self.completed_at = completed_at  # Время готовности результата по time.monotonic()
+        self.detections = detections      # {имя детектора: словарь результата}
+
+    @property
+    def age(self):
+        return time.monotonic() - self.captured_at
+
+    def as_dict(self):
+        return {
+            'sequence': self.sequence,
+            'age_ms': self.age * 1000.0,
+            'latency_ms': (self.completed_at - self.captured_at) * 1000.0,
+            'detections': self.detections,
+        }
+
+
+class VisionStage:
+    """
+    Обработка кадров камеры детекторами в пуле процессов.
+
+    Подключается к CameraCapture как обработчик кадров. Кадр уменьшается до processing_width и копируется
+    в свободный слот разделяемой памяти, в процесс передается только имя слота. В работе не больше кадров,
+    чем процессов в пуле: если все процессы заняты, новый кадр пропускается (обрабатывается всегда
+    последний кадр, очередь не накапливается). Миссии читают последний результат через latest()
+    или ждут следующий через wait_for_result().
+    """
+
+    def __init__(self, workers=2, processing_width=320):
+        """
+        :param workers: Число процессов обработки
+        :param processing_width: Ширина кадра для детекторов (кадр уменьшается с сохранением пропорций)
+        """
+        self.workers = workers
+        self.processing_width = processing_width
+        self.detectors = []  # (имя, функция, параметры)
+        self.executor = None
+        self.capture = None
+        self.slots = []      # SharedMemory кадров
+        self.free_slots = queue.Queue()
+        self.shape = None
+        self.lock = threading.Lock()  # Защищает слоты и пул от остановки во время отправки кадра
+        self.condition = threading.Condition()
+        self.result = None
+        self.running = False
+        self.error = None  # Причина отказа пула процессов
+
+        # Статистика
+        self.submitted = 0
+        self.skipped = 0
+        self.completed = 0
+        self.histograms = {STAGE_PREPARE: LatencyHistogram(), STAGE_QUEUE: LatencyHistogram(),
+                           STAGE_TOTAL: LatencyHistogram()}
+
+    def add_detector(self, name, function, **params):
+        """
+        Добавить детектор. function(image, **params) -> dict должна быть функцией верхнего уровня модуля,
+        чтобы ее можно было передать в процесс пула.
+        """
+        self.detectors = self.detectors + [(name, function, params)]
+        if name not in self.histograms:
+            self.histograms[name] = LatencyHistogram()
+
+    def start(self, capture):
+        """
+        Запустить пул процессов и подключиться к захвату кадров. capture должен быть открыт (известен размер кадра).
+        """
+        if self.running:
+            return
+        height, width = capture.shape[:2]
+        scale = min(1.0, self.processing_width / width)
+        self.shape = (int(height * scale), int(width * scale), 3)
+        size = int(np.prod(self.shape))
+        self.slots = [shared_memory.SharedMemory(create=True, size=size) for _ in range(self.workers)]
+        for index in range(self.workers):
+            self.free_slots.put(index)
+        # Рабочие процессы выполняют главный модуль заново; app/main.py при импорте служб не создает (см. create_app)
+        self.executor = concurrent.futures.ProcessPoolExecutor(
+            self.workers, mp_context=multiprocessing.get_context('spawn'))
+        # Процессы запускаются заранее, а не при первом кадре в потоке захвата. Сбой запуска рабочего
+        # процесса (BrokenProcessPool) передается вызывающему, а не теряется в stderr
+        try:
+            for future in [self.executor.submit(time.sleep, 0) for _ in range(self.workers)]:
+                future.result()
+        except Exception:
+            self.executor.shutdown(wait=True, cancel_futures=True)
+            self.executor = None
+            for slot in self.slots:
+                slot.close()
+                slot.unlink()
+            self.slots = []
+            self.free_slots = queue.Queue()
+            raise
+        self.capture = capture
+        self.error = None
+        self.running = True
+        capture.add_frame_listener(self.on_frame)
+
+    def stop(self):
+        if not self.running:
+            return
+        self.capture.remove_frame_listener(self.on_frame)
+        with self.lock:
+            self.running = False
+            self.executor.shutdown(wait=True, cancel_futures=True)
+            self.executor = None
+            for slot in self.slots:
+                slot.close()
+                slot.unlink()
+            self.slots = []
+            self.free_slots = queue.Queue()
+        with self.condition:
+            self.condition.notify_all()
+
+    def on_frame(self, frame, sequence, captured_at):
+        """
+        Обработчик кадров CameraCapture (вызывается в потоке захвата).
+        """
+        if not self.running or not self.detectors:
+            return
+        with self.lock:
+            if not self.running:
+                return
+            try:
+                index = self.free_slots.get_nowait()
+            except queue.Empty:
+                self.skipped += 1
+                return
+            start = time.monotonic()
+            target = np.ndarray(self.shape, np.uint8, buffer=self.slots[index].buf)
+            if frame.shape == self.shape:
+                target[...] = frame
+            else:
+                cv2.resize(frame, (self.shape[1], self.shape[0]), dst=target, interpolation=cv2.INTER_AREA)
+            del target
+            submitted_at = time.monotonic()
+            self.histograms[STAGE_PREPARE].record(submitted_at - start)
+            try:
+                future = self.executor.submit(_process_frame, self.slots[index].name, self.shape, self.detectors,
+                                              submitted_at)
+            except concurrent.futures.BrokenExecutor as e:
+                # Рабочий процесс завершился аварийно: кадры пропускаются до перезапуска обработки
+                self.free_slots.put(index)
+                if self.error is None:
+                    print(f"Пул процессов обработки кадров остановлен: {e}")
+                    self.error = str(e)
+                return
+            self.submitted += 1
+        future.add_done_callback(lambda f: self._on_result(f, index, sequence, captured_at))
+
+    def _on_result(self, future, index, sequence, captured_at):
+        self.free_slots.put(index)
+        if future.cancelled():
+            return
+        try:
+            detections, timings, queue_time = future.result()
+        except Exception as e:
+            print(f"Ошибка обработки кадра: {e}")
+            return
+        completed_at = time.monotonic()
+        self.histograms[STAGE_QUEUE].record(queue_time)
+        for name, seconds in timings.items():
+            self.histograms[name].record(seconds)
+        self.histograms[STAGE_TOTAL].record(completed_at - captured_at)
+        with self.condition:
+            self.completed += 1
+            # Результаты могут прийти не по порядку: более старый кадр не заменяет новый
+            if self.result is None or sequence > self.result.sequence:
+                self.result = VisionResult(sequence, captured_at, completed_at, detections)
+                self.condition.notify_all()
+
+    def latest(self, name=None, max_age=None):
+        """
+        Последний результат.
+
+        :param name: Имя детектора (None - весь VisionResult)
+        :param max_age: Максимальный возраст кадра в секундах (None - любой)
+        :return: Словарь результата детектора, VisionResult или None, если результата нет или он устарел
+        """
+        result = self.result
+        if result is None or (max_age is not None and result.age > max_age):
+            return None
+        if name is None:
+            return result
+        return result.detections.get(name)
+
+    def wait_for_result(self, after_sequence=0, timeout=None, cancel_token=None):
+        """
+        Дождаться результата по кадру новее after_sequence.
+
+        :return: VisionResult или None по истечении timeout, при остановке обработки или отмене миссии
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self.condition:
+            while self.result is None or self.result.sequence <= after_sequence:
+                if not self.running or (cancel_token is not None and cancel_token.is_set()):
+                    return None
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return None
+                # Ограничиваем ожидание, чтобы проверять отмену миссии
+                self.condition.wait(0.1 if remaining is None else min(remaining, 0.1))
+            return self.result
+
+    def stats(self):
+        return {
+            'running': self.running,
+            'error': self.error,
+            'workers': self.workers,
+            'detectors': [name for name, _, _ in self.detectors],
+            'submitted': self.submitted,
+            'skipped': self.skipped,
+            'completed': self.completed,
+            'stages': {stage: histogram.summary() for stage, histogram in self.histograms.items()},
+        }
+
+    def prometheus(self, prefix='roboboat'):
+        """
+        Гистограммы этапов обработки в текстовом формате Prometheus.
+        """
+        name = f'{prefix}_vision_stage_seconds'
+        lines = [
+            f'# HELP {name} Время этапов обработки кадра (детекторы - по имени)',
+            f'# TYPE {name} histogram',
+        ]
+        for stage, histogram in self.histograms.items():
+            for bound, count in zip(EXPORT_BOUNDS, histogram.cumulative()):
+                lines.append(f'{name}_bucket{{stage="{stage}",le="{bound:g}"}} {count}')
+            lines.append(f'{name}_bucket{{stage="{stage}",le="+Inf"}} {histogram.count}')
+            lines.append(f'{name}_sum{{stage="{stage}"}} {histogram.total:.9f}')
+            lines.append(f'{name}_count{{stage="{stage}"}} {histogram.count}')
+        lines.append(f'# HELP {prefix}_vision_frames_skipped_total Кадры, пропущенные из-за занятости пула')
+        lines.append(f'# TYPE {prefix}_vision_frames_skipped_total counter')
+        lines.append(f'{prefix}_vision_frames_skipped_total {self.skipped}')
+        return '\n'.join(lines) + '\n'
@@ -0,0 +1,356 @@
+import asyncio
+import collections
+import fractions
+import threading
+import time
+
+import cv2
+from aiortc import RTCPeerConnection, RTCSessionDescription, VideoStreamTrack
+from av import VideoFrame
+
+from latency import LatencyHistogram
+from video import CameraCapture
+
+# Частота часов RTP для видео
+VIDEO_CLOCK_RATE = 90000
+VIDEO_TIME_BASE = fractions.Fraction(1, VIDEO_CLOCK_RATE)
+
+# Ступени качества: максимальная высота кадра (None - исходное разрешение)
+QUALITY_LEVELS = (None, 540, 360, 240)
+
+# Пороги адаптации по отчетам RTCP получателя
+LOSS_DEGRADE = 0.05    # Доля потерь, при которой качество понижается
+RTT_DEGRADE = 0.25     # RTT (с), при котором качество понижается
+LOSS_UPGRADE = 0.01    # Доля потерь, ниже которой качество можно повысить
+RTT_UPGRADE = 0.1      # RTT (с), ниже которого качество можно повысить
+UPGRADE_INTERVALS = 3  # Число подряд идущих хороших интервалов перед повышением качества
+
+# Метка номера кадра для измерения задержки: ряд клеток в верхнем левом углу, клетка - один бит
+COUNTER_BITS = 24
+COUNTER_CELL = 16
+
+
+def stamp_counter(image, value, bits=COUNTER_BITS, cell=COUNTER_CELL):
+    """
+    Нанести номер кадра на изображение в виде ряда черных (0) и белых (1) клеток.
+    """
+    for bit in range(bits):
+        image[:cell, bit * cell:(bit + 1) * cell] = 255 if (value >> bit) & 1 else 0
+
+
+def read_counter(image, bits=COUNTER_BITS, cell=COUNTER_CELL):
+    """
+    Прочитать номер кадра, нанесенный stamp_counter. Клетки читаются по центру, поэтому метка
+    переживает сжатие и масштабирование кадра (cell - размер клетки в пикселях принятого кадра).
+    """
+    gray = image if image.ndim == 2 else image.mean(axis=2)
+    y = int(cell / 2)
+    value = 0
+    for bit in range(bits):
+        if gray[y, int((bit + 0.5) * cell)] > 127:
+            value |= 1 << bit
+    return value
+
+
+class SharedCamera:
+    """
+    Общий захват камеры для всех видеодорожек WebRTC.
+
+    Камера открывается при появлении первого подписчика и закрывается после ухода последнего.
+    Дорожки получают только последний кадр (без очереди), поэтому медленный получатель пропускает кадры,
+    а не накапливает задержку. Преобразование в VideoFrame выполняется один раз на кадр и размер.
+    """
+
+    def __init__(self, source=0, width=None, height=None, fps=30.0, latency_mode=False):
+        """
+        :param source: Номер камеры, путь к видеофайлу или 'synthetic'
+        :param latency_mode: Наносить номер кадра на каждый кадр (режим измерения задержки)
+        """
+        paced = not isinstance(source, int)
+        self.capture = CameraCapture(source, width, height, fps, pool_size=2, paced=paced, loop=paced,
+                                     queue_frames=False)
+        self.capture.add_frame_listener(self._on_frame)
+        self.stamp_frames = latency_mode
+        self.subscribers = 0
+        self.lock = threading.Lock()
+        self.loop = None
+        self.changed = None
+        self.latest = None  # (номер кадра, время захвата, изображение)
+        self.started_at = None
+        self.stamp_times = {}  # номер кадра -> время захвата (для режима измерения задержки)
+        self.stamp_order = collections.deque()
+        self.converted = {}    # (номер кадра, высота) -> VideoFrame последнего кадра
+
+    def subscribe(self):
+        """
+        Добавить подписчика; первый подписчик открывает камеру. Вызов блокирующий.
+        Если камеру открыть не удалось, исключение передается вызывающему, а подписчик не добавляется.
+        """
+        with self.lock:
+            if self.subscribers == 0:
+                self.capture.start()
+                if self.started_at is None:
+                    self.started_at = time.monotonic()
+            self.subscribers += 1
+
+    def unsubscribe(self):
+        """
+        Убрать подписчика; после ухода последнего камера закрывается. Вызов блокирующий.
+        """
+        with self.lock:
+            self.subscribers = max(0, self.subscribers - 1)
+            if self.subscribers == 0 and self.capture.running:
+                self.capture.stop()
+                self.latest = None
+
+    def bind_loop(self, loop):
+        self.loop = loop
+        self.changed = asyncio.Event()
+
+    def _on_frame(self, buffer, sequence, captured_at):
+        # Буфер пула используется повторно, поэтому последний кадр хранится копией
+        image = buffer.copy()
+        if self.stamp_frames:
+            stamp_counter(image, sequence)
+            self._remember_stamp(sequence, captured_at)
+        self.latest = (sequence, captured_at, image)
+        if self.loop is not None:
+            self.loop.call_soon_threadsafe(self._wake)
+
+    def _remember_stamp(self, sequence, captured_at):
+        if sequence in self.stamp_times:
+            return
+        self.stamp_times[sequence] = captured_at
+        self.stamp_order.append(sequence)
+        while len(self.stamp_order) > 1024:
+            self.stamp_times.pop(self.stamp_order.popleft(), None)
+
+    def _wake(self):
+        changed, self.changed = self.changed, asyncio.Event()
+        changed.set()
+
+    async def next_frame(self, last_sequence):
+        """
+        Дождаться кадра новее last_sequence.
+
+        :return: (номер кадра, время захвата, изображение)
+        """
+        while self.latest is None or self.latest[0] <= last_sequence:
+            await self.changed.wait()
+        return self.latest
+
+    def video_frame(self, latest, max_height=None, stamp=False):
+        """
+        VideoFrame для кадра latest, уменьшенного до высоты max_height (None - исходный размер).
+
+        :param stamp: Нанести номер кадра на копию изображения (дорожка измерения задержки);
+            кадры остальных дорожек остаются без метки
+        """
+        sequence, captured_at, image = latest
+        stamp = stamp and not self.stamp_frames
+        key = (sequence, max_height, stamp)
+        frame = self.converted.get(key)
+        if frame is not None:
+            return frame
+        if self.converted and next(iter(self.converted))[0] != sequence:
+            self.converted.clear()
+        if stamp:
+            image = image.copy()
+            stamp_counter(image, sequence)
+            self._remember_stamp(sequence, captured_at)
+        if max_height is not None and image.shape[0] > max_height:
+            scale = max_height / image.shape[0]
+            # Ширина и высота кадра для кодека должны быть четными
+            size = (int(image.shape[1] * scale) & ~1, max_height & ~1)
+            image = cv2.resize(image, size, interpolation=cv2.INTER_AREA)
+        frame = VideoFrame.from_ndarray(image, format='bgr24')
+        frame.pts = int((captured_at - self.started_at) * VIDEO_CLOCK_RATE)
+        frame.time_base = VIDEO_TIME_BASE
+        self.converted[key] = frame
+        return frame
+
+
+class CameraTrack(VideoStreamTrack):
+    """
+    Видеодорожка WebRTC из общего захвата SharedCamera. Всегда отдает самый свежий кадр.
+    """
+
+    def __init__(self, camera, stamp=False):
+        """
+        :param stamp: Наносить номер кадра на кадры этой дорожки (измерение задержки)
+        """
+        super().__init__()
+        self.camera = camera
+        self.stamp = stamp
+        self.last_sequence = 0
+        self.max_height = None
+        self.frames_sent = 0
+        self.frames_skipped = 0
+
+    async def recv(self):
+        latest = await self.camera.next_frame(self.last_sequence)
+        if self.last_sequence:
+            self.frames_skipped += latest[0] - self.last_sequence - 1
+        self.last_sequence = latest[0]
+        self.frames_sent += 1
+        return self.camera.video_frame(latest, self.max_height, self.stamp)
+
+
+class VideoPeer:
+    """
+    Соединение WebRTC с оператором и адаптация разрешения по отчетам RTCP получателя.
+
+    Битрейт кодека aiortc подстраивает сам по оценке REMB получателя; здесь при потерях или большом RTT
+    понижается разрешение, а после нескольких хороших интервалов - повышается.
+    """
+
+    def __init__(self, camera, adapt_interval=2.0):
+        self.camera = camera
+        self.adapt_interval = adapt_interval
+        self.pc = RTCPeerConnection()
+        self.track = CameraTrack(camera)
+        self.sender = self.pc.addTrack(self.track)
+        self.quality = 0
+        self.good_intervals = 0
+        self.last_loss = 0.0
+        self.last_rtt = None
+        self.adapt_task = None
+
+    async def adapt(self):
+        while True:
+            await asyncio.sleep(self.adapt_interval)
+            report = await self.sender.getStats()
+            for stats in report.values():
+                if stats.type != 'remote-inbound-rtp':
+                    continue
+                self.last_loss = stats.fractionLost or 0.0
+                self.last_rtt = stats.roundTripTime
+                rtt = self.last_rtt or 0.0
+                if self.last_loss > LOSS_DEGRADE or rtt > RTT_DEGRADE:
+                    self.good_intervals = 0
+                    self.set_quality(self.quality + 1)
+                elif self.last_loss < LOSS_UPGRADE and rtt < RTT_UPGRADE:
+                    self.good_intervals += 1
+                    if self.good_intervals >= UPGRADE_INTERVALS:
+                        self.good_intervals = 0
+                        self.set_quality(self.quality - 1)
+                else:
+                    self.good_intervals = 0
+
+    def set_quality(self, level):
+        self.quality = max(0, min(len(QUALITY_LEVELS) - 1, level))
+        self.track.max_height = QUALITY_LEVELS[self.quality]
+
+    def stats(self):
+        return {
+            'state': self.pc.connectionState,
+            'max_height': self.track.max_height,
+            'frames_sent': self.track.frames_sent,
+            'frames_skipped': self.track.frames_skipped,
+            'fraction_lost': self.last_loss,
+            'rtt_ms': self.last_rtt * 1000.0 if self.last_rtt is not None else None,
+        }
+
+
+class VideoService:
+    """
+    Видеосервис приложения: общий захват камеры, соединения WebRTC с операторами и измерение задержки.
+    """
+
+    def __init__(self, source=0, width=None, height=None, fps=30.0, latency_mode=False):
+        self.camera = SharedCamera(source, width, height, fps, latency_mode)
+        self.peers = set()
+
+    def bind_loop(self, loop):
+        self.camera.bind_loop(loop)
+
+    async def offer(self, sdp, sdp_type):
+        """
+        Принять предложение SDP оператора и вернуть ответ.
+        """
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, self.camera.subscribe)
+        peer = VideoPeer(self.camera)
+        self.peers.add(peer)
+
+        @peer.pc.on('connectionstatechange')
+        async def on_connectionstatechange():
+            if peer.pc.connectionState in ('failed', 'closed'):
+                await self._close_peer(peer)
+
+        try:
+            await peer.pc.setRemoteDescription(RTCSessionDescription(sdp=sdp, type=sdp_type))
+            await peer.pc.setLocalDescription(await peer.pc.createAnswer())
+        except Exception:
+            await self._close_peer(peer)
+            raise
+        peer.adapt_task = asyncio.create_task(peer.adapt())
+        return peer.pc.localDescription
+
+    async def _close_peer(self, peer):
+        if peer not in self.peers:
+            return
+        self.peers.discard(peer)
+        if peer.adapt_task is not None:
+            peer.adapt_task.cancel()
+        await peer.pc.close()
+        await asyncio.get_running_loop().run_in_executor(None, self.camera.unsubscribe)
+
+    async def close(self):
+        for peer in list(self.peers):
+            await self._close_peer(peer)
+
+    async def measure_latency(self, duration=5.0):
+        """
+        Измерить задержку от захвата кадра до его декодирования получателем WebRTC.
+
+        Кадры с нанесенным номером передаются через локальное соединение WebRTC (кодирование, RTP,
+        декодирование) и сопоставляются со временем захвата по одним часам. Для воспроизводимых
+        измерений используется файловый или синтетический источник.
+
+        :return: Сводка LatencyHistogram (мс) и число принятых и нераспознанных кадров
+        """
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, self.camera.subscribe)
+        sender_pc = RTCPeerConnection()
+        receiver_pc = RTCPeerConnection()
+        # Номер наносится только на кадры измерительной дорожки, операторы получают кадры без метки
+        sender_pc.addTrack(CameraTrack(self.camera, stamp=True))
+        remote_track = loop.create_future()
+        receiver_pc.on('track', lambda track: remote_track.done() or remote_track.set_result(track))
+
+        histogram = LatencyHistogram()
+        unknown = 0
+        try:
+            await sender_pc.setLocalDescription(await sender_pc.createOffer())
+            await receiver_pc.setRemoteDescription(sender_pc.localDescription)
+            await receiver_pc.setLocalDescription(await receiver_pc.createAnswer())
+            await sender_pc.setRemoteDescription(receiver_pc.localDescription)
+            track = await asyncio.wait_for(remote_track, 10.0)
+
+            source_width = self.camera.capture.shape[1]
+            deadline = loop.time() + duration
+            while loop.time() < deadline:
+                frame = await asyncio.wait_for(track.recv(), 5.0)
+                received_at = time.monotonic()
+                image = frame.to_ndarray(format='bgr24')
+                sequence = read_counter(image, cell=COUNTER_CELL * image.shape[1] / source_width)
+                captured_at = self.camera.stamp_times.get(sequence)
+                if captured_at is None:
+                    unknown += 1
+                    continue
+                histogram.record(received_at - captured_at)
+        finally:
+            await sender_pc.close()
+            await receiver_pc.close()
+            await loop.run_in_executor(None, self.camera.unsubscribe)
+
+        result = histogram.summary()
+        result['unrecognized'] = unknown
+        return result
+
+    def stats(self):
+        result = self.camera.capture.stats()
+        result['subscribers'] = self.camera.subscribers
+        result['peers'] = [peer.stats() for peer in self.peers]
+        return result
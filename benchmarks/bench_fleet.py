@@ -0,0 +1,120 @@
+"""
+Бенчмарк флота: FleetManager с десятками имитаторов лодок на одном сокете.
+
+Имитаторы (модели simulator.BoatSimulator, по сокету на лодку) работают в отдельном процессе в одном потоке
+с selectors. Менеджер в этом процессе переводит все лодки в режим стабилизации с разными целевыми курсами,
+поэтому сходимость курсов проверяет маршрутизацию телеметрии и команд по адресам. Печатает загрузку
+процессора менеджера, число кадров в секунду и долю лодок, вышедших на заданный курс.
+
+Запуск: python benchmarks/bench_fleet.py [--boats 48] [--rate 50] [--duration 10]
+"""
+import argparse
+import asyncio
+import multiprocessing
+import os
+import selectors
+import socket
+import sys
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, os.path.join(ROOT, 'app'))
+
+from fleet import FleetManager  # noqa: E402
+from simulator import BoatSimulator, angle_difference  # noqa: E402
+
+BASE_PORT = 5300
+MANAGER_PORT = 5299
+
+
+def run_simulators(boats, rate, duration, manager_port):
+    """
+    Имитаторы boats лодок в одном потоке: прием команд через selectors, телеметрия с частотой rate.
+    """
+    selector = selectors.DefaultSelector()
+    models = []
+    for index in range(boats):
+        model = BoatSimulator(BASE_PORT + index, manager_port, rate, initial_yaw=0.0)
+        model.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        model.socket.bind(('127.0.0.1', model.listen_port))
+        model.socket.setblocking(False)
+        selector.register(model.socket, selectors.EVENT_READ, model)
+        models.append(model)
+
+    period = 1.0 / rate
+    last = time.monotonic()
+    deadline = last + period
+    end = last + duration
+    while last < end:
+        for key, _ in selector.select(max(0.0, deadline - time.monotonic())):
+            model = key.data
+            try:
+                while True:
+                    data, addr = model.socket.recvfrom(1024)
+                    model.controller_address = (addr[0], model.telemetry_port)
+                    model.handle_command(data)
+            except BlockingIOError:
+                pass
+        now = time.monotonic()
+        if now < deadline:
+            continue
+        for model in models:
+            model.step(now - last)
+            if model.controller_address is not None:
+                model.socket.sendto(model.telemetry_packet(), model.controller_address)
+        last = now
+        deadline += period
+        if now - deadline > period:
+            deadline = now + period
+    for model in models:
+        model.socket.close()
+
+
+async def run(boats=48, rate=50.0, duration=10.0, heartbeat_interval=0.1):
+    simulators = multiprocessing.Process(target=run_simulators, args=(boats, rate, duration + 2.0, MANAGER_PORT))
+    simulators.start()
+    fleet = FleetManager(local_port=MANAGER_PORT, heartbeat_interval=heartbeat_interval, capacity=4)
+    handles = [fleet.add_boat(f'boat{index}', '127.0.0.1', BASE_PORT + index) for index in range(boats)]
+    try:
+        await asyncio.sleep(0.5)  # Запуск имитаторов
+        await fleet.start()
+        for index, boat in enumerate(handles):
+            boat.send_mode_command(1)
+            boat.set_target_heading(-170.0 + 340.0 * index / max(1, boats - 1))
+            boat.send_movement_command(10.0, 0.0, 0.0)
+
+        start_cpu = time.process_time()
+        start = time.monotonic()
+        frames = fleet.stats()['telemetry_count']
+        await asyncio.sleep(duration)
+        elapsed = time.monotonic() - start
+        cpu = time.process_time() - start_cpu
+        stats = fleet.stats()
+        converged = sum(abs(angle_difference(boat.get_current_yaw(), boat.target_heading)) < 5.0 for boat in handles)
+    finally:
+        await fleet.close()
+        simulators.join()
+
+    result = {
+        'boats': boats,
+        'online': stats['online'],
+        'converged': converged,
+        'telemetry_fps': (stats['telemetry_count'] - frames) / elapsed,
+        'cpu_percent': cpu / elapsed * 100.0,
+        'heartbeat_ticks_per_s': stats['heartbeat_ticks'] / elapsed,
+        'unrouted': stats['unrouted'],
+    }
+    print(f"лодок: {boats}, на связи: {result['online']}, на заданном курсе: {converged}")
+    print(f"телеметрия: {result['telemetry_fps']:.0f} кадров/с (ожидается {boats * rate:.0f}), "
+          f"CPU менеджера: {result['cpu_percent']:.1f} %, тактов повтора: {result['heartbeat_ticks_per_s']:.1f}/с, "
+          f"без маршрута: {result['unrouted']}")
+    return result
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Бенчмарк флота лодок на одном сокете')
+    parser.add_argument('--boats', type=int, default=48, help='Число лодок')
+    parser.add_argument('--rate', type=float, default=50.0, help='Частота телеметрии каждой лодки в Гц')
+    parser.add_argument('--duration', type=float, default=10.0, help='Длительность измерения в секундах')
+    args = parser.parse_args()
+    asyncio.run(run(args.boats, args.rate, args.duration))
@@ -0,0 +1,65 @@
+"""
+Бенчмарк сходимости курса в замкнутом контуре с имитатором ESP32.
+
+Запускает BoatSimulator на localhost, переводит лодку в режим стабилизации и измеряет время,
+за которое курс входит в допуск после смены целевого курса.
+
+Запуск: python benchmarks/bench_heading_convergence.py [--rate 200] [--tolerance 2]
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'app'))
+
+from boat_controller import BoatController  # noqa: E402
+from simulator import BoatSimulator, angle_difference  # noqa: E402
+
+COMMAND_PORT = 5905
+TELEMETRY_PORT = 5906
+
+
+def converge(controller, target, tolerance, timeout):
+    """
+    Установить целевой курс и дождаться входа в допуск.
+
+    :return: Время сходимости в секундах или None при превышении timeout
+    """
+    controller.set_target_heading(target)
+    controller.send_movement_command(0.0, 0.0, 0.0)
+    start = time.monotonic()
+    while time.monotonic() - start < timeout:
+        if abs(angle_difference(controller.get_current_yaw(), target)) <= tolerance:
+            return time.monotonic() - start
+        time.sleep(0.001)
+    return None
+
+
+def run(rate=200.0, tolerance=2.0, timeout=15.0, targets=(90.0, -90.0, 45.0, 180.0, 0.0)):
+    simulator = BoatSimulator(COMMAND_PORT, TELEMETRY_PORT, telemetry_rate=rate)
+    simulator.start()
+    controller = BoatController('127.0.0.1', COMMAND_PORT, TELEMETRY_PORT)
+    controller.start()
+    results = []
+    try:
+        controller.send_mode_command(1)
+        time.sleep(0.2)
+        for target in targets:
+            seconds = converge(controller, target, tolerance, timeout)
+            results.append({'target': target, 'seconds': seconds})
+            label = f'{seconds:.3f} с' if seconds is not None else 'не сошелся'
+            print(f'курс {target:7.1f}: {label}')
+    finally:
+        controller.close()
+        simulator.stop()
+    print(simulator.stats())
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rate', type=float, default=200.0, help='Частота телеметрии имитатора в Гц')
+    parser.add_argument('--tolerance', type=float, default=2.0, help='Допуск по курсу в градусах')
+    args = parser.parse_args()
+    run(args.rate, args.tolerance)
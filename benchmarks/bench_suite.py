@@ -0,0 +1,531 @@
+"""
+Набор бенчмарков горячих путей управления, телеметрии и миссий с результатами в JSON.
+
+Все измерения выполняются локально: вместо ESP32 используется имитатор app/simulator.py, приложение
+запускается отдельным процессом (app/main.py) на свободных портах с временными каталогами миссий и записей.
+
+Бенчмарки:
+    struct_pack        - упаковка пакета каждого типа команды (struct.pack, как в BoatController)
+    telemetry_parse    - BoatController._parse_telemetry_packet и полный прием _handle_telemetry_datagram
+    telemetry_contention - get_telemetry() из N потоков при приеме телеметрии 1 кГц
+    websocket_fanout   - /telemetry для N клиентов: кадры в секунду и задержка доставки
+    control_ingest     - /control: принятые, объединенные и переданные контроллеру уставки в секунду
+    mission_stop       - задержка /stop_mission для миссии в потоке, асинхронной и в отдельном процессе
+
+Результаты пишутся в benchmarks/results/suite-<время>.json (или --output) вместе с версией Python,
+платформой и коммитом. --compare сравнивает числовые результаты с предыдущим файлом.
+
+Запуск: python benchmarks/bench_suite.py [--only struct_pack,websocket_fanout] [--quick] [--compare old.json]
+"""
+import argparse
+import asyncio
+import datetime
+import json
+import os
+import platform
+import struct
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import timeit
+import urllib.error
+import urllib.request
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, os.path.join(ROOT, 'app'))
+
+from boat_controller import (  # noqa: E402
+    CMD_GPIO, CMD_LED, CMD_MODE, CMD_MOVE, CMD_PID, CMD_PROBE_CONTROL, CMD_TELEMETRY, GPIO_CMD_STRUCT,
+    LED_CMD_STRUCT, MODE_CMD_STRUCT, MOVE_CMD_STRUCT, PID_CMD_STRUCT, PROBE_CONTROL_STRUCT, TELEMETRY_STRUCT,
+    BoatController,
+)
+from telemetry_hub import BINARY_TELEMETRY_STRUCT  # noqa: E402
+
+RESULTS_FOLDER = os.path.join(ROOT, 'benchmarks', 'results')
+SIMULATOR_PATH = os.path.join(ROOT, 'app', 'simulator.py')
+MAIN_PATH = os.path.join(ROOT, 'app', 'main.py')
+
+# Порты: имитатор ESP32, телеметрия приложения, HTTP приложения, сокет контроллера внутрипроцессных тестов
+BASE_PORT = 5930
+
+PACKET = struct.pack(TELEMETRY_STRUCT, CMD_TELEMETRY, 1.0, 2.0, 3.0, 1714.0, 1500.0, 1500.0, 1500.0, 1500.0,
+                     3.0, 0.0, 0.3)
+
+COMMANDS = {
+    'move': (MOVE_CMD_STRUCT, (CMD_MOVE, 20.0, -5.0, 45.0)),
+    'pid': (PID_CMD_STRUCT, (CMD_PID, 3.0, 0.0, 0.3)),
+    'led': (LED_CMD_STRUCT, (CMD_LED, 1, 255, 128, 0)),
+    'gpio': (GPIO_CMD_STRUCT, (CMD_GPIO, 1)),
+    'mode': (MODE_CMD_STRUCT, (CMD_MODE, 1)),
+    'probe': (PROBE_CONTROL_STRUCT, (CMD_PROBE_CONTROL, 1, 10)),
+}
+
+# Миссии для измерения задержки остановки: цикл управления 50 Гц до отмены
+THREAD_MISSION = '''
+from mission_runtime import MissionCancelled, PeriodicTimer
+
+
+class Mission:
+    def __init__(self, boat_controller, mission_stop, log_mission_output):
+        self.boat_controller = boat_controller
+        self.mission_stop = mission_stop
+        self.log_mission_output = log_mission_output
+
+    def run(self):
+        self.log_mission_output('running')
+        timer = PeriodicTimer(0.02, self.mission_stop)
+        try:
+            while True:
+                self.boat_controller.send_movement_command(10.0, 0.0, 0.0)
+                timer.wait()
+        except MissionCancelled:
+            pass
+        finally:
+            acknowledge = getattr(self.mission_stop, 'acknowledge', None)
+            if acknowledge is not None:
+                acknowledge()
+'''
+
+ASYNC_MISSION = '''
+from mission_runtime import AsyncMission
+
+
+class Mission(AsyncMission):
+    async def _run(self):
+        self.log_mission_output('running')
+        async for _ in self.ticks(period=0.02):
+            self.boat_controller.send_movement_command(10.0, 0.0, 0.0)
+'''
+
+
+def percentiles(samples, scale=1000.0):
+    """
+    p50, p99 и максимум выборки (по умолчанию секунды переводятся в миллисекунды).
+    """
+    if not samples:
+        return {'count': 0, 'p50': None, 'p99': None, 'max': None}
+    ordered = sorted(samples)
+    count = len(ordered)
+    return {
+        'count': count,
+        'p50': ordered[count // 2] * scale,
+        'p99': ordered[min(count - 1, int(count * 0.99))] * scale,
+        'max': ordered[-1] * scale,
+    }
+
+
+def best(statement, number, namespace):
+    """
+    Лучшее время одного выполнения statement (секунды) из пяти повторов.
+    """
+    return min(timeit.repeat(statement, number=number, repeat=5, globals=namespace)) / number
+
+
+def bench_struct_pack(options):
+    results = {}
+    for name, (fmt, args) in COMMANDS.items():
+        namespace = {'pack': struct.pack, 'fmt': fmt, 'args': args, 'compiled': struct.Struct(fmt)}
+        results[name] = {
+            'pack_ns': best('pack(fmt, *args)', options.number, namespace) * 1e9,
+            'precompiled_ns': best('compiled.pack(*args)', options.number, namespace) * 1e9,
+        }
+    return results
+
+
+def bench_telemetry_parse(options):
+    controller = BoatController('127.0.0.1', BASE_PORT, BASE_PORT + 3)
+    try:
+        namespace = {'controller': controller, 'packet': PACKET}
+        parse = best('controller._parse_telemetry_packet(packet)', options.number, namespace)
+        handle = best('controller._handle_telemetry_datagram(packet)', options.number, namespace)
+    finally:
+        controller.close()
+    return {
+        'parse_ns': parse * 1e9,
+        'parse_per_s': 1.0 / parse,
+        'handle_ns': handle * 1e9,
+        'handle_per_s': 1.0 / handle,
+    }
+
+
+def bench_telemetry_contention(options, telemetry_rate=1000.0):
+    """
+    Читатели вызывают get_telemetry() в цикле, пока писатель принимает пакеты с частотой telemetry_rate.
+    """
+    results = {}
+    controller = BoatController('127.0.0.1', BASE_PORT, BASE_PORT + 3)
+    try:
+        for readers in options.readers:
+            running = True
+            reads = [0] * readers
+            handle_times = []
+
+            def reader(slot):
+                count = 0
+                while running:
+                    controller.get_telemetry().yaw
+                    count += 1
+                reads[slot] = count
+
+            def writer():
+                period = 1.0 / telemetry_rate
+                deadline = time.monotonic()
+                while running:
+                    start = time.perf_counter()
+                    controller._handle_telemetry_datagram(PACKET)
+                    handle_times.append(time.perf_counter() - start)
+                    deadline += period
+                    delay = deadline - time.monotonic()
+                    if delay > 0:
+                        time.sleep(delay)
+
+            threads = [threading.Thread(target=reader, args=(slot,)) for slot in range(readers)]
+            threads.append(threading.Thread(target=writer))
+            start = time.monotonic()
+            for thread in threads:
+                thread.start()
+            time.sleep(options.duration)
+            running = False
+            for thread in threads:
+                thread.join()
+            elapsed = time.monotonic() - start
+            results[str(readers)] = {
+                'reads_per_s': sum(reads) / elapsed,
+                'telemetry_per_s': len(handle_times) / elapsed,
+                'handle_ms': percentiles(handle_times),
+            }
+    finally:
+        controller.close()
+    return results
+
+
+class AppServer:
+    """
+    Приложение (app/main.py) и имитатор ESP32 в отдельных процессах на локальных портах.
+    """
+
+    def __init__(self, telemetry_rate, base_port=BASE_PORT):
+        self.telemetry_rate = telemetry_rate
+        self.simulator_port = base_port
+        self.telemetry_port = base_port + 1
+        self.http_port = base_port + 2
+        self.folder = tempfile.TemporaryDirectory(prefix='roboboat-bench-')
+        self.mission_folder = os.path.join(self.folder.name, 'missions')
+        os.makedirs(self.mission_folder)
+        for name, source in (('bench_thread', THREAD_MISSION), ('bench_async', ASYNC_MISSION)):
+            with open(os.path.join(self.mission_folder, name + '.py'), 'w') as f:
+                f.write(source)
+        self.simulator = None
+        self.app = None
+        # stderr приложения пишется в файл (а не в канал, который может переполниться) для сообщения об ошибке запуска
+        self.app_log_path = os.path.join(self.folder.name, 'app.log')
+        self.app_log = None
+        self.app_log_tail = ''
+
+    def __enter__(self):
+        self.simulator = subprocess.Popen(
+            [sys.executable, SIMULATOR_PATH, '--listen-port', str(self.simulator_port),
+             '--telemetry-port', str(self.telemetry_port), '--rate', str(self.telemetry_rate)],
+            stdout=subprocess.DEVNULL)
+        env = dict(os.environ,
+                   ROBOBOAT_ESP32_IP='127.0.0.1',
+                   ROBOBOAT_ESP32_PORT=str(self.simulator_port),
+                   ROBOBOAT_LOCAL_PORT=str(self.telemetry_port),
+                   ROBOBOAT_HTTP_HOST='127.0.0.1',
+                   ROBOBOAT_HTTP_PORT=str(self.http_port),
+                   ROBOBOAT_MISSION_FOLDER=self.mission_folder,
+                   ROBOBOAT_RECORDINGS_FOLDER=os.path.join(self.folder.name, 'recordings'),
+                   ROBOBOAT_VIDEO_SOURCE='synthetic',
+                   ROBOBOAT_STARTUP_BENCHMARK='false')
+        self.app_log = open(self.app_log_path, 'wb')
+        self.app = subprocess.Popen([sys.executable, MAIN_PATH], cwd=ROOT, env=env,
+                                    stdout=subprocess.DEVNULL, stderr=self.app_log)
+        deadline = time.monotonic() + 30.0
+        while True:
+            try:
+                self.request('GET', '/missions')
+                break
+            except OSError:
+                if self.app.poll() is not None or time.monotonic() > deadline:
+                    self.__exit__(None, None, None)
+                    raise RuntimeError(f'Приложение не запустилось (код {self.app.returncode}):\n{self.app_log_tail}')
+                time.sleep(0.2)
+        time.sleep(0.5)  # Первые кадры телеметрии
+        return self
+
+    def __exit__(self, *exc):
+        for process in (self.app, self.simulator):
+            if process is not None and process.poll() is None:
+                process.terminate()
+                try:
+                    process.wait(10)
+                except subprocess.TimeoutExpired:
+                    process.kill()
+        if self.app_log is not None:
+            self.app_log.close()
+            self.app_log_tail = self.read_app_log_tail()
+        self.folder.cleanup()
+
+    def read_app_log_tail(self, lines=20):
+        """
+        Последние строки stderr приложения.
+        """
+        try:
+            with open(self.app_log_path, 'rb') as f:
+                return b''.join(f.readlines()[-lines:]).decode(errors='replace')
+        except OSError:
+            return ''
+
+    def request(self, method, path):
+        """
+        HTTP запрос к приложению.
+
+        :return: (ответ JSON, время запроса в секундах)
+        """
+        request = urllib.request.Request(f'http://127.0.0.1:{self.http_port}{path}', method=method)
+        start = time.perf_counter()
+        try:
+            with urllib.request.urlopen(request, timeout=10) as response:
+                body = response.read()
+        except urllib.error.HTTPError as e:
+            body = e.read()
+        return json.loads(body), time.perf_counter() - start
+
+    def url(self, path):
+        return f'ws://127.0.0.1:{self.http_port}{path}'
+
+
+async def _fanout(server, clients, duration):
+    from websockets.asyncio.client import connect
+
+    sockets = [await connect(server.url('/telemetry?encoding=binary')) for _ in range(clients)]
+    for websocket in sockets:
+        await websocket.recv()  # Начальный кадр
+    latencies = []
+    counts = []
+    end = time.monotonic() + duration
+
+    async def receive(websocket):
+        count = 0
+        while True:
+            remaining = end - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                frame = await asyncio.wait_for(websocket.recv(), remaining)
+            except asyncio.TimeoutError:
+                break
+            # Кадр начинается со времени кодирования в хабе (time.time())
+            latencies.append(time.time() - BINARY_TELEMETRY_STRUCT.unpack_from(frame)[0])
+            count += 1
+        counts.append(count)
+
+    await asyncio.gather(*(receive(websocket) for websocket in sockets))
+    for websocket in sockets:
+        await websocket.close()
+    return {
+        'frames_per_s_per_client': sum(counts) / len(counts) / duration,
+        'min_frames_per_s': min(counts) / duration,
+        'delivery_ms': percentiles(latencies),
+    }
+
+
+def bench_websocket_fanout(options):
+    results = {}
+    with AppServer(options.telemetry_rate) as server:
+        for clients in options.clients:
+            result = asyncio.run(_fanout(server, clients, options.duration))
+            result['telemetry_hz'] = options.telemetry_rate
+            results[str(clients)] = result
+    return results
+
+
+async def _control_ingest(server, duration):
+    from websockets.asyncio.client import connect
+
+    before, _ = server.request('GET', '/control/stats')
+    async with connect(server.url('/control')) as websocket:
+        await websocket.send('lease')
+        await websocket.recv()
+        sent = 0
+        start = time.monotonic()
+        while time.monotonic() - start < duration:
+            await websocket.send(f'{sent % 100},0,0,1')
+            sent += 1
+        elapsed = time.monotonic() - start
+        await asyncio.sleep(0.5)  # Обработка сообщений, оставшихся в буферах
+        stats, _ = server.request('GET', '/control/stats')
+    client = stats['clients'][0] if stats['clients'] else {'messages': 0, 'applied': 0, 'merged': 0}
+    return {
+        'sent_per_s': sent / elapsed,
+        'received_per_s': client['messages'] / elapsed,
+        'applied_per_s': client['applied'] / elapsed,
+        'merged_per_s': client['merged'] / elapsed,
+        'clients_before': len(before['clients']),
+    }
+
+
+def bench_control_ingest(options):
+    with AppServer(options.telemetry_rate) as server:
+        return asyncio.run(_control_ingest(server, options.duration))
+
+
+async def _wait_mission_running(server, timeout=30.0):
+    """
+    Дождаться строки 'running' в выводе миссии (/mission_output).
+
+    :return: True, если миссия вошла в цикл управления до истечения timeout
+    """
+    from websockets.asyncio.client import connect
+
+    async with connect(server.url('/mission_output')) as websocket:
+        try:
+            async with asyncio.timeout(timeout):
+                while True:
+                    if json.loads(await websocket.recv()).get('message') == 'running':
+                        return True
+        except TimeoutError:
+            return False
+
+
+def bench_mission_stop(options):
+    results = {}
+    with AppServer(options.telemetry_rate) as server:
+        for name, query in (('thread', 'name=bench_thread'), ('async', 'name=bench_async'),
+                            ('process', 'name=bench_thread&isolated=true')):
+            start_times = []
+            stop_latencies = []
+            round_trips = []
+            errors = 0
+            for _ in range(options.repeats):
+                start = time.perf_counter()
+                response, _ = server.request('POST', f'/start_mission?{query}')
+                if response.get('status') != 'success' or not asyncio.run(_wait_mission_running(server)):
+                    errors += 1
+                    server.request('POST', '/stop_mission')
+                    continue
+                start_times.append(time.perf_counter() - start)
+                time.sleep(0.2)  # Несколько тактов цикла управления
+                response, elapsed = server.request('POST', '/stop_mission')
+                round_trips.append(elapsed)
+                if response.get('stop_latency_ms') is not None:
+                    stop_latencies.append(response['stop_latency_ms'])
+                if response.get('status') != 'success':
+                    errors += 1
+            results[name] = {
+                'start_ms': percentiles(start_times),
+                'stop_latency_ms': percentiles(stop_latencies, scale=1.0),
+                'request_ms': percentiles(round_trips),
+                'errors': errors,
+            }
+    return results
+
+
+BENCHMARKS = {
+    'struct_pack': bench_struct_pack,
+    'telemetry_parse': bench_telemetry_parse,
+    'telemetry_contention': bench_telemetry_contention,
+    'websocket_fanout': bench_websocket_fanout,
+    'control_ingest': bench_control_ingest,
+    'mission_stop': bench_mission_stop,
+}
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True,
+                              text=True, timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def flatten(results, prefix=''):
+    """
+    Числовые значения вложенного словаря результатов с путями вида 'websocket_fanout.10.delivery_ms.p99'.
+    """
+    flat = {}
+    for key, value in results.items():
+        path = f'{prefix}.{key}' if prefix else str(key)
+        if isinstance(value, dict):
+            flat.update(flatten(value, path))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[path] = value
+    return flat
+
+
+def compare(previous, current):
+    """
+    Напечатать отношение текущих результатов к предыдущему запуску.
+    """
+    old = flatten(previous['results'])
+    new = flatten(current['results'])
+    print(f"\nсравнение с {previous['meta'].get('timestamp')} ({previous['meta'].get('commit')}):")
+    for path in sorted(old.keys() & new.keys()):
+        if old[path]:
+            print(f'  {path:<60} {old[path]:>14.4g} -> {new[path]:>14.4g}  ({new[path] / old[path]:.2f}x)')
+
+
+def run(options):
+    report = {
+        'meta': {
+            'timestamp': datetime.datetime.now().isoformat(timespec='seconds'),
+            'commit': git_commit(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'options': {key: value for key, value in vars(options).items() if key not in ('output', 'compare')},
+        },
+        'results': {},
+    }
+    for name in options.only:
+        print(f'{name}...', flush=True)
+        start = time.monotonic()
+        try:
+            report['results'][name] = BENCHMARKS[name](options)
+        except Exception as e:
+            report['results'][name] = {'error': repr(e)}
+        print(json.dumps(report['results'][name], indent=2, ensure_ascii=False))
+        print(f'  ({time.monotonic() - start:.1f} с)')
+
+    output = options.output
+    if output is None:
+        os.makedirs(RESULTS_FOLDER, exist_ok=True)
+        output = os.path.join(RESULTS_FOLDER, f"suite-{datetime.datetime.now():%Y%m%d-%H%M%S}.json")
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    print(f'результаты: {output}')
+
+    if options.compare:
+        with open(options.compare) as f:
+            compare(json.load(f), report)
+    return report
+
+
+def int_list(value):
+    return [int(item) for item in value.split(',')]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Набор бенчмарков горячих путей с результатами в JSON')
+    parser.add_argument('--only', type=lambda value: value.split(','), default=list(BENCHMARKS),
+                        help='Бенчмарки через запятую: ' + ', '.join(BENCHMARKS))
+    parser.add_argument('--quick', action='store_true', help='Короткие измерения для проверки')
+    parser.add_argument('--duration', type=float, default=5.0, help='Длительность измерений по времени (с)')
+    parser.add_argument('--number', type=int, default=100000, help='Число повторов микро-бенчмарков')
+    parser.add_argument('--readers', type=int_list, default=[1, 2, 4, 8], help='Числа потоков-читателей')
+    parser.add_argument('--clients', type=int_list, default=[1, 10, 50], help='Числа клиентов WebSocket')
+    parser.add_argument('--telemetry-rate', type=float, default=200.0, help='Частота телеметрии имитатора (Гц)')
+    parser.add_argument('--repeats', type=int, default=5, help='Число остановок миссии каждого вида')
+    parser.add_argument('--output', help='Файл результатов JSON')
+    parser.add_argument('--compare', help='Предыдущий файл результатов для сравнения')
+    args = parser.parse_args()
+    unknown = [name for name in args.only if name not in BENCHMARKS]
+    if unknown:
+        parser.error(f'неизвестные бенчмарки: {", ".join(unknown)}')
+    if args.quick:
+        args.duration = min(args.duration, 1.0)
+        args.number = min(args.number, 10000)
+        args.repeats = min(args.repeats, 2)
+    run(args)
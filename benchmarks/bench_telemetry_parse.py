@@ -0,0 +1,63 @@
+"""
+Микро-бенчмарк разбора пакета телеметрии.
+
+Сравнивает прежний разбор в словарь (с копированием при каждом чтении) и снимок Telemetry
+на предварительно скомпилированной структуре. Печатает стоимость одного пакета и долю бюджета
+при частоте телеметрии 1 кГц.
+
+Запуск: python benchmarks/bench_telemetry_parse.py
+"""
+import os
+import struct
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'app'))
+
+from boat_controller import CMD_TELEMETRY, TELEMETRY_STRUCT, Telemetry  # noqa: E402
+
+PACKET = struct.pack(TELEMETRY_STRUCT, CMD_TELEMETRY, 1.0, 2.0, 3.0, 1500.0, 1500.0, 1500.0, 1500.0, 1500.0, 1.0, 0.1, 0.01)
+NUMBER = 200000
+
+
+def parse_dict(packet):
+    """
+    Разбор пакета в словарь, как было до введения Telemetry.
+    """
+    unpacked = struct.unpack(TELEMETRY_STRUCT, packet)
+    _, roll, pitch, yaw, adc_value, motor1_pwm, motor2_pwm, motor3_pwm, motor4_pwm, kp, ki, kd = unpacked
+    return {
+        'roll': roll,
+        'pitch': pitch,
+        'yaw': yaw,
+        'adc_value': adc_value,
+        'motor_pwms': [motor1_pwm, motor2_pwm, motor3_pwm, motor4_pwm],
+        'pid': {'p': kp, 'i': ki, 'd': kd}
+    }
+
+
+def dict_packet_and_read():
+    telemetry = parse_dict(PACKET)
+    return telemetry.copy()['yaw']
+
+
+def record_packet_and_read():
+    telemetry = Telemetry.from_packet(PACKET)
+    return telemetry.yaw
+
+
+def run():
+    results = {}
+    for name, func in (('dict', dict_packet_and_read), ('record', record_packet_and_read)):
+        seconds = min(timeit.repeat(func, number=NUMBER, repeat=5))
+        results[name] = seconds / NUMBER
+    for name, per_packet in results.items():
+        # Доля времени одного ядра, уходящая на разбор при 1000 пакетах в секунду
+        budget = per_packet * 1000 * 100
+        print(f'{name:>6}: {per_packet * 1e6:.3f} мкс/пакет, {budget:.3f}% ядра при 1 кГц')
+    print(f'ускорение: {results["dict"] / results["record"]:.2f}x')
+    return results
+
+
+if __name__ == '__main__':
+    run()
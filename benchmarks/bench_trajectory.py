@@ -0,0 +1,99 @@
+"""
+Бенчмарк расчета профилей курса.
+
+Сравнивает скалярные функции миссии (Mission.normalize_angle и Mission.angle_difference с циклами while,
+пошаговый расчет курсов circle_around_buoy) с векторными функциями модуля trajectory.
+Печатает время расчета и стоимость одного такта воспроизведения.
+
+Запуск: python benchmarks/bench_trajectory.py [--duration 30] [--rate 50]
+"""
+import argparse
+import os
+import sys
+import timeit
+
+import numpy as np
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, os.path.join(ROOT, 'app'))
+sys.path.insert(0, os.path.join(ROOT, 'missions'))
+
+import trajectory  # noqa: E402
+from mission import Mission  # noqa: E402
+
+
+class NullController:
+    """
+    Контроллер без отправки команд: измеряется только стоимость выдачи уставок.
+    """
+
+    def set_target_heading(self, heading):
+        self.heading = heading
+
+    def send_movement_command(self, forward, lateral, yaw):
+        self.forward = forward
+
+
+def scalar_circle(initial_heading, duration, period):
+    """
+    Курсы окружности, как в прежнем circle_around_buoy: по одному шагу с normalize_angle.
+    """
+    steps = int(duration / period)
+    increment = 360.0 / steps
+    return [Mission.normalize_angle(initial_heading + increment * i) for i in range(steps)]
+
+
+def vector_circle(initial_heading, duration, period):
+    return trajectory.normalize_angle(trajectory.circle(initial_heading, duration, 10.0, step=period).headings)
+
+
+def best(func, number):
+    return min(timeit.repeat(func, number=number, repeat=5)) / number
+
+
+def run(duration=30.0, rate=50.0, pairs=100000):
+    period = 1.0 / rate
+    results = {}
+
+    results['circle_scalar'] = best(lambda: scalar_circle(170.0, duration, period), 20)
+    results['circle_vector'] = best(lambda: vector_circle(170.0, duration, period), 20)
+
+    rng = np.random.default_rng(0)
+    a = rng.uniform(-720.0, 720.0, pairs)
+    b = rng.uniform(-720.0, 720.0, pairs)
+    a_list, b_list = a.tolist(), b.tolist()
+    results['diff_scalar'] = best(lambda: [Mission.angle_difference(x, y) for x, y in zip(a_list, b_list)], 3)
+    results['diff_vector'] = best(lambda: trajectory.angle_difference(a, b), 3)
+
+    # Такт воспроизведения: прежний шаг цикла и выборка уставки плеером
+    controller = NullController()
+    player = trajectory.ProfilePlayer(trajectory.circle(170.0, duration, 10.0), controller, rate)
+    increment = 360.0 / int(duration / period)
+
+    def scalar_tick(i=[0]):
+        i[0] += 1
+        controller.set_target_heading(Mission.normalize_angle(170.0 + increment * i[0]))
+        controller.send_movement_command(10.0, 0.0, 0.0)
+
+    results['tick_scalar'] = best(scalar_tick, 100000)
+    results['tick_player'] = best(lambda: player._apply(1234), 100000)
+
+    steps = int(duration * rate)
+    print(f'профиль окружности {duration:g} с при {rate:g} Гц ({steps} шагов):')
+    print(f'  скалярный расчет: {results["circle_scalar"] * 1e3:.3f} мс, '
+          f'векторный: {results["circle_vector"] * 1e3:.3f} мс '
+          f'({results["circle_scalar"] / results["circle_vector"]:.1f}x)')
+    print(f'angle_difference для {pairs} пар:')
+    print(f'  скалярно: {results["diff_scalar"] * 1e3:.2f} мс, векторно: {results["diff_vector"] * 1e3:.2f} мс '
+          f'({results["diff_scalar"] / results["diff_vector"]:.1f}x)')
+    print(f'такт воспроизведения: прежний {results["tick_scalar"] * 1e6:.3f} мкс, '
+          f'плеер {results["tick_player"] * 1e6:.3f} мкс')
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Бенчмарк расчета профилей курса')
+    parser.add_argument('--duration', type=float, default=30.0, help='Длительность окружности в секундах')
+    parser.add_argument('--rate', type=float, default=50.0, help='Частота уставок в Гц')
+    args = parser.parse_args()
+    run(args.duration, args.rate)
@@ -1,38 +1,52 @@
-import time
 import traceback
 
+import trajectory
+
 
 class VehicleProxy:
+    """
+    Обертка над аппаратом, прерывающая миссию при первом обращении к аппарату после остановки.
+
+    mission_stop - признак остановки с методом is_set() (CancelToken или threading.Event),
+    проверка выполняется без блокировок.
+    """
+
+    _own_attributes = ('mission_stop', 'log_mission_output', 'vehicle')
 
-    def __init__(self, vehicle, mission_queue, log_mission_output):
+    def __init__(self, vehicle, mission_stop, log_mission_output):
         self.vehicle = vehicle
-        self.mission_queue = mission_queue
+        self.mission_stop = mission_stop
         self.log_mission_output = log_mission_output
         self.vehicle.is_running = False
 
     def __getattribute__(self, name):
-        if name in ['mission_queue', 'log_mission_output', 'vehicle']:
+        if name in VehicleProxy._own_attributes:
             return super(VehicleProxy, self).__getattribute__(name)
 
-        attr = getattr(self.vehicle, name)
+        vehicle = super(VehicleProxy, self).__getattribute__('vehicle')
+        mission_stop = super(VehicleProxy, self).__getattribute__('mission_stop')
 
-        try:
-            is_mission_stop = self.mission_queue.get(None)
-        except Exception as e:
-            is_mission_stop = None
+        if mission_stop.is_set() and vehicle.is_running:
+            vehicle.is_running = False
+            vehicle.send_movement_command(0.0, 0.0, 0.0)
+            vehicle.send_mode_command(0)
+            raise ValueError('Миссия была завершена')
 
-        if is_mission_stop is not None and is_mission_stop and self.vehicle.is_running:
-            self.vehicle.send_movement_command(0.0, 0.0, 0.0)
-            self.vehicle.send_mode_command(0)
-            raise ValueError(f'Миссия была завершена или не запущена {is_mission_stop}')
+        return getattr(vehicle, name)
 
-        return attr
+    def __setattr__(self, name, value):
+        if name in VehicleProxy._own_attributes:
+            super(VehicleProxy, self).__setattr__(name, value)
+        else:
+            setattr(self.vehicle, name, value)
 
 
 class Mission:
-    def __init__(self, boat_controller, mission_running, log_mission_output):
-        self.boat_controller = VehicleProxy(boat_controller, mission_running, log_mission_output)  # Объект аппарата
-        self.mission_running = mission_running
+    control_rate = 50.0  # Частота цикла управления (Гц)
+
+    def __init__(self, boat_controller, mission_stop, log_mission_output):
+        self.boat_controller = VehicleProxy(boat_controller, mission_stop, log_mission_output)  # Объект аппарата
+        self.mission_stop = mission_stop
         self.log_mission_output = log_mission_output
         self.current_heading = 0.0  # Текущий курс (угол рыскания)
 
@@ -44,8 +58,24 @@ class Mission:
             self._run()
         except Exception as e:
             self.boat_controller.is_running = False
-            self.log_mission_output(str(traceback.format_exc()))
+            if self.mission_stop.is_set():
+                self.log_mission_output("Миссия остановлена.")
+            else:
+                self.log_mission_output(str(traceback.format_exc()))
             self.boat_controller.send_movement_command(0.0, 0.0, 0.0)
+        finally:
+            acknowledge = getattr(self.mission_stop, 'acknowledge', None)
+            if acknowledge is not None:
+                acknowledge()
+
+    def sleep(self, seconds):
+        """
+        Пауза, которая прерывается сразу при остановке миссии.
+
+        :param seconds: Длительность паузы в секундах
+        """
+        if self.mission_stop.wait(seconds):
+            raise ValueError('Миссия была завершена')
 
     def _run(self):
         # Переключение в режим стабилизации
@@ -57,7 +87,7 @@ class Mission:
 
         self.log_mission_output("Движение прямо")
         self.boat_controller.send_movement_command(20.0, 0.0, 0)
-        time.sleep(10)
+        self.sleep(10)
 
         # Получение текущего курса от IMU аппарата
         # self.current_heading = self.boat_controller.get_current_yaw()
@@ -107,20 +137,32 @@ class Mission:
         """
         tolerance = 2.0  # Допустимая погрешность в градусах
         max_duration = 10.0  # Максимальное время для попытки поворота (секунды)
-        start_time = time.time()
 
         self.boat_controller.set_target_heading(target_heading)
 
-        while True:
-            current_yaw = self.boat_controller.get_current_yaw()
-            error = self.angle_difference(current_yaw, target_heading)
-            if abs(error) <= tolerance:
-                self.log_mission_output(f"Достигнут целевой курс: {current_yaw:.2f} градусов")
-                break
-            if time.time() - start_time > max_duration:
-                self.log_mission_output("Время поворота истекло.")
-                break
-            time.sleep(0.1)
+        # Курс проверяется при приходе каждого кадра телеметрии, без опроса по таймеру
+        telemetry = self.boat_controller.wait_for(
+            lambda t: abs(self.angle_difference(t.yaw, target_heading)) <= tolerance,
+            max_duration, self.mission_stop)
+        if telemetry is not None:
+            self.log_mission_output(f"Достигнут целевой курс: {telemetry.yaw:.2f} градусов")
+        elif self.mission_stop.is_set():
+            raise ValueError('Миссия была завершена')
+        else:
+            self.log_mission_output("Время поворота истекло.")
+
+    def vision_result(self, name='buoy', max_age=0.5):
+        """
+        Последний результат детектора компьютерного зрения.
+
+        :param name: Имя детектора
+        :param max_age: Максимальный возраст кадра в секундах
+        :return: Словарь результата или None, если обработка кадров не запущена или результат устарел
+        """
+        vision = getattr(self.boat_controller, 'vision', None)
+        if vision is None:
+            return None
+        return vision.latest(name, max_age)
 
     def circle_around_buoy(self, speed, duration):
         """
@@ -129,27 +171,11 @@ class Mission:
         :param speed: Скорость движения вперед (%)
         :param duration: Время выполнения полного оборота (секунды)
         """
-        # Количество шагов для обновления курса
-        steps = int(duration / 0.1)  # Обновление каждые 0.1 секунды
-        heading_increment = 360.0 / steps  # Угол для инкрементации целевого курса на каждом шаге
-
-        # Начальный курс
+        # Профиль курса рассчитывается заранее, плеер выдает уставки с частотой цикла управления
         initial_heading = self.current_heading
-
         self.log_mission_output(f"Начало движения по окружности с курса: {initial_heading:.2f} градусов")
-
-        for i in range(steps):
-
-            # Вычисление нового целевого курса
-            delta_heading = heading_increment * i
-            new_heading = self.normalize_angle(initial_heading + delta_heading)
-
-            self.boat_controller.set_target_heading(new_heading)
-
-            # Установка скорости движения вперед
-            self.boat_controller.send_movement_command(speed, 0.0, 0.0)  # В режиме стабилизации yaw контролируется целевым курсом
-
-            time.sleep(0.1)
+        profile = trajectory.circle(initial_heading, duration, speed)
+        trajectory.ProfilePlayer(profile, self.boat_controller, self.control_rate, self.mission_stop).run()
 
         # Остановка двигателей после завершения движения по окружности
         self.boat_controller.send_movement_command(0.0, 0.0, 0.0)
@@ -0,0 +1,38 @@
+import os
+import sys
+from types import SimpleNamespace
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'app'))
+
+from telemetry_history import HISTORY_FIELDS, TelemetryHistory  # noqa: E402
+
+
+def make_telemetry(yaw):
+    values = [0.0] * (len(HISTORY_FIELDS) + 1)
+    values[1 + HISTORY_FIELDS.index('yaw')] = yaw
+    return SimpleNamespace(values=np.array(values, dtype=np.float32))
+
+
+def test_yaw_rate_empty_window():
+    history = TelemetryHistory(capacity=8)
+    times, rate = history.yaw_rate(10.0, now=100.0)
+    assert len(times) == 0 and len(rate) == 0
+    assert history.stats(10.0, now=100.0) == {}
+
+
+def test_yaw_rate_single_frame():
+    history = TelemetryHistory(capacity=8)
+    history.append(make_telemetry(10.0), None, 99.0)
+    times, rate = history.yaw_rate(10.0, now=100.0)
+    assert list(rate) == [0.0]
+
+
+def test_yaw_rate_across_wrap_and_repeated_times():
+    history = TelemetryHistory(capacity=8)
+    history.append(make_telemetry(179.0), None, 99.0)
+    history.append(make_telemetry(179.5), None, 99.0)
+    history.append(make_telemetry(-179.5), None, 99.5)
+    _, rate = history.yaw_rate(10.0, now=100.0)
+    assert np.allclose(rate, 2.0)